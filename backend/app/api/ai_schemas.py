@@ -32,6 +32,17 @@ class SceneDraftRequest(BaseModel):
     scene_card: SceneCard
 
 
+class ContextPackExplainRequest(BaseModel):
+    scene_id: int
+    total_budget: int | None = Field(
+        default=None, gt=0, description="预算（单位由 budget_mode 决定）"
+    )
+    budget_mode: Literal["chars", "tokens"] | None = None
+    include_text: bool = Field(
+        default=False, description="是否返回组装后的上下文全文"
+    )
+
+
 class ChapterSummaryModel(BaseModel):
     """Structured chapter summary extracted by Instructor."""
     narrative: str = Field(
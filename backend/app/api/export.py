@@ -5,11 +5,12 @@ from urllib.parse import quote
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import PlainTextResponse
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.models import Book, Chapter, Scene, SceneTextVersion
+from app.models import Book, Chapter
+from app.services.scene_text import get_chapter_scene_texts
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -29,39 +30,15 @@ def _content_disposition(filename: str) -> str:
     return f"attachment; filename*=UTF-8''{encoded}"
 
 
-async def _get_chapter_text(
-    db: AsyncSession, chapter: Chapter
-) -> str:
-    """Collect all scene text for a chapter (single query)."""
-    latest_ver = (
-        select(
-            SceneTextVersion.scene_id,
-            func.max(SceneTextVersion.version).label(
-                "max_ver"
-            ),
-        )
-        .group_by(SceneTextVersion.scene_id)
-        .subquery()
-    )
-
-    result = await db.execute(
-        select(SceneTextVersion.content_md)
-        .join(Scene, Scene.id == SceneTextVersion.scene_id)
-        .join(
-            latest_ver,
-            (latest_ver.c.scene_id == SceneTextVersion.scene_id)
-            & (
-                SceneTextVersion.version
-                == latest_ver.c.max_ver
-            ),
-        )
-        .where(Scene.chapter_id == chapter.id)
-        .order_by(Scene.sort_order)
-    )
-    rows = result.scalars().all()
-
-    parts = [r for r in rows if r and r.strip()]
-    return "\n\n".join(parts)
+async def _get_chapter_texts(
+    db: AsyncSession, chapters: list[Chapter]
+) -> dict[int, str]:
+    """Collect all scene text for the given chapters (single query)."""
+    scene_texts = await get_chapter_scene_texts(db, [ch.id for ch in chapters])
+    return {
+        chapter_id: "\n\n".join(t for _, t in scenes if t and t.strip())
+        for chapter_id, scenes in scene_texts.items()
+    }
 
 
 @router.get("/markdown", response_class=PlainTextResponse)
@@ -79,7 +56,7 @@ async def export_markdown(
         chapter = await db.get(Chapter, chapter_id)
         if not chapter or chapter.book_id != book_id:
             raise HTTPException(404, "Chapter not found")
-        text = await _get_chapter_text(db, chapter)
+        text = (await _get_chapter_texts(db, [chapter])).get(chapter.id, "")
         md = f"# {chapter.title}\n\n{text}"
         return PlainTextResponse(
             md,
@@ -98,10 +75,11 @@ async def export_markdown(
         .order_by(Chapter.sort_order)
     )
     chapters = result.scalars().all()
+    texts = await _get_chapter_texts(db, chapters)
 
     parts = [f"# {book.title}"]
     for ch in chapters:
-        text = await _get_chapter_text(db, ch)
+        text = texts.get(ch.id, "")
         if text:
             parts.append(f"## {ch.title}\n\n{text}")
         else:
@@ -133,7 +111,7 @@ async def export_txt(
         chapter = await db.get(Chapter, chapter_id)
         if not chapter or chapter.book_id != book_id:
             raise HTTPException(404, "Chapter not found")
-        text = await _get_chapter_text(db, chapter)
+        text = (await _get_chapter_texts(db, [chapter])).get(chapter.id, "")
         return PlainTextResponse(
             f"{chapter.title}\n\n{text}",
             media_type="text/plain; charset=utf-8",
@@ -151,12 +129,13 @@ async def export_txt(
         .order_by(Chapter.sort_order)
     )
     chapters = result.scalars().all()
+    texts = await _get_chapter_texts(db, chapters)
 
     parts = [book.title, "=" * _cjk_width(book.title)]
     for ch in chapters:
         parts.append(f"\n{ch.title}")
         parts.append("-" * _cjk_width(ch.title))
-        text = await _get_chapter_text(db, ch)
+        text = texts.get(ch.id, "")
         if text:
             parts.append(text)
 
@@ -2,13 +2,14 @@
 
 import json
 import logging
-import re
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.ai_schemas import (
+    ContextPackExplainRequest,
     RewriteRequest,
     SceneCard,
     SceneCardRequest,
@@ -17,13 +18,19 @@ from app.api.ai_schemas import (
     WordCountCheckRequest,
 )
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, session_factory_for
 from app.core.llm import call_llm, call_llm_stream
 from app.models import Chapter, Scene
 from app.services.context_pack import (
     assemble_context_pack,
     get_scene_project_id,
 )
+from app.services.hierarchy import resolve_scene_ancestry
+from app.services.json_stream import iter_json_events, parse_json_object
+from app.services.lorebook import (
+    get_trigger_matcher,
+    remember_activation,
+)
 from app.services.word_count import build_rewrite_prompt, check_word_budget
 
 logger = logging.getLogger(__name__)
@@ -51,11 +58,15 @@ _SCENE_CARD_SYSTEM = """\
 """
 
 
-@router.post("/scene-card", response_model=SceneCard)
-async def generate_scene_card(
-    req: SceneCardRequest, db: AsyncSession = Depends(get_db)
-):
-    """Generate a structured scene card via Instructor."""
+_EMPTY_SCENE_CARD = {
+    "title": "", "location": "", "time": "",
+    "characters": [], "conflict": "",
+}
+
+
+async def _scene_card_messages(
+    req: SceneCardRequest, db: AsyncSession
+) -> list[dict]:
     scene = await db.get(Scene, req.scene_id)
     if not scene:
         raise HTTPException(404, "Scene not found")
@@ -80,42 +91,57 @@ async def generate_scene_card(
 
 用户补充说明：{req.hints or '无'}"""
 
-    messages = [
+    return [
         {"role": "system", "content": _SCENE_CARD_SYSTEM},
         {"role": "user", "content": prompt},
     ]
 
+
+@router.post("/scene-card", response_model=SceneCard)
+async def generate_scene_card(
+    req: SceneCardRequest, db: AsyncSession = Depends(get_db)
+):
+    """Generate a structured scene card via Instructor."""
+    messages = await _scene_card_messages(req, db)
     response = await call_llm(
         messages, response_format={"type": "json_object"}
     )
     raw = response.choices[0].message.content or ""
-    data = _parse_scene_card_json(raw)
-    return SceneCard(**data)
-
-
-def _parse_scene_card_json(raw: str) -> dict:
-    """Parse scene card JSON from LLM output with fence/quote repair."""
-    m = re.search(r"```(?:json)?\s*\n?(.*?)```", raw, re.DOTALL)
-    if m:
-        raw = m.group(1).strip()
-    else:
-        idx = raw.find("{")
-        if idx > 0:
-            raw = raw[idx:]
-    raw = re.sub(
-        r'(?<=[\u4e00-\u9fff\u3400-\u4dbf])"(?=[\u4e00-\u9fff\u3400-\u4dbf])',
-        r'\\"',
-        raw,
+    data = parse_json_object(raw)
+    return SceneCard(**{**_EMPTY_SCENE_CARD, **data})
+
+
+@router.post("/scene-card/stream")
+async def stream_scene_card(
+    req: SceneCardRequest, db: AsyncSession = Depends(get_db)
+):
+    """Stream a scene card via SSE, one event per field as it completes."""
+    messages = await _scene_card_messages(req, db)
+
+    async def event_stream():
+        fields: dict = {}
+        chunks = call_llm_stream(
+            messages, response_format={"type": "json_object"}
+        )
+        async for _, key, value in iter_json_events(chunks, items_key=None):
+            fields[key] = value
+            payload = json.dumps(
+                {"field": key, "value": value}, ensure_ascii=False
+            )
+            yield f"data: {payload}\n\n"
+
+        done_data: dict = {"done": True}
+        try:
+            card = SceneCard(**{**_EMPTY_SCENE_CARD, **fields})
+            done_data["scene_card"] = card.model_dump()
+        except ValidationError as exc:
+            logger.warning("Invalid streamed scene card: %s", exc)
+            done_data["error"] = "invalid scene card"
+        yield f"data: {json.dumps(done_data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream"
     )
-    try:
-        data = json.loads(raw)
-        return data if isinstance(data, dict) else {}
-    except (json.JSONDecodeError, TypeError):
-        logger.warning("Failed to parse scene card JSON: %s", raw[:200])
-        return {
-            "title": "", "location": "", "time": "",
-            "characters": [], "conflict": "",
-        }
 
 
 @router.post("/scene-draft")
@@ -123,17 +149,15 @@ async def stream_scene_draft(
     req: SceneDraftRequest, db: AsyncSession = Depends(get_db)
 ):
     """Stream scene prose via SSE."""
-    scene = await db.get(Scene, req.scene_id)
-    if not scene:
+    ancestry = await resolve_scene_ancestry(db, req.scene_id)
+    if not ancestry:
         raise HTTPException(404, "Scene not found")
 
-    chapter_id = scene.chapter_id
-    project_id = await get_scene_project_id(db, req.scene_id)
-    if not project_id:
-        raise HTTPException(404, "Project not found")
+    chapter_id = ancestry.chapter_id
+    project_id = ancestry.project_id
 
-    context = await assemble_context_pack(
-        db, req.scene_id, chapter_id, project_id
+    context, context_report = await assemble_context_pack(
+        db, req.scene_id, chapter_id, project_id, with_report=True
     )
 
     card_json = req.scene_card.model_dump_json(
@@ -152,14 +176,31 @@ async def stream_scene_draft(
 请直接输出场景正文（纯中文小说文本），不要输出任何标记或说明。\
 目标字数约 {req.scene_card.target_chars} 字。"""
 
+    # Watch the prose for lore it triggers beyond what the pack already
+    # activated (taken from its report: no rescan before streaming)
+    matcher = await get_trigger_matcher(db, project_id)
+    lore_watch = matcher.stream(
+        already=context_report["layers"]["kg_lore"]["lore"]["active"]
+    )
+    # The body streams after the request's session may be closed
+    session_factory = session_factory_for(db)
+
     async def event_stream():
         total_text = ""
         async for chunk in call_llm_stream(
             messages=[{"role": "user", "content": prompt}]
         ):
             total_text += chunk
+            lore_watch.feed(chunk)
             yield f"data: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
 
+        async with session_factory() as session:
+            await remember_activation(
+                session, project_id, req.scene_id, total_text,
+                lore_watch.triggered,
+            )
+            await session.commit()
+
         # Final event with stats
         done_data = {
             "done": True,
@@ -168,6 +209,11 @@ async def stream_scene_draft(
                 c for c in req.scene_card.characters
                 if c in total_text
             ],
+            "context_usage": context_report,
+            "lore_activated": [
+                {"id": entry_id, "title": matcher.titles[entry_id]}
+                for entry_id in lore_watch.activated
+            ],
         }
         yield f"data: {json.dumps(done_data, ensure_ascii=False)}\n\n"
 
@@ -176,6 +222,34 @@ async def stream_scene_draft(
     )
 
 
+@router.post("/context-pack/explain")
+async def explain_context_pack(
+    req: ContextPackExplainRequest, db: AsyncSession = Depends(get_db)
+):
+    """Build a scene's context pack uncached and return its layer report.
+
+    Debug aid for slow first-byte latency: per-layer wall time, SQL
+    statement count, raw vs. truncated size and dropped item counts.
+    """
+    ancestry = await resolve_scene_ancestry(db, req.scene_id)
+    if not ancestry:
+        raise HTTPException(404, "Scene not found")
+
+    context, report = await assemble_context_pack(
+        db,
+        req.scene_id,
+        ancestry.chapter_id,
+        ancestry.project_id,
+        total_budget=req.total_budget,
+        use_cache=False,
+        budget_mode=req.budget_mode,
+        with_report=True,
+    )
+    if req.include_text:
+        report["text"] = context
+    return report
+
+
 @router.post("/word-count-check", response_model=WordCountCheck)
 async def word_count_check(req: WordCountCheckRequest):
     """Check if scene text fits within the target char budget."""
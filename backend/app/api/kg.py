@@ -1,17 +1,44 @@
 """Knowledge Graph API endpoints."""
 
+import base64
+import binascii
 import datetime
+import json
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.api.schemas import KGEdgeOut, KGNodeOut, KGProposalOut
-from app.core.database import get_db
-from app.models.tables import KGEdge, KGNode, KGProposal
+from sqlalchemy.orm import defer
+
+from app.api.schemas import (
+    KGAnalyticsOut,
+    KGEdgeOut,
+    KGGraphNodeOut,
+    KGJobOut,
+    KGMergeOut,
+    KGNeighborhoodOut,
+    KGNodeAliasOut,
+    KGNodeOut,
+    KGPathOut,
+    KGProposalOut,
+)
+from app.core.database import get_db, session_factory_for
+from app.models.tables import KGEdge, KGNode, KGNodeMetric, KGProposal
 from app.services.graph_service import SQLiteGraphAdapter, _safe_loads
-from app.services.kg_extraction import extract_kg_from_chapter
+from app.services.kg_analytics import ensure_node_metrics, recompute_node_metrics
+from app.services.kg_extraction import extract_kg_from_chapter, materialise_items
+from app.services.kg_jobs import (
+    create_book_job,
+    get_job_chapters,
+    get_job_progress,
+    retry_job,
+    start_job,
+    watch_job,
+)
 
 router = APIRouter(prefix="/api", tags=["knowledge-graph"])
 
@@ -21,91 +48,153 @@ router = APIRouter(prefix="/api", tags=["knowledge-graph"])
 class ExtractRequest(BaseModel):
     chapter_id: int
     project_id: int
+    # Bypass the LLM result cache
+    force: bool = False
 
 
 class BulkIdsRequest(BaseModel):
     ids: list[int] = Field(min_length=1, max_length=200)
 
 
+class AliasesRequest(BaseModel):
+    aliases: list[str] = Field(min_length=1, max_length=200)
+
+
+class MergeRequest(BaseModel):
+    source_ids: list[int] = Field(min_length=1, max_length=200)
+
+
 def _safe_loads_dict(raw: str) -> dict:
     return _safe_loads(raw, {})
 
 
-def _proposal_to_out(p: KGProposal) -> dict:
-    return {
+# ---------- Keyset pagination ----------
+
+MAX_PAGE_SIZE = 1000
+
+
+def _encode_cursor(*values) -> str:
+    """Opaque cursor for the sort key of the last row on a page."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, types: tuple[type, ...]) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(
+            isinstance(v, t) and not isinstance(v, bool)
+            for v, t in zip(values, types)
+        )
+    ):
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def _page(
+    response: Response, rows: list, limit: int | None, total: int, key
+) -> list:
+    """Trim a limit+1 fetch to one page and set the paging headers."""
+    response.headers["X-Total-Count"] = str(total)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(*key(rows[-1]))
+    return rows
+
+
+def _proposal_to_out(p: KGProposal, include_payload: bool = True) -> dict:
+    out = {
         "id": p.id,
         "project_id": p.project_id,
         "chapter_id": p.chapter_id,
         "category": p.category,
-        "data": _safe_loads_dict(p.data_json),
         "confidence": p.confidence,
         "status": p.status,
         "evidence_text": p.evidence_text,
         "evidence_location": p.evidence_location,
+        "source_version_ids": _safe_loads(p.source_versions_json, []),
+        "stale": p.stale,
         "reviewed_at": p.reviewed_at,
         "created_at": p.created_at,
     }
+    if include_payload:
+        out["data"] = _safe_loads_dict(p.data_json)
+    return out
 
 
-def _node_to_out(n: KGNode) -> dict:
-    return {
+def _node_to_out(n: KGNode, include_payload: bool = True) -> dict:
+    out = {
         "id": n.id,
         "project_id": n.project_id,
         "label": n.label,
         "name": n.name,
-        "properties": _safe_loads_dict(n.properties_json),
         "created_at": n.created_at,
     }
+    if include_payload:
+        out["properties"] = _safe_loads_dict(n.properties_json)
+    return out
 
 
-def _edge_to_out(e: KGEdge) -> dict:
+def _ranked_node_to_out(n: KGNode, m: KGNodeMetric, include_payload: bool = True) -> dict:
     return {
+        **_node_to_out(n, include_payload),
+        "degree": m.degree,
+        "pagerank": m.pagerank,
+        "community": m.community,
+    }
+
+
+def _edge_to_out(e: KGEdge, include_payload: bool = True) -> dict:
+    out = {
         "id": e.id,
         "project_id": e.project_id,
         "source_node_id": e.source_node_id,
         "target_node_id": e.target_node_id,
         "relation": e.relation,
-        "properties": _safe_loads_dict(e.properties_json),
         "created_at": e.created_at,
     }
+    if include_payload:
+        out["properties"] = _safe_loads_dict(e.properties_json)
+    return out
+
+
+async def _reload(db: AsyncSession, proposals: list[KGProposal]) -> None:
+    """Refresh a batch of proposals with one SELECT."""
+    if proposals:
+        await db.execute(
+            select(KGProposal)
+            .where(KGProposal.id.in_([p.id for p in proposals]))
+            .execution_options(populate_existing=True)
+        )
 
 
-async def _approve_proposal(
-    proposal: KGProposal, db: AsyncSession, new_status: str
+async def _approve_proposals(
+    proposals: list[KGProposal], db: AsyncSession, new_status: str
 ) -> None:
-    """Materialise an entity/relation proposal into the graph, then mark reviewed."""
-    graph = SQLiteGraphAdapter(db)
-    item = _safe_loads_dict(proposal.data_json)
-    category = proposal.category
-
-    if category == "entity":
-        await graph.upsert_node(
-            project_id=proposal.project_id,
-            label=item.get("label", "Concept"),
-            name=item.get("name", ""),
-            properties=item.get("properties", {}),
-        )
-    elif category == "relation":
-        source_id = await graph.ensure_node(
-            project_id=proposal.project_id,
-            name=item.get("source", ""),
-            fallback_label="Concept",
-        )
-        target_id = await graph.ensure_node(
-            project_id=proposal.project_id,
-            name=item.get("target", ""),
-            fallback_label="Concept",
-        )
-        await graph.upsert_edge(
-            project_id=proposal.project_id,
-            source_id=source_id,
-            target_id=target_id,
-            relation=item.get("relation", "related_to"),
-            properties={},
-        )
-
-    proposal.status = new_status
-    proposal.reviewed_at = datetime.datetime.now(datetime.UTC)
+    """Materialise entity/relation proposals into the graph, then mark reviewed.
+
+    All proposals must belong to one project; the graph writes are batched.
+    """
+    if not proposals:
+        return
+    await materialise_items(
+        SQLiteGraphAdapter(db),
+        proposals[0].project_id,
+        [
+            {**_safe_loads_dict(p.data_json), "category": p.category}
+            for p in proposals
+        ],
+    )
+    now = datetime.datetime.now(datetime.UTC)
+    for p in proposals:
+        p.status = new_status
+        p.reviewed_at = now
 
 
 # ---------- Extraction ----------
@@ -114,37 +203,146 @@ async def _approve_proposal(
 async def trigger_extraction(
     body: ExtractRequest, db: AsyncSession = Depends(get_db)
 ):
-    """Trigger KG extraction for a chapter."""
+    """Extract KG facts from the chapter's changed scenes.
+
+    Returns the chapter's current proposals; ``force`` re-extracts every
+    scene without the LLM result cache.
+    """
     proposals = await extract_kg_from_chapter(
-        db, body.chapter_id, body.project_id
+        db, body.chapter_id, body.project_id, force=body.force
     )
+    await ensure_node_metrics(db, body.project_id)
     return [_proposal_to_out(p) for p in proposals]
 
 
+# ---------- Whole-book extraction jobs ----------
+
+@router.post("/kg/books/{book_id}/extract-job", response_model=KGJobOut, status_code=202)
+async def start_book_extraction(
+    book_id: int, force: bool = False, db: AsyncSession = Depends(get_db)
+):
+    """Extract every chapter of a book in the background.
+
+    Chapter states are persisted, so an interrupted job resumes on the
+    next start. A book with an unfinished job gets that job back.
+    Follow progress at /kg/jobs/{id}/events; a job that ends with failed
+    chapters ("partial" or "failed") reruns them via /kg/jobs/{id}/retry.
+    """
+    job = await create_book_job(db, book_id, force=force)
+    if not job:
+        raise HTTPException(404, "Book not found")
+    # The runner reads the job on its own sessions
+    await db.commit()
+    start_job(job.id, session_factory_for(db))
+    return await get_job_progress(db, job.id)
+
+
+@router.get("/kg/jobs/{job_id}", response_model=KGJobOut)
+async def get_extraction_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Job progress with per-chapter state."""
+    progress = await get_job_progress(db, job_id)
+    if not progress:
+        raise HTTPException(404, "Job not found")
+    progress["chapters"] = await get_job_chapters(db, job_id)
+    return progress
+
+
+@router.post("/kg/jobs/{job_id}/retry", response_model=KGJobOut, status_code=202)
+async def retry_extraction_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Run the failed chapters of a finished job again.
+
+    Chapters already done are left alone; an unfinished job is returned
+    as is.
+    """
+    try:
+        job = await retry_job(db, job_id)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    if not job:
+        raise HTTPException(404, "Job not found")
+    await db.commit()
+    start_job(job.id, session_factory_for(db))
+    return await get_job_progress(db, job.id)
+
+
+@router.get("/kg/jobs/{job_id}/events")
+async def stream_extraction_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Job progress via SSE: a snapshot, then an event per finished chapter."""
+    if not await get_job_progress(db, job_id):
+        raise HTTPException(404, "Job not found")
+    session_factory = session_factory_for(db)
+
+    async def event_stream():
+        async for event in watch_job(job_id, session_factory):
+            payload = json.dumps(jsonable_encoder(event), ensure_ascii=False)
+            yield f"data: {payload}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 # ---------- Proposals ----------
 
-@router.get("/kg/proposals", response_model=list[KGProposalOut])
+@router.get(
+    "/kg/proposals",
+    response_model=list[KGProposalOut],
+    response_model_exclude_unset=True,
+)
 async def list_proposals(
+    response: Response,
     project_id: int,
     status: str | None = None,
     category: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include_payload: bool = True,
+    include_stale: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
-    """List KG proposals with optional status / category filters."""
-    stmt = select(KGProposal).where(KGProposal.project_id == project_id)
+    """List KG proposals with optional status / category filters.
+
+    Ordered by confidence desc, id. Pass ``limit`` (and then the returned
+    ``X-Next-Cursor``) to page through large projects; without it every
+    row is returned. ``X-Total-Count`` holds the filtered total. Stale
+    proposals (from superseded scene text) are hidden unless requested.
+    """
+    conds = [KGProposal.project_id == project_id]
+    if not include_stale:
+        conds.append(KGProposal.stale.is_(False))
     if status:
         if status == "approved":
-            stmt = stmt.where(
+            conds.append(
                 KGProposal.status.in_(["auto_approved", "user_approved"])
             )
         else:
-            stmt = stmt.where(KGProposal.status == status)
+            conds.append(KGProposal.status == status)
     if category:
-        stmt = stmt.where(KGProposal.category == category)
+        conds.append(KGProposal.category == category)
+    stmt = select(KGProposal).where(*conds)
+    if cursor:
+        confidence, after_id = _decode_cursor(cursor, ((int, float), int))
+        stmt = stmt.where(
+            or_(
+                KGProposal.confidence < confidence,
+                and_(KGProposal.confidence == confidence, KGProposal.id > after_id),
+            )
+        )
+    if not include_payload:
+        stmt = stmt.options(defer(KGProposal.data_json))
     stmt = stmt.order_by(KGProposal.confidence.desc(), KGProposal.id)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
     result = await db.execute(stmt)
     proposals = result.scalars().all()
-    return [_proposal_to_out(p) for p in proposals]
+    if limit is None and not cursor:
+        total = len(proposals)
+    else:
+        total = (
+            await db.execute(select(func.count(KGProposal.id)).where(*conds))
+        ).scalar_one()
+    proposals = _page(
+        response, proposals, limit, total, lambda p: (p.confidence, p.id)
+    )
+    return [_proposal_to_out(p, include_payload) for p in proposals]
 
 
 # Bulk endpoints MUST come before /{id} routes to avoid routing conflicts.
@@ -163,12 +361,11 @@ async def bulk_approve_proposals(
         )
     )
     proposals = result.scalars().all()
-    for p in proposals:
-        if p.status == "pending":
-            await _approve_proposal(p, db, "user_approved")
+    await _approve_proposals(
+        [p for p in proposals if p.status == "pending"], db, "user_approved"
+    )
     await db.flush()
-    for p in proposals:
-        await db.refresh(p)
+    await _reload(db, proposals)
     return [_proposal_to_out(p) for p in proposals]
 
 
@@ -192,8 +389,7 @@ async def bulk_reject_proposals(
             p.status = "rejected"
             p.reviewed_at = now
     await db.flush()
-    for p in proposals:
-        await db.refresh(p)
+    await _reload(db, proposals)
     return [_proposal_to_out(p) for p in proposals]
 
 
@@ -207,7 +403,7 @@ async def approve_proposal(
     p = await db.get(KGProposal, proposal_id)
     if not p or p.project_id != project_id:
         raise HTTPException(404, "Proposal not found")
-    await _approve_proposal(p, db, "user_approved")
+    await _approve_proposals([p], db, "user_approved")
     await db.flush()
     await db.refresh(p)
     return _proposal_to_out(p)
@@ -232,25 +428,233 @@ async def reject_proposal(
 
 # ---------- Graph query ----------
 
-@router.get("/kg/nodes", response_model=list[KGNodeOut])
+@router.get(
+    "/kg/nodes", response_model=list[KGNodeOut], response_model_exclude_unset=True
+)
 async def list_nodes(
+    response: Response,
     project_id: int,
     label: str | None = None,
+    sort: Literal["id", "pagerank", "degree"] = "id",
+    community: int | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include_payload: bool = True,
     db: AsyncSession = Depends(get_db),
 ):
-    """List KG nodes for a project, optionally filtered by label."""
+    """List KG nodes for a project, optionally filtered by label.
+
+    Keyset-paged when ``limit`` is given (see list_proposals). ``sort``
+    by pagerank or degree (highest first) or a ``community`` filter uses
+    the stored graph metrics, refreshed first if the graph changed, and
+    adds them to each node.
+    """
     graph = SQLiteGraphAdapter(db)
-    nodes = await graph.get_nodes(project_id, label)
-    return [_node_to_out(n) for n in nodes]
+    if sort != "id" or community is not None:
+        await ensure_node_metrics(db, project_id)
+        value_type = (int, float) if sort == "pagerank" else int
+        types = (int,) if sort == "id" else (value_type, int)
+        after = tuple(_decode_cursor(cursor, types)) if cursor else None
+        rows = await graph.get_ranked_nodes(
+            project_id,
+            sort,
+            label,
+            community,
+            after=after,
+            limit=limit + 1 if limit is not None else None,
+            include_payload=include_payload,
+        )
+        if limit is None and after is None:
+            total = len(rows)
+        else:
+            total = await graph.count_ranked_nodes(project_id, label, community)
+
+        def key(row):
+            node, metric = row
+            return (node.id,) if sort == "id" else (getattr(metric, sort), node.id)
+
+        rows = _page(response, rows, limit, total, key)
+        return [_ranked_node_to_out(n, m, include_payload) for n, m in rows]
+
+    after_id = _decode_cursor(cursor, (int,))[0] if cursor else None
+    nodes = await graph.get_nodes(
+        project_id,
+        label,
+        after_id=after_id,
+        limit=limit + 1 if limit is not None else None,
+        include_payload=include_payload,
+    )
+    if limit is None and after_id is None:
+        total = len(nodes)
+    else:
+        total = await graph.count_nodes(project_id, label)
+    nodes = _page(response, nodes, limit, total, lambda n: (n.id,))
+    return [_node_to_out(n, include_payload) for n in nodes]
 
 
-@router.get("/kg/edges", response_model=list[KGEdgeOut])
+@router.get(
+    "/kg/edges", response_model=list[KGEdgeOut], response_model_exclude_unset=True
+)
 async def list_edges(
+    response: Response,
     project_id: int,
     node_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include_payload: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    """List KG edges for a project, optionally filtered by node involvement.
+
+    Keyset-paged by id when ``limit`` is given (see list_proposals).
+    """
+    graph = SQLiteGraphAdapter(db)
+    after_id = _decode_cursor(cursor, (int,))[0] if cursor else None
+    edges = await graph.get_edges(
+        project_id,
+        node_id,
+        after_id=after_id,
+        limit=limit + 1 if limit is not None else None,
+        include_payload=include_payload,
+    )
+    if limit is None and after_id is None:
+        total = len(edges)
+    else:
+        total = await graph.count_edges(project_id, node_id)
+    edges = _page(response, edges, limit, total, lambda e: (e.id,))
+    return [_edge_to_out(e, include_payload) for e in edges]
+
+
+@router.get("/kg/resolve", response_model=KGNodeOut)
+async def resolve_node(
+    project_id: int,
+    name: str,
+    label: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Find the node a name or alias refers to (width/case/space-insensitive)."""
+    graph = SQLiteGraphAdapter(db)
+    node_id = await graph.resolve_name(project_id, name, label)
+    if node_id is None:
+        raise HTTPException(404, "Node not found")
+    return _node_to_out(await db.get(KGNode, node_id))
+
+
+async def _get_project_node(db: AsyncSession, project_id: int, node_id: int) -> KGNode:
+    node = await db.get(KGNode, node_id)
+    if not node or node.project_id != project_id:
+        raise HTTPException(404, "Node not found")
+    return node
+
+
+@router.get("/kg/nodes/{node_id}/aliases", response_model=list[KGNodeAliasOut])
+async def list_node_aliases(
+    node_id: int, project_id: int, db: AsyncSession = Depends(get_db)
+):
+    """Aliases resolving to a node."""
+    await _get_project_node(db, project_id, node_id)
+    return await SQLiteGraphAdapter(db).get_aliases(node_id)
+
+
+@router.post("/kg/nodes/{node_id}/aliases", response_model=list[KGNodeAliasOut])
+async def add_node_aliases(
+    node_id: int,
+    project_id: int,
+    body: AliasesRequest,
     db: AsyncSession = Depends(get_db),
 ):
-    """List KG edges for a project, optionally filtered by node involvement."""
+    """Add aliases to a node; an alias already used elsewhere is moved here."""
+    await _get_project_node(db, project_id, node_id)
+    return await SQLiteGraphAdapter(db).add_aliases(project_id, node_id, body.aliases)
+
+
+@router.post("/kg/nodes/{node_id}/merge", response_model=KGMergeOut)
+async def merge_nodes(
+    node_id: int,
+    project_id: int,
+    body: MergeRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """Merge duplicate nodes into node_id, keeping their edges and names."""
+    await _get_project_node(db, project_id, node_id)
     graph = SQLiteGraphAdapter(db)
-    edges = await graph.get_edges(project_id, node_id)
-    return [_edge_to_out(e) for e in edges]
+    try:
+        stats = await graph.merge_nodes(project_id, node_id, body.source_ids)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    await ensure_node_metrics(db, project_id)
+    node = await db.get(KGNode, node_id)
+    return {
+        **stats,
+        "node": _node_to_out(node),
+        "aliases": await graph.get_aliases(node_id),
+    }
+
+
+@router.post("/kg/analytics/recompute", response_model=KGAnalyticsOut)
+async def recompute_graph_metrics(project_id: int, db: AsyncSession = Depends(get_db)):
+    """Recompute degree, PageRank and communities for every node now."""
+    return await recompute_node_metrics(db, project_id)
+
+
+# ---------- Graph traversal (in-memory snapshot) ----------
+
+Direction = Literal["both", "out", "in"]
+
+
+@router.get("/kg/graph/neighborhood", response_model=KGNeighborhoodOut)
+async def graph_neighborhood(
+    project_id: int,
+    node_id: int,
+    hops: int = Query(1, ge=1, le=6),
+    relation: list[str] | None = Query(None),
+    direction: Direction = "both",
+    max_nodes: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    """k-hop neighborhood of a node, optionally restricted to relation types."""
+    graph = SQLiteGraphAdapter(db)
+    result = await graph.neighborhood(
+        project_id, node_id, hops, relation, direction, max_nodes
+    )
+    if result is None:
+        raise HTTPException(404, "Node not found")
+    return result
+
+
+@router.get("/kg/graph/path", response_model=KGPathOut)
+async def graph_shortest_path(
+    project_id: int,
+    source_id: int,
+    target_id: int,
+    relation: list[str] | None = Query(None),
+    direction: Direction = "both",
+    max_hops: int = Query(6, ge=1, le=12),
+    db: AsyncSession = Depends(get_db),
+):
+    """Shortest relation path between two nodes."""
+    graph = SQLiteGraphAdapter(db)
+    result = await graph.shortest_path(
+        project_id, source_id, target_id, relation, direction, max_hops
+    )
+    if result is None:
+        raise HTTPException(404, "Node not found")
+    return result
+
+
+@router.get("/kg/graph/nodes", response_model=list[KGGraphNodeOut])
+async def graph_nodes_by_degree(
+    project_id: int,
+    min_degree: int = Query(0, ge=0),
+    max_degree: int | None = Query(None, ge=0),
+    relation: list[str] | None = Query(None),
+    label: str | None = None,
+    direction: Direction = "both",
+    limit: int = Query(100, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Nodes filtered by degree (counting only the given relation types), highest first."""
+    graph = SQLiteGraphAdapter(db)
+    return await graph.nodes_by_degree(
+        project_id, min_degree, max_degree, relation, label, direction, limit
+    )
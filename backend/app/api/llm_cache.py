@@ -0,0 +1,16 @@
+"""LLM result cache endpoints."""
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.schemas import LLMCacheStatsOut
+from app.core.database import get_db
+from app.services.llm_cache import cache_stats
+
+router = APIRouter(prefix="/api", tags=["llm-cache"])
+
+
+@router.get("/llm-cache/stats", response_model=LLMCacheStatsOut)
+async def get_llm_cache_stats(db: AsyncSession = Depends(get_db)):
+    """Entries, hits, misses and hit rate per task kind."""
+    return await cache_stats(db)
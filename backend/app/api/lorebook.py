@@ -2,13 +2,19 @@
 
 import json
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas import LoreEntryCreate, LoreEntryOut, LoreEntryUpdate
 from app.core.database import get_db
 from app.models import LoreEntry, Project
+from app.services.lore_io import (
+    LoreImporter,
+    iter_lorebook_export,
+    iter_lorebook_upload,
+)
 
 router = APIRouter(prefix="/api", tags=["lorebook"])
 
@@ -44,9 +50,20 @@ def _entry_to_out(entry: LoreEntry) -> dict:
 
 # ---------- Import / Export (must be before {entry_id} routes) ----------
 
-@router.post("/lore/import", response_model=list[LoreEntryOut])
+async def _require_project(db: AsyncSession, project_id) -> None:
+    if not project_id or not isinstance(project_id, int):
+        raise HTTPException(400, "project_id is required")
+    if not await db.get(Project, project_id):
+        raise HTTPException(404, "Project not found")
+
+
+@router.post("/lore/import")
 async def import_lore_entries(
-    payload: dict, db: AsyncSession = Depends(get_db)
+    request: Request,
+    project_id: int | None = Query(None),
+    upsert: bool = Query(False),
+    return_entries: bool = Query(True),
+    db: AsyncSession = Depends(get_db),
 ):
     """Import lorebook entries from SillyTavern JSON format.
 
@@ -60,81 +77,72 @@ async def import_lore_entries(
             ...
         }
     }
-    """
-    project_id = payload.get("project_id")
-    if not project_id:
-        raise HTTPException(400, "project_id is required")
-    project = await db.get(Project, project_id)
-    if not project:
-        raise HTTPException(404, "Project not found")
 
-    entries_data = payload.get("entries", {})
-    created = []
-    for _idx, item in entries_data.items():
-        keywords = item.get("key", [])
-        and_keywords = item.get("keysecondary", [])
-        entry = LoreEntry(
-            project_id=project_id,
-            type="Concept",
-            title=item.get("comment", "Untitled"),
-            aliases_json=json.dumps([], ensure_ascii=False),
-            content_md=item.get("content", ""),
-            secrets_md="",
-            triggers_json=json.dumps(
-                {"keywords": keywords, "and_keywords": and_keywords},
-                ensure_ascii=False,
-            ),
-            priority=item.get("order", 5),
-            locked=item.get("constant", False),
-        )
-        db.add(entry)
-        created.append(entry)
-
-    await db.flush()
-    for e in created:
-        await db.refresh(e)
-    return [_entry_to_out(e) for e in created]
+    The body is parsed and written incrementally, so a raw SillyTavern
+    file (or a bare entries map) can be posted as-is with ``?project_id=``.
+    Entries that precede a body ``project_id`` are held until it is read.
+    With ``upsert`` an entry replaces the existing one of the same title
+    (untitled entries are always added). With ``return_entries=false``
+    only counts are returned.
+    """
+    importer = None
+    waiting: list[dict] = []  # entries read before the body's project_id
+    try:
+        async for kind, key, value in iter_lorebook_upload(request.stream()):
+            if kind == "meta":
+                if key == "project_id" and project_id is None:
+                    project_id = value
+                continue
+            if project_id is None:
+                waiting.append(value)
+                continue
+            if importer is None:
+                await _require_project(db, project_id)
+                importer = LoreImporter(db, project_id, upsert=upsert)
+            for item in waiting:
+                await importer.add(item)
+            waiting = []
+            await importer.add(value)
+    except ValueError as exc:
+        raise HTTPException(400, f"Invalid lorebook JSON: {exc}")
+
+    if importer is None:
+        await _require_project(db, project_id)
+        importer = LoreImporter(db, project_id, upsert=upsert)
+    for item in waiting:
+        await importer.add(item)
+    await importer.finish()
+
+    if not return_entries:
+        return {
+            "created": len(importer.created_ids),
+            "updated": len(importer.updated_ids),
+        }
+    ids = [*importer.created_ids, *importer.updated_ids]
+    result = await db.execute(
+        select(LoreEntry)
+        .where(LoreEntry.id.in_(ids))
+        .execution_options(populate_existing=True)
+    )
+    by_id = {e.id: e for e in result.scalars()}
+    return [_entry_to_out(by_id[i]) for i in ids if i in by_id]
 
 
 @router.get("/lore/export")
 async def export_lore_entries(
     project_id: int, db: AsyncSession = Depends(get_db)
 ):
-    """Export all lorebook entries as SillyTavern-compatible JSON."""
+    """Export all lorebook entries as SillyTavern-compatible JSON.
+
+    The document is streamed in row batches rather than built in memory.
+    """
     project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(404, "Project not found")
-
-    result = await db.execute(
-        select(LoreEntry)
-        .where(LoreEntry.project_id == project_id)
-        .order_by(LoreEntry.priority.desc(), LoreEntry.id)
+    return StreamingResponse(
+        iter_lorebook_export(db, project_id, project.title),
+        media_type="application/json",
     )
-    entries = result.scalars().all()
-
-    st_entries = {}
-    for idx, entry in enumerate(entries):
-        triggers = _safe_loads(
-            entry.triggers_json, {"keywords": [], "and_keywords": []}
-        )
-        st_entries[str(idx)] = {
-            "uid": entry.id,
-            "key": triggers.get("keywords", []),
-            "keysecondary": triggers.get("and_keywords", []),
-            "comment": entry.title,
-            "content": entry.content_md,
-            "order": entry.priority,
-            "constant": entry.locked,
-            "enabled": True,
-        }
-
-    return {
-        "entries": st_entries,
-        "originalData": {
-            "name": f"Lorebook - {project.title}",
-            "description": "",
-        },
-    }
 
 
 # ---------- CRUD ----------
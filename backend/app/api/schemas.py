@@ -234,32 +234,144 @@ class KGNodeOut(BaseModel):
     project_id: int
     label: str
     name: str
-    properties: dict
+    properties: dict | None = None
     created_at: datetime
+    # Stored graph metrics; present when listing by metric or community
+    degree: int | None = None
+    pagerank: float | None = None
+    community: int | None = None
     model_config = {"from_attributes": True}
 
 
+class KGNodeAliasOut(BaseModel):
+    id: int
+    node_id: int
+    alias: str
+    created_at: datetime
+    model_config = {"from_attributes": True}
+
+
+class KGMergeOut(BaseModel):
+    node: KGNodeOut
+    merged: int
+    edges_rewired: int
+    edges_merged: int
+    edges_dropped: int
+    aliases: list[KGNodeAliasOut]
+
+
+class KGAnalyticsOut(BaseModel):
+    project_id: int
+    nodes: int
+    edges: int
+    communities: int
+    pagerank_iterations: int
+    community_iterations: int
+    compute_ms: float
+
+
 class KGEdgeOut(BaseModel):
     id: int
     project_id: int
     source_node_id: int
     target_node_id: int
     relation: str
-    properties: dict
+    properties: dict | None = None
     created_at: datetime
     model_config = {"from_attributes": True}
 
 
+class KGGraphNodeOut(BaseModel):
+    id: int
+    label: str
+    name: str
+    distance: int | None = None
+    degree: int | None = None
+    in_degree: int | None = None
+    out_degree: int | None = None
+
+
+class KGGraphEdgeOut(BaseModel):
+    id: int
+    source_node_id: int
+    target_node_id: int
+    relation: str
+
+
+class KGNeighborhoodOut(BaseModel):
+    center: KGGraphNodeOut
+    nodes: list[KGGraphNodeOut]
+    edges: list[KGGraphEdgeOut]
+    truncated: bool
+
+
+class KGPathOut(BaseModel):
+    found: bool
+    hops: int | None
+    nodes: list[KGGraphNodeOut]
+    edges: list[KGGraphEdgeOut]
+
+
 class KGProposalOut(BaseModel):
     id: int
     project_id: int
     chapter_id: int
     category: str
-    data: dict
+    data: dict | None = None
     confidence: float
     status: str
     evidence_text: str
     evidence_location: str
+    source_version_ids: list[int] = []
+    stale: bool = False
     reviewed_at: datetime | None
     created_at: datetime
     model_config = {"from_attributes": True}
+
+
+# --- LLM result cache ---
+
+class LLMCacheKindStats(BaseModel):
+    kind: str
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class LLMCacheStatsOut(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    kinds: list[LLMCacheKindStats]
+
+
+# --- KG extraction jobs ---
+
+class KGJobChapterOut(BaseModel):
+    chapter_id: int
+    position: int
+    status: str
+    proposals: int
+    error: str
+    started_at: datetime | None
+    finished_at: datetime | None
+    model_config = {"from_attributes": True}
+
+
+class KGJobOut(BaseModel):
+    id: int
+    project_id: int
+    book_id: int
+    status: str
+    force: bool
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+    created_at: datetime | None
+    started_at: datetime | None
+    finished_at: datetime | None
+    chapters: list[KGJobChapterOut] | None = None
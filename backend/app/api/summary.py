@@ -7,12 +7,14 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas import ChapterSummaryOut, ChapterSummaryUpdate
-from app.core.database import get_db
+from app.core.database import get_db, session_factory_for
 from app.core.events import ChapterMarkDoneEvent, emit
-from app.models import Book, Chapter, ChapterSummary
+from app.models import Chapter, ChapterSummary
+from app.services.hierarchy import resolve_chapter_ancestry
 from app.services.summary import (
     EmptyChapterError,
     generate_chapter_summary,
+    schedule_rollup_refresh,
 )
 
 router = APIRouter(prefix="/api", tags=["summary"])
@@ -45,15 +47,15 @@ async def mark_chapter_done(
     await db.flush()
 
     # Resolve project_id for event
-    book = await db.get(Book, chapter.book_id)
-    if not book:
+    ancestry = await resolve_chapter_ancestry(db, chapter_id)
+    if not ancestry:
         raise HTTPException(404, "Book not found")
 
     # TODO: wire handlers for auto-bible-update etc.
     await emit(
         ChapterMarkDoneEvent(
             chapter_id=chapter_id,
-            project_id=book.project_id,
+            project_id=ancestry.project_id,
         )
     )
 
@@ -66,6 +68,7 @@ async def mark_chapter_done(
             400, "Chapter has no text content"
         )
 
+    await _refresh_rollups_later(db, chapter.book_id)
     return _summary_to_out(summary)
 
 
@@ -74,22 +77,28 @@ async def mark_chapter_done(
     response_model=ChapterSummaryOut,
 )
 async def extract_chapter_summary(
-    chapter_id: int, db: AsyncSession = Depends(get_db)
+    chapter_id: int,
+    force: bool = False,
+    db: AsyncSession = Depends(get_db),
 ):
-    """Manually trigger summary extraction for a chapter."""
+    """Manually trigger summary extraction for a chapter.
+
+    Unchanged text reuses the cached result; ``force`` regenerates.
+    """
     chapter = await db.get(Chapter, chapter_id)
     if not chapter:
         raise HTTPException(404, "Chapter not found")
 
     try:
         summary = await generate_chapter_summary(
-            db, chapter_id
+            db, chapter_id, force=force
         )
     except EmptyChapterError:
         raise HTTPException(
             400, "Chapter has no text content"
         )
 
+    await _refresh_rollups_later(db, chapter.book_id)
     return _summary_to_out(summary)
 
 
@@ -160,9 +169,18 @@ async def update_chapter_summary(
         )
 
     await db.flush()
+    if body.summary_md is not None:
+        await _refresh_rollups_later(db, chapter.book_id)
     return _summary_to_out(summary)
 
 
+async def _refresh_rollups_later(db: AsyncSession, book_id: int) -> None:
+    """Roll the new summary up off the request path (LLM calls)."""
+    # The refresh reads the summaries on its own session
+    await db.commit()
+    schedule_rollup_refresh(book_id, session_factory_for(db))
+
+
 def _safe_loads(raw: str) -> list:
     """Safely parse JSON, return empty list on failure."""
     try:
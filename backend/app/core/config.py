@@ -20,6 +20,32 @@ class Settings(BaseSettings):
     CTX_LONGTERM_RESERVED: int = 2048
     CTX_LONGTERM_MAX: int = 4096
     CTX_STRUCTURED_MAX: int = 6144
+    # Budget unit for the context pack: "chars" | "tokens"
+    CTX_BUDGET_MODE: str = "chars"
+    CTX_TOTAL_TOKENS: int = 16384
+
+    # Context Pack result cache
+    CTX_CACHE_ENABLED: bool = True
+    CTX_CACHE_MAX_ENTRIES: int = 256
+
+    # Lorebook: scenes (current + preceding) scanned for triggers
+    LORE_SCAN_DEPTH: int = 2
+    # Lore budget fitting: "priority" (fill in order) | "knapsack"
+    LORE_SELECTION_MODE: str = "priority"
+    # Rounds of entry-content → entry triggering (0 = off)
+    LORE_RECURSION_DEPTH: int = 0
+
+    # Summary hierarchy: chapters per arc rollup
+    SUMMARY_ARC_SIZE: int = 10
+
+    # KG extraction: windows (chars), their overlap, neighbouring-scene
+    # context sent with edited scenes (chars per side), parallel LLM calls
+    KG_EXTRACT_WINDOW_CHARS: int = 6000
+    KG_EXTRACT_OVERLAP_CHARS: int = 400
+    KG_EXTRACT_CONTEXT_CHARS: int = 200
+    KG_EXTRACT_CONCURRENCY: int = 4
+    # Whole-book extraction jobs: chapters in flight at once
+    KG_JOB_CONCURRENCY: int = 2
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
@@ -26,6 +26,11 @@ class Base(DeclarativeBase):
     pass
 
 
+def session_factory_for(db: AsyncSession) -> async_sessionmaker:
+    """Sessions of their own on db's engine, for work outliving a request."""
+    return async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+
+
 async def get_db() -> AsyncSession:
     async with async_session() as session:
         try:
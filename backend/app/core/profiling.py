@@ -0,0 +1,47 @@
+"""Lightweight in-process profiling: wall time + SQL statement counts.
+
+A ``Probe`` counts every cursor execution made by the current asyncio task
+(and tasks it spawns after entering) while it is open. Probes nest: an
+outer probe also counts statements issued under an inner one.
+"""
+
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_active_counters: ContextVar[tuple[list[int], ...]] = ContextVar(
+    "active_sql_counters", default=()
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter[0] += 1
+
+
+class Probe:
+    """Context manager measuring wall time and SQL statements."""
+
+    def __init__(self) -> None:
+        self._counter = [0]
+        self._token = None
+        self._start = 0.0
+        self.wall_ms = 0.0
+
+    @property
+    def sql_count(self) -> int:
+        return self._counter[0]
+
+    def __enter__(self) -> "Probe":
+        self._token = _active_counters.set(
+            _active_counters.get() + (self._counter,)
+        )
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.wall_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        _active_counters.reset(self._token)
@@ -7,6 +7,7 @@ from app.api.bible import router as bible_router
 from app.api.export import router as export_router
 from app.api.generation import router as generation_router
 from app.api.kg import router as kg_router
+from app.api.llm_cache import router as llm_cache_router
 from app.api.lorebook import router as lorebook_router
 from app.api.projects import router as projects_router
 from app.api.qa import router as qa_router
@@ -19,7 +20,18 @@ async def lifespan(app: FastAPI):
 
     from sqlalchemy import text
 
-    from app.core.database import Base, engine
+    from app.core.database import Base, async_session, engine
+    from app.models.tables import (
+        KG_DEATH_LOCATION_SQL,
+        KG_EDGE_NARRATIVE_DAY_SQL,
+        KG_NODE_STATUS_SQL,
+        KG_PROPOSAL_NARRATIVE_DAY_SQL,
+        KG_RESOLVED_LOCATION_SQL,
+    )
+    from app.services.kg_facts import backfill_fact_index
+    from app.services.kg_jobs import resume_jobs, stop_jobs
+    from app.services.kg_names import backfill_name_keys
+    from app.services.summary import stop_rollup_refreshes
 
     os.makedirs("data", exist_ok=True)
     async with engine.begin() as conn:
@@ -27,6 +39,33 @@ async def lifespan(app: FastAPI):
         # Lightweight column migrations for existing tables
         for table, column, col_type in [
             ("scenes", "scene_card_json", "TEXT"),
+            ("kg_proposals", "fact_line", "TEXT"),
+            ("kg_proposals", "source_versions_json", "TEXT DEFAULT '[]'"),
+            ("kg_proposals", "stale", "BOOLEAN NOT NULL DEFAULT 0"),
+            ("kg_nodes", "name_key", "VARCHAR(200)"),
+            ("chapter_summaries", "source_key", "VARCHAR(64) DEFAULT ''"),
+            # Virtual generated columns can be added in place
+            ("kg_nodes", "status", f"TEXT GENERATED ALWAYS AS ({KG_NODE_STATUS_SQL}) VIRTUAL"),
+            (
+                "kg_nodes",
+                "death_location",
+                f"TEXT GENERATED ALWAYS AS ({KG_DEATH_LOCATION_SQL}) VIRTUAL",
+            ),
+            (
+                "kg_nodes",
+                "resolved_location",
+                f"TEXT GENERATED ALWAYS AS ({KG_RESOLVED_LOCATION_SQL}) VIRTUAL",
+            ),
+            (
+                "kg_edges",
+                "narrative_day",
+                f"INTEGER GENERATED ALWAYS AS ({KG_EDGE_NARRATIVE_DAY_SQL}) VIRTUAL",
+            ),
+            (
+                "kg_proposals",
+                "narrative_day",
+                f"INTEGER GENERATED ALWAYS AS ({KG_PROPOSAL_NARRATIVE_DAY_SQL}) VIRTUAL",
+            ),
         ]:
             try:
                 await conn.execute(
@@ -34,7 +73,57 @@ async def lifespan(app: FastAPI):
                 )
             except Exception:
                 pass  # Column already exists
+        # Hierarchy FK indexes for databases created before they were declared
+        for table, column in [
+            ("books", "project_id"),
+            ("chapters", "book_id"),
+            ("scenes", "chapter_id"),
+            ("scene_text_versions", "scene_id"),
+        ]:
+            await conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} "
+                    f"ON {table} ({column})"
+                )
+            )
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_scene_text_versions_scene_version "
+                "ON scene_text_versions (scene_id, version)"
+            )
+        )
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_kg_proposals_project_confidence "
+                "ON kg_proposals (project_id, confidence DESC, id)"
+            )
+        )
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_kg_nodes_project_name_key "
+                "ON kg_nodes (project_id, name_key)"
+            )
+        )
+        for table, column in [
+            ("kg_nodes", "status"),
+            ("kg_edges", "narrative_day"),
+            ("kg_proposals", "narrative_day"),
+        ]:
+            await conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_project_{column} "
+                    f"ON {table} (project_id, {column})"
+                )
+            )
+    async with async_session() as session:
+        await backfill_fact_index(session)
+        await backfill_name_keys(session)
+        await session.commit()
+    # Whole-book extraction jobs interrupted by the last shutdown
+    await resume_jobs(async_session)
     yield
+    await stop_jobs()
+    await stop_rollup_refreshes()
 
 
 app = FastAPI(
@@ -50,6 +139,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 app.include_router(projects_router)
@@ -60,6 +150,7 @@ app.include_router(summary_router)
 app.include_router(export_router)
 app.include_router(kg_router)
 app.include_router(qa_router)
+app.include_router(llm_cache_router)
 
 
 @app.get("/health")
@@ -4,10 +4,19 @@ from app.models.tables import (  # noqa: F401
     Chapter,
     ChapterSummary,
     KGEdge,
+    KGExtractionJob,
+    KGExtractionJobChapter,
+    KGFactTerm,
     KGNode,
+    KGNodeAlias,
+    KGNodeMetric,
     KGProposal,
+    KGSceneExtraction,
+    LLMResultCache,
     LoreEntry,
     Project,
     Scene,
+    SceneLoreActivation,
     SceneTextVersion,
+    SummaryRollup,
 )
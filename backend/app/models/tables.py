@@ -2,20 +2,53 @@ import datetime
 
 from sqlalchemy import (
     Boolean,
+    Computed,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
     func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
 
 
+def _json_prop(column: str, path: str) -> str:
+    """SQL for one JSON property; NULL when the column is not valid JSON."""
+    return f"CASE WHEN json_valid({column}) THEN json_extract({column}, '{path}') END"
+
+
+# Hot lifecycle properties, materialized as indexed virtual generated
+# columns so the consistency checks filter with index lookups instead of
+# decoding every row. Deferred: they are only read by targeted queries.
+KG_NODE_STATUS_SQL = (
+    "lower(coalesce(nullif("
+    + _json_prop("properties_json", "$.status")
+    + ", ''), "
+    + _json_prop("properties_json", "$.Status")
+    + "))"
+)
+KG_DEATH_LOCATION_SQL = _json_prop("properties_json", "$.death_location")
+KG_RESOLVED_LOCATION_SQL = _json_prop("properties_json", "$.resolved_location")
+KG_EDGE_NARRATIVE_DAY_SQL = _json_prop("properties_json", "$.narrative_day")
+# data.narrative_day, falling back to data.properties.narrative_day when unset/falsy
+KG_PROPOSAL_NARRATIVE_DAY_SQL = (
+    "CASE WHEN coalesce("
+    + _json_prop("data_json", "$.narrative_day")
+    + ", 0) IN (0, '') THEN "
+    + _json_prop("data_json", "$.properties.narrative_day")
+    + " ELSE "
+    + _json_prop("data_json", "$.narrative_day")
+    + " END"
+)
+
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -44,7 +77,9 @@ class Book(Base):
     __tablename__ = "books"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime.datetime] = mapped_column(
@@ -61,7 +96,9 @@ class Chapter(Base):
     __tablename__ = "chapters"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"))
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", ondelete="CASCADE"), index=True
+    )
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     status: Mapped[str] = mapped_column(String(20), default="draft")  # draft | done
@@ -79,7 +116,9 @@ class Scene(Base):
     __tablename__ = "scenes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    chapter_id: Mapped[int] = mapped_column(ForeignKey("chapters.id", ondelete="CASCADE"))
+    chapter_id: Mapped[int] = mapped_column(
+        ForeignKey("chapters.id", ondelete="CASCADE"), index=True
+    )
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     scene_card_json: Mapped[str | None] = mapped_column(
@@ -99,9 +138,14 @@ class Scene(Base):
 
 class SceneTextVersion(Base):
     __tablename__ = "scene_text_versions"
+    __table_args__ = (
+        Index("ix_scene_text_versions_scene_version", "scene_id", "version"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    scene_id: Mapped[int] = mapped_column(ForeignKey("scenes.id", ondelete="CASCADE"))
+    scene_id: Mapped[int] = mapped_column(
+        ForeignKey("scenes.id", ondelete="CASCADE"), index=True
+    )
     version: Mapped[int] = mapped_column(Integer, nullable=False)
     content_md: Mapped[str] = mapped_column(Text, default="")
     char_count: Mapped[int] = mapped_column(Integer, default=0)
@@ -145,6 +189,8 @@ class ChapterSummary(Base):
     keywords_json: Mapped[str] = mapped_column(Text, default="[]")
     entities_json: Mapped[str] = mapped_column(Text, default="[]")
     plot_threads_json: Mapped[str] = mapped_column(Text, default="[]")
+    # LLM result cache key of the output this summary was parsed from
+    source_key: Mapped[str] = mapped_column(String(64), default="")
     updated_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now()
     )
@@ -153,6 +199,53 @@ class ChapterSummary(Base):
     )
 
 
+class SummaryRollup(Base):
+    """Arc or whole-book summary rolled up from chapter summaries."""
+
+    __tablename__ = "summary_rollups"
+    __table_args__ = (
+        UniqueConstraint("book_id", "level", "arc_index", name="uq_rollup_book_level_arc"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", ondelete="CASCADE"), index=True
+    )
+    level: Mapped[str] = mapped_column(String(10), nullable=False)  # arc | book
+    arc_index: Mapped[int] = mapped_column(Integer, default=0)
+    # Sort range of the summarized chapters this node covers
+    first_sort: Mapped[int] = mapped_column(Integer, default=0)
+    last_sort: Mapped[int] = mapped_column(Integer, default=0)
+    summary_md: Mapped[str] = mapped_column(Text, default="")
+    # Hash of the child summaries the node was generated from
+    source_hash: Mapped[str] = mapped_column(String(64), default="")
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
+class LLMResultCache(Base):
+    """Raw LLM output keyed by a hash of what produced it (services/llm_cache)."""
+
+    __tablename__ = "llm_result_cache"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # sha256 over (kind, model, messages)
+    key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    model: Mapped[str] = mapped_column(String(200), default="")
+    raw_output: Mapped[str] = mapped_column(Text, default="")
+    # Lookups served from this row / LLM calls that (re)filled it
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    misses: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
 class LoreEntry(Base):
     __tablename__ = "lore_entries"
 
@@ -182,10 +275,36 @@ class LoreEntry(Base):
     project: Mapped["Project"] = relationship(back_populates="lore_entries")
 
 
+class SceneLoreActivation(Base):
+    """Lore entries a streamed draft of a scene triggered (one row per scene).
+
+    Keyed by a hash of the draft text: valid only while the scene's latest
+    version is that text.
+    """
+
+    __tablename__ = "scene_lore_activations"
+
+    scene_id: Mapped[int] = mapped_column(
+        ForeignKey("scenes.id", ondelete="CASCADE"), primary_key=True
+    )
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
+    text_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Lore (max updated_at, count) when recorded; other lore, other matches
+    lore_stamp: Mapped[str] = mapped_column(String(64), default="")
+    entry_ids_json: Mapped[str] = mapped_column(Text, default="[]")
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
 class KGNode(Base):
     __tablename__ = "kg_nodes"
     __table_args__ = (
         UniqueConstraint("project_id", "label", "name", name="uq_kgnode_proj_label_name"),
+        Index("ix_kg_nodes_project_name_key", "project_id", "name_key"),
+        Index("ix_kg_nodes_project_status", "project_id", "status"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -194,7 +313,18 @@ class KGNode(Base):
     )
     label: Mapped[str] = mapped_column(String(50), nullable=False)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
+    # Normalized name (kg_names.normalize_name), set on flush
+    name_key: Mapped[str | None] = mapped_column(String(200), nullable=True)
     properties_json: Mapped[str] = mapped_column(Text, default="{}")
+    status: Mapped[str | None] = mapped_column(
+        Text, Computed(KG_NODE_STATUS_SQL), deferred=True
+    )
+    death_location: Mapped[str | None] = mapped_column(
+        Text, Computed(KG_DEATH_LOCATION_SQL), deferred=True
+    )
+    resolved_location: Mapped[str | None] = mapped_column(
+        Text, Computed(KG_RESOLVED_LOCATION_SQL), deferred=True
+    )
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, server_default=func.now()
     )
@@ -203,6 +333,28 @@ class KGNode(Base):
     )
 
 
+class KGNodeAlias(Base):
+    """Alternative spelling that resolves to a KG node."""
+
+    __tablename__ = "kg_node_aliases"
+    __table_args__ = (
+        UniqueConstraint("project_id", "alias_key", name="uq_kgalias_proj_key"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE")
+    )
+    node_id: Mapped[int] = mapped_column(
+        ForeignKey("kg_nodes.id", ondelete="CASCADE"), index=True
+    )
+    alias: Mapped[str] = mapped_column(String(200), nullable=False)
+    alias_key: Mapped[str] = mapped_column(String(200), nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+
+
 class KGEdge(Base):
     __tablename__ = "kg_edges"
     __table_args__ = (
@@ -210,6 +362,7 @@ class KGEdge(Base):
             "project_id", "source_node_id", "target_node_id", "relation",
             name="uq_kgedge_proj_src_tgt_rel",
         ),
+        Index("ix_kg_edges_project_narrative_day", "project_id", "narrative_day"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -224,6 +377,10 @@ class KGEdge(Base):
     )
     relation: Mapped[str] = mapped_column(String(100), nullable=False)
     properties_json: Mapped[str] = mapped_column(Text, default="{}")
+    # INTEGER affinity: numeric strings ("3") are stored as numbers
+    narrative_day: Mapped[int | None] = mapped_column(
+        Integer, Computed(KG_EDGE_NARRATIVE_DAY_SQL), deferred=True
+    )
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, server_default=func.now()
     )
@@ -231,6 +388,14 @@ class KGEdge(Base):
 
 class KGProposal(Base):
     __tablename__ = "kg_proposals"
+    __table_args__ = (
+        # Serves the (confidence desc, id) listing and its keyset pages
+        Index(
+            "ix_kg_proposals_project_confidence",
+            "project_id", text("confidence DESC"), "id",
+        ),
+        Index("ix_kg_proposals_project_narrative_day", "project_id", "narrative_day"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     project_id: Mapped[int] = mapped_column(
@@ -247,7 +412,132 @@ class KGProposal(Base):
     )
     evidence_text: Mapped[str] = mapped_column(Text, default="")
     evidence_location: Mapped[str] = mapped_column(String(200), default="")
+    # Rendered context line, derived from data_json on flush (kg_facts)
+    fact_line: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # SceneTextVersion ids the fact was extracted from (kg_extraction)
+    source_versions_json: Mapped[str] = mapped_column(Text, default="[]")
+    # Every source version has been superseded without the fact reappearing
+    stale: Mapped[bool] = mapped_column(Boolean, default=False)
+    # INTEGER affinity: numeric strings ("3") are stored as numbers
+    narrative_day: Mapped[int | None] = mapped_column(
+        Integer, Computed(KG_PROPOSAL_NARRATIVE_DAY_SQL), deferred=True
+    )
     reviewed_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, server_default=func.now()
     )
+
+
+class KGSceneExtraction(Base):
+    """Scene version last sent through KG extraction (one row per scene)."""
+
+    __tablename__ = "kg_scene_extractions"
+
+    scene_id: Mapped[int] = mapped_column(
+        ForeignKey("scenes.id", ondelete="CASCADE"), primary_key=True
+    )
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
+    chapter_id: Mapped[int] = mapped_column(
+        ForeignKey("chapters.id", ondelete="CASCADE"), index=True
+    )
+    version_id: Mapped[int] = mapped_column(
+        ForeignKey("scene_text_versions.id", ondelete="CASCADE")
+    )
+    extracted_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
+class KGExtractionJob(Base):
+    """Whole-book KG extraction run (services/kg_jobs)."""
+
+    __tablename__ = "kg_extraction_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", ondelete="CASCADE"), index=True
+    )
+    # queued | running | done | partial (some chapters failed) | failed
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)
+    force: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+    started_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class KGExtractionJobChapter(Base):
+    """Per-chapter state of an extraction job."""
+
+    __tablename__ = "kg_extraction_job_chapters"
+    __table_args__ = (
+        Index("ix_kg_extraction_job_chapters_job_status", "job_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id: Mapped[int] = mapped_column(
+        ForeignKey("kg_extraction_jobs.id", ondelete="CASCADE")
+    )
+    chapter_id: Mapped[int] = mapped_column(
+        ForeignKey("chapters.id", ondelete="CASCADE")
+    )
+    # Book order of the chapter
+    position: Mapped[int] = mapped_column(Integer, default=0)
+    # pending | running | done | failed
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    proposals: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(Text, default="")
+    started_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class KGNodeMetric(Base):
+    """Graph analytics for one KG node (see services/kg_analytics)."""
+
+    __tablename__ = "kg_node_metrics"
+    __table_args__ = (
+        Index("ix_kg_node_metrics_project_pagerank", "project_id", text("pagerank DESC")),
+        Index("ix_kg_node_metrics_project_community", "project_id", "community"),
+    )
+
+    node_id: Mapped[int] = mapped_column(
+        ForeignKey("kg_nodes.id", ondelete="CASCADE"), primary_key=True
+    )
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE")
+    )
+    degree: Mapped[int] = mapped_column(Integer, default=0)
+    in_degree: Mapped[int] = mapped_column(Integer, default=0)
+    out_degree: Mapped[int] = mapped_column(Integer, default=0)
+    pagerank: Mapped[float] = mapped_column(Float, default=0.0)
+    # Smallest node id in the node's community
+    community: Mapped[int] = mapped_column(Integer)
+    computed_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+
+
+class KGFactTerm(Base):
+    """Entity name mentioned by a KG proposal (name → fact index)."""
+
+    __tablename__ = "kg_fact_terms"
+    __table_args__ = (
+        Index("ix_kg_fact_terms_project_term", "project_id", "term"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    project_id: Mapped[int] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE")
+    )
+    proposal_id: Mapped[int] = mapped_column(
+        ForeignKey("kg_proposals.id", ondelete="CASCADE"), index=True
+    )
+    term: Mapped[str] = mapped_column(String(200), nullable=False)
+
+    proposal: Mapped["KGProposal"] = relationship()
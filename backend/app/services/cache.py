@@ -0,0 +1,168 @@
+"""In-process caches for the generation hot path.
+
+Two building blocks:
+  - LRUCache: bounded mapping with hit/miss counters.
+  - Write generations: counters bumped on every ORM flush, so cached
+    values can be invalidated by writes made through this process even
+    when DB timestamps (1s resolution in SQLite) have not moved.
+
+Caches may be filled from a session's uncommitted rows. When that session
+ends without committing, the projects it wrote are bumped again and the
+``on_discarded_writes`` hooks run, so nothing built from rolled-back rows
+survives (row counts and max ids can match again once ids are reused).
+"""
+
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Hashable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import KGExtractionJob, KGExtractionJobChapter, LLMResultCache
+from app.services.hierarchy import project_of_row
+
+_MISSING = object()
+_UNCOMMITTED_KEY = "uncommitted_projects"
+_Hook = TypeVar("_Hook", bound=Callable[[int | None], None])
+
+
+class LRUCache:
+    """Least-recently-used cache with hit/miss accounting."""
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(
+        self,
+        key: Hashable,
+        default: Any = None,
+        valid: Callable[[Any], bool] | None = None,
+    ) -> Any:
+        """Return the cached value, or default on a miss.
+
+        When valid is given, an entry failing it is dropped and counted
+        as a miss (stale version stamp).
+        """
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING and valid is not None and not valid(value):
+            del self._data[key]
+            value = _MISSING
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every key matching predicate. Returns number removed."""
+        doomed = [k for k in self._data if predicate(k)]
+        for k in doomed:
+            del self._data[k]
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# ---------- Write generations ----------
+
+_global_generation = 0
+_project_generations: dict[int, int] = defaultdict(int)
+
+
+def write_generation(project_id: int) -> tuple[int, int]:
+    """Return (global, project) generation counters for cache stamping."""
+    return _global_generation, _project_generations[project_id]
+
+
+def bump_generation(project_id: int | None = None) -> None:
+    """Mark cached data stale for one project, or for all when None."""
+    global _global_generation
+    if project_id is None:
+        _global_generation += 1
+    else:
+        _project_generations[project_id] += 1
+
+
+# Tables whose rows never feed a cached value
+_UNTRACKED = (LLMResultCache, KGExtractionJob, KGExtractionJobChapter)
+_discard_hooks: list[Callable[[int | None], None]] = []
+
+
+def on_discarded_writes(hook: _Hook) -> _Hook:
+    """Register hook(project_id) for writes rolled back; None means unknown."""
+    _discard_hooks.append(hook)
+    return hook
+
+
+def _uncommitted(session: Session) -> set[int | None]:
+    return session.info.setdefault(_UNCOMMITTED_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_writes(session, flush_context):
+    """Bump the project generation of every flushed row.
+
+    Rows below the project (chapters, scenes, versions, summaries) are
+    resolved to it through the session's ancestry memo. Only a row whose
+    project cannot be resolved bumps the global counter.
+    """
+    projects: set[int | None] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, _UNTRACKED):
+            projects.add(project_of_row(session, obj))
+    for project_id in projects:
+        bump_generation(project_id)
+    _uncommitted(session).update(projects)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_writes(state):
+    """Note bulk DML (insert/update/delete statements), which skips the flush."""
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, _UNTRACKED):
+        # The statement does not say which project it touched
+        _uncommitted(state.session).add(None)
+
+
+@event.listens_for(Session, "after_commit")
+def _writes_committed(session):
+    session.info.pop(_UNCOMMITTED_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _writes_discarded(session, transaction):
+    # Runs after after_commit, so anything left here was rolled back
+    if transaction.parent is not None:
+        return
+    for project_id in session.info.pop(_UNCOMMITTED_KEY, ()):
+        bump_generation(project_id)
+        for hook in _discard_hooks:
+            hook(project_id)
@@ -3,10 +3,11 @@
 import json
 from collections import defaultdict
 
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.tables import Book, Chapter, KGEdge, KGNode, KGProposal, Scene, SceneTextVersion
+from app.services.scene_text import is_latest_version
 
 
 def _safe_loads(raw: str, default=None):
@@ -30,15 +31,6 @@ def _extract_ngrams(text: str, n: int) -> list[str]:
 
 async def _build_scene_index(db: AsyncSession, project_id: int) -> list[dict]:
     """Return ordered list of {chapter_sort, chapter_id, scene_id, scene_sort, text, location}."""
-    latest = (
-        select(
-            SceneTextVersion.scene_id,
-            func.max(SceneTextVersion.version).label("max_ver"),
-        )
-        .group_by(SceneTextVersion.scene_id)
-        .subquery()
-    )
-
     result = await db.execute(
         select(
             Book.id.label("book_id"),
@@ -51,13 +43,8 @@ async def _build_scene_index(db: AsyncSession, project_id: int) -> list[dict]:
         )
         .join(Chapter, Chapter.book_id == Book.id)
         .join(Scene, Scene.chapter_id == Chapter.id)
-        .join(latest, latest.c.scene_id == Scene.id)
-        .join(
-            SceneTextVersion,
-            (SceneTextVersion.scene_id == Scene.id)
-            & (SceneTextVersion.version == latest.c.max_ver),
-        )
-        .where(Book.project_id == project_id)
+        .join(SceneTextVersion, SceneTextVersion.scene_id == Scene.id)
+        .where(Book.project_id == project_id, is_latest_version())
         .order_by(Book.sort_order, Chapter.sort_order, Scene.sort_order)
     )
     rows = result.all()
@@ -85,21 +72,17 @@ async def _check_character_status(
     db: AsyncSession, project_id: int, scenes: list[dict]
 ) -> list[dict]:
     """Detect dead characters appearing in later scene text."""
+    # status / death_location are indexed generated columns over properties_json
     result = await db.execute(
-        select(KGNode).where(
+        select(KGNode.name, KGNode.death_location).where(
             KGNode.project_id == project_id,
+            KGNode.status == "dead",
             KGNode.label == "Character",
         )
+        .order_by(KGNode.id)
     )
-    characters = result.scalars().all()
-
-    dead_chars: list[tuple[str, str]] = []  # (name, death_location or "")
-    for char in characters:
-        props = _safe_loads(char.properties_json, {})
-        status = props.get("status", "") or props.get("Status", "")
-        if str(status).lower() == "dead":
-            death_loc = props.get("death_location", "")
-            dead_chars.append((char.name, death_loc))
+    # (name, death_location or "")
+    dead_chars = [(name, death_loc or "") for name, death_loc in result.all()]
 
     if not dead_chars:
         return []
@@ -155,16 +138,31 @@ async def _check_character_status(
 async def _check_timeline(db: AsyncSession, project_id: int) -> list[dict]:
     """Detect events with narrative_day property ordered inconsistently with chapter sort."""
     # Gather events from KGProposals with narrative_day in data_json
+    # (narrative_day is an indexed generated column; only those rows load)
     result = await db.execute(
-        select(KGProposal).where(KGProposal.project_id == project_id)
+        select(
+            KGProposal.id,
+            KGProposal.chapter_id,
+            KGProposal.evidence_location,
+            KGProposal.data_json,
+            KGProposal.narrative_day,
+        ).where(
+            KGProposal.project_id == project_id,
+            KGProposal.narrative_day.is_not(None),
+        )
+        .order_by(KGProposal.id)
     )
-    proposals = result.scalars().all()
+    proposals = result.all()
 
     # Also look at KGEdge properties for narrative_day
     edge_result = await db.execute(
-        select(KGEdge).where(KGEdge.project_id == project_id)
+        select(KGEdge.id, KGEdge.narrative_day).where(
+            KGEdge.project_id == project_id,
+            KGEdge.narrative_day.is_not(None),
+        )
+        .order_by(KGEdge.id)
     )
-    edges = edge_result.scalars().all()
+    edges = edge_result.all()
 
     # Map chapter_id -> sort_order
     ch_result = await db.execute(
@@ -177,41 +175,36 @@ async def _check_timeline(db: AsyncSession, project_id: int) -> list[dict]:
     events: list[dict] = []  # {name, narrative_day, chapter_id, chapter_sort, location}
 
     for p in proposals:
+        try:
+            day = int(p.narrative_day)
+        except (ValueError, TypeError):
+            continue
         data = _safe_loads(p.data_json, {})
-        day = data.get("narrative_day") or data.get("properties", {}).get("narrative_day")
-        if day is not None:
-            try:
-                day = int(day)
-            except (ValueError, TypeError):
-                continue
-            ch_sort = chapter_sort.get(p.chapter_id, 0)
-            events.append(
-                {
-                    "name": data.get("name") or data.get("label") or f"proposal:{p.id}",
-                    "narrative_day": day,
-                    "chapter_id": p.chapter_id,
-                    "chapter_sort": ch_sort,
-                    "location": p.evidence_location or f"chapter:{p.chapter_id}",
-                }
-            )
+        ch_sort = chapter_sort.get(p.chapter_id, 0)
+        events.append(
+            {
+                "name": data.get("name") or data.get("label") or f"proposal:{p.id}",
+                "narrative_day": day,
+                "chapter_id": p.chapter_id,
+                "chapter_sort": ch_sort,
+                "location": p.evidence_location or f"chapter:{p.chapter_id}",
+            }
+        )
 
-    for e in edges:
-        props = _safe_loads(e.properties_json, {})
-        day = props.get("narrative_day")
-        if day is not None:
-            try:
-                day = int(day)
-            except (ValueError, TypeError):
-                continue
-            events.append(
-                {
-                    "name": f"edge:{e.id}",
-                    "narrative_day": day,
-                    "chapter_id": None,
-                    "chapter_sort": 0,
-                    "location": f"edge:{e.id}",
-                }
-            )
+    for edge_id, day in edges:
+        try:
+            day = int(day)
+        except (ValueError, TypeError):
+            continue
+        events.append(
+            {
+                "name": f"edge:{edge_id}",
+                "narrative_day": day,
+                "chapter_id": None,
+                "chapter_sort": 0,
+                "location": f"edge:{edge_id}",
+            }
+        )
 
     conflicts = []
     # Compare every pair: if A has higher narrative_day but lower chapter_sort than B -> conflict
@@ -318,21 +311,17 @@ async def _check_possession(db: AsyncSession, project_id: int) -> list[dict]:
 async def _check_plot_thread(db: AsyncSession, project_id: int, scenes: list[dict]) -> list[dict]:
     """Detect resolved plot threads referenced as active in later scenes."""
     result = await db.execute(
-        select(KGNode).where(
+        select(KGNode.name, KGNode.resolved_location).where(
             KGNode.project_id == project_id,
+            KGNode.status == "resolved",
             KGNode.label.in_(["Event", "PlotThread", "Plot"]),
         )
+        .order_by(KGNode.id)
     )
-    nodes = result.scalars().all()
 
     conflicts = []
-    for node in nodes:
-        props = _safe_loads(node.properties_json, {})
-        status = str(props.get("status", "") or props.get("Status", "")).lower()
-        if status != "resolved":
-            continue
-
-        resolved_loc = props.get("resolved_location", "")
+    for name, resolved_loc in result.all():
+        resolved_loc = resolved_loc or ""
         resolved_idx: int | None = None
         if resolved_loc:
             for i, scene in enumerate(scenes):
@@ -344,13 +333,13 @@ async def _check_plot_thread(db: AsyncSession, project_id: int, scenes: list[dic
         reappearances = [
             scene["location"]
             for scene in scenes[check_from:]
-            if node.name in scene["text"]
+            if name in scene["text"]
         ]
 
         if reappearances:
             has_loc = resolved_idx is not None
             conf = 1.0 if has_loc else 0.6
-            evidence = [f"Plot thread '{node.name}' marked resolved"]
+            evidence = [f"Plot thread '{name}' marked resolved"]
             if resolved_loc:
                 evidence.append(f"Resolved at {resolved_loc}")
             evidence.append(f"Referenced again at {reappearances[0]}")
@@ -362,12 +351,12 @@ async def _check_plot_thread(db: AsyncSession, project_id: int, scenes: list[dic
                     "confidence": conf,
                     "source": "rule",
                     "message": (
-                        f"Resolved plot thread '{node.name}' is referenced again in later scenes."
+                        f"Resolved plot thread '{name}' is referenced again in later scenes."
                     ),
                     "evidence": evidence,
                     "evidence_locations": ([resolved_loc] if resolved_loc else []) + reappearances,
                     "suggest_fix": (
-                        f"Remove or update references to '{node.name}' after it was resolved."
+                        f"Remove or update references to '{name}' after it was resolved."
                     ),
                 }
             )
@@ -8,17 +8,39 @@ Layers:
 
 Overflow degradation: each layer is hard-capped at its max ratio.
 Leftover budget from earlier layers flows to Recent (layer 4).
+
+Budgets are in characters by default. Token mode (CTX_BUDGET_MODE or
+budget_mode="tokens") measures with the model's tiktoken encoding and
+caps layers with the CTX_* token settings instead of plain ratios.
+
+Assembled packs are cached per (project, scene, chapter, budget) and
+validated against a version stamp of every input the layers read.
 """
 
+import copy
 import json
 
-from sqlalchemy import select
+from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import BibleField, Chapter, ChapterSummary, Scene, SceneTextVersion
-from app.models.tables import KGProposal
-from app.services.lorebook import inject_lorebook
-from app.services.text_utils import truncate_to_sentence
+from app.core.config import settings
+from app.core.profiling import Probe
+from app.models import (
+    BibleField,
+    Chapter,
+    ChapterSummary,
+    LoreEntry,
+    Scene,
+    SceneTextVersion,
+    SummaryRollup,
+)
+from app.models.tables import KGFactTerm, KGNode, KGNodeMetric, KGProposal
+from app.services.cache import LRUCache, write_generation
+from app.services.hierarchy import resolve_chapter_ancestry, resolve_scene_ancestry
+from app.services.kg_facts import match_fact_terms
+from app.services.lorebook import get_scan_texts, inject_lorebook
+from app.services.scene_text import get_latest_scene_texts
+from app.services.text_utils import CHARS, BudgetMeter
 
 # Budget ratios (fraction of total_budget_chars)
 _SYSTEM_MAX = 0.10
@@ -31,11 +53,15 @@ _SEPARATOR = "\n\n---\n\n"
 # Default total budget in chars (~8K tokens for CJK)
 DEFAULT_BUDGET_CHARS = 32_000
 
+_APPROVED_STATUSES = ("auto_approved", "user_approved")
+
+context_pack_cache = LRUCache(maxsize=settings.CTX_CACHE_MAX_ENTRIES)
+
 
 # ---------- Layer 1: System (Bible) ----------
 
 async def get_locked_bible_text(
-    db: AsyncSession, project_id: int
+    db: AsyncSession, project_id: int, stats: dict | None = None
 ) -> str:
     """Layer 1: System constraints from locked Bible fields."""
     result = await db.execute(
@@ -53,6 +79,8 @@ async def get_locked_bible_text(
     for f in fields:
         if f.value_md.strip():
             lines.append(f"## {f.key}\n{f.value_md}")
+    if stats is not None:
+        stats["items"] = lines[1:]
     # M1 fix: return empty if no fields had content
     if len(lines) <= 1:
         return ""
@@ -62,77 +90,175 @@ async def get_locked_bible_text(
 # ---------- Layer 2: Long-term (Summaries) ----------
 
 async def get_chapter_summaries_text(
-    db: AsyncSession, chapter_id: int, limit: int = 3
+    db: AsyncSession,
+    chapter_id: int,
+    budget: int | None = None,
+    meter: BudgetMeter = CHARS,
+    stats: dict | None = None,
 ) -> str:
-    """Layer 2: Long-term memory from recent chapter summaries."""
-    chapter = await db.get(Chapter, chapter_id)
+    """Layer 2: Long-term memory from the book's summary hierarchy.
+
+    Only nodes covering chapters before the current one are eligible. The
+    budget is filled coarse to fine: the book synopsis, then chapters not
+    covered by any arc rollup, then arcs, then the chapters under them;
+    within each tier the newest come first. Output is chronological.
+    """
+    chapter = await resolve_chapter_ancestry(db, chapter_id)
     if not chapter:
         return ""
 
     result = await db.execute(
-        select(ChapterSummary)
+        select(Chapter.sort_order, ChapterSummary.summary_md)
         .join(Chapter, Chapter.id == ChapterSummary.chapter_id)
         .where(
             Chapter.book_id == chapter.book_id,
-            Chapter.sort_order < chapter.sort_order,
+            Chapter.sort_order < chapter.chapter_sort,
+        )
+        .order_by(Chapter.sort_order, Chapter.id)
+    )
+    summaries = result.all()
+    result = await db.execute(
+        select(SummaryRollup)
+        .where(
+            SummaryRollup.book_id == chapter.book_id,
+            SummaryRollup.last_sort < chapter.chapter_sort,
         )
-        .order_by(Chapter.sort_order.desc())
-        .limit(limit)
+        .order_by(SummaryRollup.first_sort)
     )
-    summaries = result.scalars().all()
-    if not summaries:
+    rollups = result.scalars().all()
+    if not summaries and not rollups:
         return ""
-    lines = ["# 前文摘要"]
-    for s in reversed(summaries):
-        lines.append(s.summary_md)
-    return "\n\n".join(lines)
+
+    # (tier, sort key, text); lower tier = coarser
+    arcs = [r for r in rollups if r.level == "arc"]
+    candidates = [
+        (0, r.first_sort, f"【全书梗概】{r.summary_md}")
+        for r in rollups if r.level == "book"
+    ]
+    candidates += [
+        (2, r.first_sort, f"【第{r.first_sort}-{r.last_sort}章】{r.summary_md}")
+        for r in arcs
+    ]
+    for sort_order, summary_md in summaries:
+        covered = any(a.first_sort <= sort_order <= a.last_sort for a in arcs)
+        candidates.append((3 if covered else 1, sort_order, summary_md))
+    candidates.sort(key=lambda c: (c[0], -c[1]))
+
+    header = "# 前文摘要"
+    sep_cost = meter.measure("\n\n")
+    total = meter.measure(header)
+    chosen = []
+    for candidate in candidates:
+        cost = sep_cost + meter.measure(candidate[2])
+        if budget is not None and total + cost > budget:
+            continue
+        chosen.append(candidate)
+        total += cost
+
+    chosen.sort(key=lambda c: (c[1], c[0]))
+    lines = [header] + [text for _, _, text in chosen]
+    if stats is not None:
+        stats["items"] = lines[1:]
+        stats["dropped"] = len(candidates) - len(chosen)
+    return "\n\n".join(lines) if chosen else ""
 
 
 # ---------- Layer 3: KG+Lore ----------
 
+async def _get_scene_card_characters(db: AsyncSession, scene_id: int) -> list[str]:
+    """Characters listed on the scene's saved scene card."""
+    raw = (
+        await db.execute(select(Scene.scene_card_json).where(Scene.id == scene_id))
+    ).scalar_one_or_none()
+    try:
+        card = json.loads(raw) if raw else {}
+    except (json.JSONDecodeError, TypeError):
+        return []
+    chars = card.get("characters", []) if isinstance(card, dict) else []
+    return [c for c in chars if isinstance(c, str) and c]
+
+
 async def _get_kg_facts_text(
-    db: AsyncSession, project_id: int, budget: int
+    db: AsyncSession,
+    project_id: int,
+    budget: int,
+    meter: BudgetMeter = CHARS,
+    stats: dict | None = None,
+    scan_text: str = "",
+    focus_names: list[str] | None = None,
 ) -> str:
-    """Collect approved KG facts (entities + relations) as text."""
+    """Collect approved KG facts (entities + relations) as text.
+
+    Facts about entities named in the scan window or the scene card come
+    first (most matched names first), then facts about the most central
+    entities (stored PageRank, see kg_analytics), then by confidence.
+    Lines and names come precomputed from the fact index (see kg_facts);
+    names are found in the text with the project's cached term automaton.
+    """
+    matched = await match_fact_terms(
+        db, project_id, [scan_text, *(focus_names or [])]
+    )
+
+    # Highest PageRank among the nodes each fact mentions
+    importance = (
+        select(
+            KGFactTerm.proposal_id,
+            func.max(KGNodeMetric.pagerank).label("pagerank"),
+        )
+        .join(
+            KGNode,
+            and_(
+                KGNode.project_id == KGFactTerm.project_id,
+                KGNode.name_key == KGFactTerm.term,
+            ),
+        )
+        .join(KGNodeMetric, KGNodeMetric.node_id == KGNode.id)
+        .where(KGFactTerm.project_id == project_id)
+        .group_by(KGFactTerm.proposal_id)
+        .subquery()
+    )
+    hits = func.count(KGFactTerm.id)
     result = await db.execute(
-        select(KGProposal)
+        select(KGProposal.fact_line)
+        .outerjoin(
+            KGFactTerm,
+            (KGFactTerm.proposal_id == KGProposal.id)
+            & KGFactTerm.term.in_(matched),
+        )
+        .outerjoin(importance, importance.c.proposal_id == KGProposal.id)
         .where(
             KGProposal.project_id == project_id,
-            KGProposal.status.in_(["auto_approved", "user_approved"]),
+            KGProposal.status.in_(_APPROVED_STATUSES),
+            KGProposal.stale.is_(False),
+            KGProposal.fact_line != "",
+        )
+        .group_by(KGProposal.id)
+        .order_by(
+            hits.desc(),
+            func.coalesce(func.max(importance.c.pagerank), 0).desc(),
+            KGProposal.confidence.desc(),
+            KGProposal.id,
         )
-        .order_by(KGProposal.confidence.desc())
     )
-    proposals = result.scalars().all()
-    if not proposals:
+    fact_lines = result.scalars().all()
+    if not fact_lines:
         return ""
 
     header = "# 知识图谱事实"
     lines = [header]
     # H3 fix: count header + join newline
-    total = len(header) + 1
-    for p in proposals:
-        data = json.loads(p.data_json) if p.data_json else {}
-        if p.category == "entity":
-            name = data.get("name", "")
-            label = data.get("label", "")
-            props = data.get("properties", {})
-            prop_str = ", ".join(f"{k}={v}" for k, v in props.items())
-            line = f"- [{label}] {name}"
-            if prop_str:
-                line += f" ({prop_str})"
-        elif p.category == "relation":
-            src = data.get("source", "?")
-            tgt = data.get("target", "?")
-            rel = data.get("relation", "?")
-            line = f"- {src} --{rel}--> {tgt}"
-        else:
-            continue
-
-        if total + len(line) + 1 > budget:
+    total = meter.measure(header) + 1
+    for idx, line in enumerate(fact_lines):
+        cost = meter.measure(line) + 1
+        if total + cost > budget:
+            if stats is not None:
+                stats["dropped"] = len(fact_lines) - idx
             break
         lines.append(line)
-        total += len(line) + 1
+        total += cost
 
+    if stats is not None:
+        stats["items"] = lines[1:]
     return "\n".join(lines) if len(lines) > 1 else ""
 
 
@@ -141,20 +267,37 @@ async def get_kg_lore_text(
     project_id: int,
     scene_id: int,
     budget: int,
+    meter: BudgetMeter = CHARS,
+    stats: dict | None = None,
 ) -> str:
     """Layer 3: KG facts + lorebook triggered entries within budget.
 
     Split: KG gets up to 40% of layer budget, lorebook gets the rest.
+    stats, when given, receives separate "kg" and "lore" item accounting.
     """
+    kg_stats: dict = {}
+    lore_stats: dict = {}
+    if stats is not None:
+        stats["kg"] = kg_stats
+        stats["lore"] = lore_stats
+
+    scan_texts = await get_scan_texts(db, scene_id)
+    scan_text = "\n\n".join(text for _, text in scan_texts)
+    characters = await _get_scene_card_characters(db, scene_id)
+
     kg_budget = int(budget * 0.4)
-    kg_text = await _get_kg_facts_text(db, project_id, kg_budget)
-    kg_used = len(kg_text)
+    kg_text = await _get_kg_facts_text(
+        db, project_id, kg_budget, meter, stats=kg_stats,
+        scan_text=scan_text, focus_names=characters,
+    )
+    kg_used = meter.measure(kg_text)
 
     # M2 fix: reserve separator between KG and Lore
-    sep_cost = 2 if kg_used > 0 else 0
+    sep_cost = meter.measure("\n\n") if kg_used > 0 else 0
     lore_budget = max(0, budget - kg_used - sep_cost)
     lore_text = await inject_lorebook(
-        db, project_id, scene_id, budget_chars=lore_budget
+        db, project_id, scene_id, budget_chars=lore_budget, meter=meter,
+        stats=lore_stats, scan_texts=scan_texts,
     )
 
     parts = [p for p in [kg_text, lore_text] if p]
@@ -164,20 +307,20 @@ async def get_kg_lore_text(
 # ---------- Layer 4: Recent ----------
 
 async def get_recent_scene_text(
-    db: AsyncSession, scene_id: int, paragraph_count: int = 3
+    db: AsyncSession,
+    scene_id: int,
+    paragraph_count: int = 3,
+    stats: dict | None = None,
 ) -> str:
     """Layer 4: Recent text from the current scene's latest version."""
-    result = await db.execute(
-        select(SceneTextVersion)
-        .where(SceneTextVersion.scene_id == scene_id)
-        .order_by(SceneTextVersion.version.desc())
-        .limit(1)
-    )
-    version = result.scalar_one_or_none()
-    if not version or not version.content_md:
+    content = (await get_latest_scene_texts(db, [scene_id])).get(scene_id)
+    if not content:
         return ""
-    paragraphs = version.content_md.strip().split("\n\n")
+    paragraphs = content.strip().split("\n\n")
     recent = paragraphs[-paragraph_count:]
+    if stats is not None:
+        stats["items"] = recent
+        stats["dropped"] = len(paragraphs) - len(recent)
     return "# 最近文本\n\n" + "\n\n".join(recent)
 
 
@@ -186,17 +329,167 @@ async def get_recent_scene_text(
 async def get_scene_project_id(
     db: AsyncSession, scene_id: int
 ) -> int | None:
-    """Resolve scene_id → project_id."""
-    from app.models import Book
+    """Resolve scene_id → project_id (one memoized query)."""
+    ancestry = await resolve_scene_ancestry(db, scene_id)
+    return ancestry.project_id if ancestry else None
 
-    scene = await db.get(Scene, scene_id)
-    if not scene:
-        return None
-    chapter = await db.get(Chapter, scene.chapter_id)
-    if not chapter:
-        return None
-    book = await db.get(Book, chapter.book_id)
-    return book.project_id if book else None
+
+# ---------- Cache stamp ----------
+
+async def _get_input_stamp(
+    db: AsyncSession, project_id: int, scene_id: int, chapter_id: int
+) -> tuple:
+    """Version stamp over every row the four layers read (single query).
+
+    Combines max(updated_at)/counts of the inputs with the in-process
+    write generation, which catches same-second edits.
+    """
+    bible = (
+        BibleField.project_id == project_id,
+        BibleField.locked.is_(True),
+    )
+    current_book = (
+        select(Chapter.book_id).where(Chapter.id == chapter_id).scalar_subquery()
+    )
+    current_sort = (
+        select(Chapter.sort_order).where(Chapter.id == chapter_id).scalar_subquery()
+    )
+    summaries = (
+        select(ChapterSummary.updated_at)
+        .join(Chapter, Chapter.id == ChapterSummary.chapter_id)
+        .where(Chapter.book_id == current_book, Chapter.sort_order < current_sort)
+        .subquery()
+    )
+    approved = (
+        KGProposal.project_id == project_id,
+        KGProposal.status.in_(_APPROVED_STATUSES),
+        KGProposal.stale.is_(False),
+    )
+    sibling_scenes = select(Scene.id).where(
+        Scene.chapter_id == select(Scene.chapter_id)
+        .where(Scene.id == scene_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            select(func.max(BibleField.updated_at))
+            .where(*bible).scalar_subquery(),
+            select(func.count(BibleField.id))
+            .where(*bible).scalar_subquery(),
+            select(func.max(summaries.c.updated_at)).scalar_subquery(),
+            select(func.count()).select_from(summaries).scalar_subquery(),
+            select(func.max(SummaryRollup.updated_at))
+            .where(SummaryRollup.book_id == current_book).scalar_subquery(),
+            select(func.count(SummaryRollup.id))
+            .where(SummaryRollup.book_id == current_book).scalar_subquery(),
+            select(func.count(KGProposal.id))
+            .where(*approved).scalar_subquery(),
+            select(func.max(KGProposal.id))
+            .where(*approved).scalar_subquery(),
+            select(func.max(LoreEntry.updated_at))
+            .where(LoreEntry.project_id == project_id).scalar_subquery(),
+            select(func.count(LoreEntry.id))
+            .where(LoreEntry.project_id == project_id).scalar_subquery(),
+            select(func.max(SceneTextVersion.id))
+            .where(SceneTextVersion.scene_id.in_(sibling_scenes))
+            .scalar_subquery(),
+        )
+    )
+    return (*result.one(), *write_generation(project_id))
+
+
+def invalidate_context_pack_cache(project_id: int | None = None) -> int:
+    """Drop cached packs for a project (or all projects when None)."""
+    if project_id is None:
+        size = len(context_pack_cache)
+        context_pack_cache.clear()
+        return size
+    return context_pack_cache.discard(lambda key: key[0] == project_id)
+
+
+# ---------- Layer collection ----------
+
+_LAYERS = ("system", "longterm", "kg_lore", "recent")
+
+
+async def _collect_layers(
+    db: AsyncSession,
+    scene_id: int,
+    chapter_id: int,
+    project_id: int,
+    lt_budget: int,
+    kl_budget: int,
+    meter: BudgetMeter = CHARS,
+) -> tuple[list[str], dict[str, dict]]:
+    """Fetch raw text for all four layers, plus per-layer probe stats."""
+    calls = {
+        "system": (get_locked_bible_text, (project_id,)),
+        "longterm": (get_chapter_summaries_text, (chapter_id, lt_budget, meter)),
+        "kg_lore": (
+            get_kg_lore_text, (project_id, scene_id, kl_budget, meter)
+        ),
+        "recent": (get_recent_scene_text, (scene_id,)),
+    }
+
+    async def _run(name: str) -> tuple[str, dict]:
+        layer_fn, args = calls[name]
+        stats: dict = {}
+        with Probe() as probe:
+            raw = await layer_fn(db, *args, stats=stats)
+        stats["wall_ms"] = probe.wall_ms
+        stats["sql_count"] = probe.sql_count
+        return raw, stats
+
+    results = [await _run(name) for name in _LAYERS]
+
+    raws = [raw for raw, _ in results]
+    stats = {name: st for name, (_, st) in zip(_LAYERS, results)}
+    return raws, stats
+
+
+def _item_accounting(stats: dict, final_text: str) -> dict:
+    """Count candidate items and those not fully present in final_text."""
+    items = stats.get("items", [])
+    pre_dropped = stats.get("dropped", 0)
+    lost = sum(1 for item in items if item not in final_text)
+    return {"items": len(items) + pre_dropped, "dropped": pre_dropped + lost}
+
+
+# ---------- Budget allocation ----------
+
+def _layer_budgets(usable: int, unit: str) -> tuple[int, int, int, int]:
+    """Return (system, long-term, kg+lore, recent_min) budgets.
+
+    Char mode uses the plain ratios. Token mode clamps each layer between
+    its CTX_*_RESERVED floor and CTX_*_MAX ceiling, then scales the three
+    capped layers down if they would eat into Recent's 50% minimum.
+    """
+    recent_min = int(usable * _RECENT_MIN)
+    if unit == "chars":
+        return (
+            int(usable * _SYSTEM_MAX),
+            int(usable * _LONGTERM_MAX),
+            int(usable * _KG_LORE_MAX),
+            recent_min,
+        )
+
+    sys_budget = min(
+        settings.CTX_SYSTEM_MAX,
+        max(settings.CTX_SYSTEM_RESERVED, int(usable * _SYSTEM_MAX)),
+    )
+    lt_budget = min(
+        settings.CTX_LONGTERM_MAX,
+        max(settings.CTX_LONGTERM_RESERVED, int(usable * _LONGTERM_MAX)),
+    )
+    kl_budget = min(settings.CTX_STRUCTURED_MAX, int(usable * _KG_LORE_MAX))
+    capped = sys_budget + lt_budget + kl_budget
+    room = usable - recent_min
+    if capped > room > 0:
+        scale = room / capped
+        sys_budget = int(sys_budget * scale)
+        lt_budget = int(lt_budget * scale)
+        kl_budget = int(kl_budget * scale)
+    return sys_budget, lt_budget, kl_budget, recent_min
 
 
 # ---------- Main assembler ----------
@@ -206,8 +499,12 @@ async def assemble_context_pack(
     scene_id: int,
     chapter_id: int,
     project_id: int,
-    total_budget: int = DEFAULT_BUDGET_CHARS,
-) -> str:
+    total_budget: int | None = None,
+    use_cache: bool = True,
+    budget_mode: str | None = None,
+    model: str | None = None,
+    with_report: bool = False,
+) -> str | tuple[str, dict]:
     """Assemble 4-layer context pack with partition budgets.
 
     Budget allocation:
@@ -217,39 +514,132 @@ async def assemble_context_pack(
       Recent:    at least 50% of total (gets all leftover)
 
     Each layer is hard-capped. Leftover from earlier layers flows to Recent.
-    """
-    # H2 fix: reserve space for separators (up to 3 × len(_SEPARATOR))
-    sep_overhead = len(_SEPARATOR) * 3
-    usable = total_budget - sep_overhead
 
-    sys_budget = int(usable * _SYSTEM_MAX)
-    lt_budget = int(usable * _LONGTERM_MAX)
-    kl_budget = int(usable * _KG_LORE_MAX)
-    recent_min = int(usable * _RECENT_MIN)
+    budget_mode (default: CTX_BUDGET_MODE) selects the unit of
+    total_budget: "chars" (default DEFAULT_BUDGET_CHARS) or "tokens"
+    (default CTX_TOTAL_TOKENS, counted with model's tokenizer).
 
-    # --- Collect raw content ---
-    system_raw = await get_locked_bible_text(db, project_id)
-    longterm_raw = await get_chapter_summaries_text(db, chapter_id)
-    kglore_raw = await get_kg_lore_text(
-        db, project_id, scene_id, kl_budget
-    )
-    recent_raw = await get_recent_scene_text(db, scene_id)
+    With use_cache (and CTX_CACHE_ENABLED), a pack whose input stamp is
+    unchanged is served from memory: one aggregate query, no layer work.
 
-    # --- Apply budgets ---
-    system_text = truncate_to_sentence(system_raw, sys_budget)
-    sys_used = len(system_text)
+    With with_report, returns (text, report). Per layer the report gives
+    budget, raw and used size (in the active unit), wall time, SQL
+    statement count, and candidate/dropped item counts (Bible fields,
+    summaries, KG lines, lore entries, paragraphs). Timings describe the
+    build that produced the pack; "cache" says whether it was reused.
+    """
+    meter = BudgetMeter(budget_mode or settings.CTX_BUDGET_MODE, model)
+    if total_budget is None:
+        total_budget = (
+            settings.CTX_TOTAL_TOKENS if meter.unit == "tokens"
+            else DEFAULT_BUDGET_CHARS
+        )
 
-    longterm_text = truncate_to_sentence(longterm_raw, lt_budget)
-    lt_used = len(longterm_text)
+    if not (use_cache and settings.CTX_CACHE_ENABLED):
+        pack, report = await _build_context_pack(
+            db, scene_id, chapter_id, project_id, total_budget, meter
+        )
+        report["cache"] = "off"
+        return (pack, report) if with_report else pack
+
+    key = (project_id, scene_id, chapter_id, total_budget, meter.unit, model)
+    stamp = await _get_input_stamp(db, project_id, scene_id, chapter_id)
+    cached = context_pack_cache.get(key, valid=lambda v: v[0] == stamp)
+    if cached is not None:
+        _, pack, report = cached
+        if not with_report:
+            return pack
+        report = copy.deepcopy(report)
+        report["cache"] = "hit"
+        return pack, report
+
+    pack, report = await _build_context_pack(
+        db, scene_id, chapter_id, project_id, total_budget, meter
+    )
+    report["cache"] = "miss"
+    context_pack_cache.put(key, (stamp, pack, report))
+    return (pack, copy.deepcopy(report)) if with_report else pack
 
-    kglore_text = truncate_to_sentence(kglore_raw, kl_budget)
-    kl_used = len(kglore_text)
 
-    # Layer 4: Recent — gets all leftover budget
-    used_by_others = sys_used + lt_used + kl_used
-    recent_budget = max(recent_min, usable - used_by_others)
-    recent_text = truncate_to_sentence(recent_raw, recent_budget)
+async def _build_context_pack(
+    db: AsyncSession,
+    scene_id: int,
+    chapter_id: int,
+    project_id: int,
+    total_budget: int,
+    meter: BudgetMeter = CHARS,
+) -> tuple[str, dict]:
+    """Run the four layer queries and apply partition budgets."""
+    with Probe() as build:
+        # H2 fix: reserve space for separators (up to 3 × len(_SEPARATOR))
+        sep_overhead = meter.measure(_SEPARATOR) * 3
+        usable = total_budget - sep_overhead
+
+        sys_budget, lt_budget, kl_budget, recent_min = _layer_budgets(
+            usable, meter.unit
+        )
 
-    # --- Assemble ---
-    parts = [p for p in [system_text, longterm_text, kglore_text, recent_text] if p]
-    return _SEPARATOR.join(parts)
+        # --- Collect raw content ---
+        raws, layer_stats = await _collect_layers(
+            db, scene_id, chapter_id, project_id, lt_budget, kl_budget, meter,
+        )
+        system_raw, longterm_raw, kglore_raw, recent_raw = raws
+
+        # --- Apply budgets ---
+        system_text = meter.truncate(system_raw, sys_budget)
+        sys_used = meter.measure(system_text)
+
+        longterm_text = meter.truncate(longterm_raw, lt_budget)
+        lt_used = meter.measure(longterm_text)
+
+        kglore_text = meter.truncate(kglore_raw, kl_budget)
+        kl_used = meter.measure(kglore_text)
+
+        # Layer 4: Recent — gets all leftover budget
+        used_by_others = sys_used + lt_used + kl_used
+        recent_budget = max(recent_min, usable - used_by_others)
+        recent_text = meter.truncate(recent_raw, recent_budget)
+
+        # --- Assemble ---
+        parts = [p for p in [system_text, longterm_text, kglore_text, recent_text] if p]
+        pack = _SEPARATOR.join(parts)
+
+    layers = {}
+    for name, budget, raw, text in zip(
+        _LAYERS,
+        (sys_budget, lt_budget, kl_budget, recent_budget),
+        raws,
+        (system_text, longterm_text, kglore_text, recent_text),
+    ):
+        stats = layer_stats[name]
+        layer = {
+            "budget": budget,
+            "raw": meter.measure(raw),
+            "used": meter.measure(text),
+            "wall_ms": stats["wall_ms"],
+            "sql_count": stats["sql_count"],
+        }
+        if name == "kg_lore":
+            kg = _item_accounting(stats["kg"], text)
+            lore = _item_accounting(stats["lore"], text)
+            lore["excluded"] = stats["lore"].get("excluded", [])
+            lore["active"] = stats["lore"].get("active", [])
+            layer.update(
+                items=kg["items"] + lore["items"],
+                dropped=kg["dropped"] + lore["dropped"],
+                kg=kg,
+                lore=lore,
+            )
+        else:
+            layer.update(_item_accounting(stats, text))
+        layers[name] = layer
+
+    report = {
+        "unit": meter.unit,
+        "total_budget": total_budget,
+        "used": meter.measure(pack),
+        "wall_ms": build.wall_ms,
+        "sql_count": build.sql_count,
+        "layers": layers,
+    }
+    return pack, report
@@ -2,11 +2,20 @@
 
 import json
 from abc import ABC, abstractmethod
+from collections import defaultdict
 
-from sqlalchemy import or_, select
+from sqlalchemy import and_, bindparam, case, delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
-from app.models.tables import KGEdge, KGNode
+from app.models.tables import KGEdge, KGNode, KGNodeAlias, KGNodeMetric
+from app.services.cache import bump_generation
+from app.services.graph_snapshot import get_graph_snapshot, mark_graph_changed
+from app.services.kg_names import get_name_index, mark_aliases_changed, normalize_name
+
+# Rows per multi-VALUES statement (stays well under SQLite's bound-parameter limit)
+_BATCH_ROWS = 500
 
 
 def _safe_loads(raw: str, default=None):
@@ -42,13 +51,44 @@ class GraphService(ABC):
         ...
 
     @abstractmethod
-    async def get_nodes(self, project_id: int, label: str | None = None) -> list:
-        """Return all nodes for a project, optionally filtered by label."""
+    async def get_nodes(
+        self,
+        project_id: int,
+        label: str | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list:
+        """Return nodes for a project in id order, optionally filtered by label.
+
+        after_id/limit select one keyset page; without include_payload the
+        properties column is not loaded.
+        """
+        ...
+
+    @abstractmethod
+    async def get_edges(
+        self,
+        project_id: int,
+        node_id: int | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list:
+        """Return edges for a project in id order, optionally filtered by node.
+
+        Paging and payload options as for get_nodes.
+        """
+        ...
+
+    @abstractmethod
+    async def count_nodes(self, project_id: int, label: str | None = None) -> int:
+        """Number of nodes get_nodes would return unpaged."""
         ...
 
     @abstractmethod
-    async def get_edges(self, project_id: int, node_id: int | None = None) -> list:
-        """Return edges for a project, optionally filtered by node involvement."""
+    async def count_edges(self, project_id: int, node_id: int | None = None) -> int:
+        """Number of edges get_edges would return unpaged."""
         ...
 
     @abstractmethod
@@ -70,11 +110,129 @@ class GraphService(ABC):
         """Insert or update an edge. Returns the edge id."""
         ...
 
+    @abstractmethod
+    async def upsert_nodes(self, project_id: int, nodes: list[dict]) -> list[int]:
+        """Batch upsert_node. nodes: [{label, name, properties}].
+
+        Returns node ids in input order.
+        """
+        ...
+
+    @abstractmethod
+    async def ensure_nodes(
+        self, project_id: int, names: list[str], fallback_label: str
+    ) -> list[int]:
+        """Batch ensure_node. Returns node ids in input order."""
+        ...
+
+    @abstractmethod
+    async def upsert_edges(self, project_id: int, edges: list[dict]) -> list[int]:
+        """Batch upsert_edge. edges: [{source_id, target_id, relation, properties}].
+
+        Returns edge ids in input order.
+        """
+        ...
+
+    @abstractmethod
+    async def add_aliases(self, project_id: int, node_id: int, aliases: list[str]) -> list:
+        """Point alternative spellings at a node (re-pointing existing ones).
+
+        Returns the node's aliases.
+        """
+        ...
+
+    @abstractmethod
+    async def get_aliases(self, node_id: int) -> list:
+        """Aliases of a node, oldest first."""
+        ...
+
+    @abstractmethod
+    async def resolve_name(
+        self, project_id: int, name: str, label: str | None = None
+    ) -> int | None:
+        """Node id a name (or alias) resolves to after normalization."""
+        ...
+
+    @abstractmethod
+    async def merge_nodes(
+        self, project_id: int, target_id: int, source_ids: list[int]
+    ) -> dict:
+        """Fold source nodes into target: edges rewired, properties and
+        names kept (as aliases), sources deleted. Returns counts.
+        """
+        ...
+
     @abstractmethod
     async def delete_node(self, node_id: int) -> None:
         """Delete a node (cascades to its edges via FK)."""
         ...
 
+    @abstractmethod
+    async def neighborhood(
+        self,
+        project_id: int,
+        node_id: int,
+        hops: int = 1,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_nodes: int = 500,
+    ) -> dict | None:
+        """Nodes within k hops of a node plus the edges among them (None if unknown)."""
+        ...
+
+    @abstractmethod
+    async def shortest_path(
+        self,
+        project_id: int,
+        source_id: int,
+        target_id: int,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_hops: int = 6,
+    ) -> dict | None:
+        """Fewest-hop path between two nodes (None if either is unknown)."""
+        ...
+
+    @abstractmethod
+    async def nodes_by_degree(
+        self,
+        project_id: int,
+        min_degree: int = 0,
+        max_degree: int | None = None,
+        relations: list[str] | None = None,
+        label: str | None = None,
+        direction: str = "both",
+        limit: int = 100,
+    ) -> list[dict]:
+        """Nodes filtered by (relation-specific) degree, highest first."""
+        ...
+
+    @abstractmethod
+    async def get_ranked_nodes(
+        self,
+        project_id: int,
+        sort: str = "pagerank",
+        label: str | None = None,
+        community: int | None = None,
+        after: tuple | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list[tuple]:
+        """(node, metrics) pairs ordered by a stored metric.
+
+        sort "pagerank" / "degree" lists highest first, ties by id, and
+        after is the (value, id) of the previous page's last row; sort "id"
+        pages by (id,). Nodes without stored metrics are skipped.
+        """
+        ...
+
+    @abstractmethod
+    async def count_ranked_nodes(
+        self, project_id: int, label: str | None = None, community: int | None = None
+    ) -> int:
+        """Number of nodes get_ranked_nodes would return unpaged."""
+        ...
+
 
 class SQLiteGraphAdapter(GraphService):
     """SQLAlchemy / SQLite implementation of GraphService."""
@@ -85,27 +243,10 @@ class SQLiteGraphAdapter(GraphService):
     async def upsert_node(
         self, project_id: int, label: str, name: str, properties: dict
     ) -> int:
-        result = await self._db.execute(
-            select(KGNode).where(
-                KGNode.project_id == project_id,
-                KGNode.label == label,
-                KGNode.name == name,
-            )
+        (node_id,) = await self.upsert_nodes(
+            project_id, [{"label": label, "name": name, "properties": properties}]
         )
-        node = result.scalar_one_or_none()
-        if node is None:
-            node = KGNode(
-                project_id=project_id,
-                label=label,
-                name=name,
-                properties_json=json.dumps(properties, ensure_ascii=False),
-            )
-            self._db.add(node)
-        else:
-            node.properties_json = json.dumps(properties, ensure_ascii=False)
-        await self._db.flush()
-        await self._db.refresh(node)
-        return node.id
+        return node_id
 
     async def add_edge(
         self,
@@ -130,19 +271,9 @@ class SQLiteGraphAdapter(GraphService):
     async def ensure_node(
         self, project_id: int, name: str, fallback_label: str
     ) -> int:
-        """Return existing node id by name, or create with fallback_label."""
-        result = await self._db.execute(
-            select(KGNode).where(
-                KGNode.project_id == project_id,
-                KGNode.name == name,
-            )
-        )
-        node = result.scalars().first()
-        if node is not None:
-            return node.id
-        return await self.upsert_node(
-            project_id, fallback_label, name, {}
-        )
+        """Return existing node id by (normalized) name, or create with fallback_label."""
+        (node_id,) = await self.ensure_nodes(project_id, [name], fallback_label)
+        return node_id
 
     async def upsert_edge(
         self,
@@ -181,27 +312,473 @@ class SQLiteGraphAdapter(GraphService):
         await self._db.refresh(edge)
         return edge.id
 
-    async def get_nodes(self, project_id: int, label: str | None = None) -> list:
-        stmt = select(KGNode).where(KGNode.project_id == project_id)
+    async def upsert_nodes(self, project_id: int, nodes: list[dict]) -> list[int]:
+        """INSERT ... ON CONFLICT DO UPDATE, one statement per batch.
+
+        A name that normalizes to an existing node of the same label (or
+        to one of its aliases) updates that node instead of adding a
+        variant; so does a repeat within the input, whose last properties
+        win.
+        """
+        if not nodes:
+            return []
+        index = await get_name_index(self._db, project_id)
+        canonical: dict[tuple[str, str], str] = {}
+        rows: dict[tuple[str, str], dict] = {}
+        for n in nodes:
+            key = (n["label"], normalize_name(n["name"]))
+            if key not in canonical:
+                existing = index.resolve(n["name"], n["label"])
+                canonical[key] = n["name"] if existing is None else index.names[existing]
+            rows[key] = {
+                "project_id": project_id,
+                "label": n["label"],
+                "name": canonical[key],
+                "name_key": normalize_name(canonical[key]),
+                "properties_json": json.dumps(
+                    n.get("properties") or {}, ensure_ascii=False
+                ),
+            }
+        ids: dict[tuple[str, str], int] = {}
+        values = list(rows.values())
+        for i in range(0, len(values), _BATCH_ROWS):
+            stmt = sqlite_insert(KGNode).values(values[i:i + _BATCH_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["project_id", "label", "name"],
+                set_={
+                    "properties_json": stmt.excluded.properties_json,
+                    "updated_at": func.now(),
+                },
+            ).returning(KGNode)
+            # Refresh any already-loaded instances with the upserted values
+            result = await self._db.execute(
+                stmt.execution_options(populate_existing=True)
+            )
+            for node in result.scalars():
+                ids[(node.label, node.name)] = node.id
+        bump_generation(project_id)
+        return [
+            ids[(n["label"], canonical[(n["label"], normalize_name(n["name"]))])]
+            for n in nodes
+        ]
+
+    async def ensure_nodes(
+        self, project_id: int, names: list[str], fallback_label: str
+    ) -> list[int]:
+        """Resolve names through the name index; create the rest in one upsert.
+
+        Spellings that normalize alike share one node.
+        """
+        if not names:
+            return []
+        index = await get_name_index(self._db, project_id)
+        ids: dict[str, int] = {}
+        missing: dict[str, str] = {}
+        for name in names:
+            key = normalize_name(name)
+            if key in ids or key in missing:
+                continue
+            node_id = index.resolve(name)
+            if node_id is None:
+                missing[key] = name
+            else:
+                ids[key] = node_id
+        if missing:
+            created = await self.upsert_nodes(
+                project_id,
+                [{"label": fallback_label, "name": name} for name in missing.values()],
+            )
+            ids.update(zip(missing, created))
+        return [ids[normalize_name(name)] for name in names]
+
+    async def upsert_edges(self, project_id: int, edges: list[dict]) -> list[int]:
+        """INSERT ... ON CONFLICT DO UPDATE, one statement per batch."""
+        if not edges:
+            return []
+
+        def _key(e: dict) -> tuple[int, int, str]:
+            return (e["source_id"], e["target_id"], e["relation"])
+
+        rows: dict[tuple[int, int, str], dict] = {}
+        for e in edges:
+            rows[_key(e)] = {
+                "project_id": project_id,
+                "source_node_id": e["source_id"],
+                "target_node_id": e["target_id"],
+                "relation": e["relation"],
+                "properties_json": json.dumps(
+                    e.get("properties") or {}, ensure_ascii=False
+                ),
+            }
+        ids: dict[tuple[int, int, str], int] = {}
+        values = list(rows.values())
+        for i in range(0, len(values), _BATCH_ROWS):
+            stmt = sqlite_insert(KGEdge).values(values[i:i + _BATCH_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[
+                    "project_id", "source_node_id", "target_node_id", "relation",
+                ],
+                set_={"properties_json": stmt.excluded.properties_json},
+            ).returning(KGEdge)
+            result = await self._db.execute(
+                stmt.execution_options(populate_existing=True)
+            )
+            for edge in result.scalars():
+                ids[(edge.source_node_id, edge.target_node_id, edge.relation)] = (
+                    edge.id
+                )
+        bump_generation(project_id)
+        return [ids[_key(e)] for e in edges]
+
+    def _node_filter(self, project_id: int, label: str | None) -> list:
+        conds = [KGNode.project_id == project_id]
         if label:
-            stmt = stmt.where(KGNode.label == label)
-        result = await self._db.execute(stmt.order_by(KGNode.id))
-        return result.scalars().all()
+            conds.append(KGNode.label == label)
+        return conds
 
-    async def get_edges(self, project_id: int, node_id: int | None = None) -> list:
-        stmt = select(KGEdge).where(KGEdge.project_id == project_id)
+    def _edge_filter(self, project_id: int, node_id: int | None) -> list:
+        conds = [KGEdge.project_id == project_id]
         if node_id is not None:
-            stmt = stmt.where(
+            conds.append(
                 or_(
                     KGEdge.source_node_id == node_id,
                     KGEdge.target_node_id == node_id,
                 )
             )
-        result = await self._db.execute(stmt.order_by(KGEdge.id))
+        return conds
+
+    async def add_aliases(self, project_id: int, node_id: int, aliases: list[str]) -> list:
+        node = await self._db.get(KGNode, node_id)
+        rows = {
+            key: alias.strip()
+            for alias in aliases
+            if (key := normalize_name(alias)) and key != node.name_key
+        }
+        if rows:
+            stmt = sqlite_insert(KGNodeAlias).values([
+                {"project_id": project_id, "node_id": node_id, "alias": alias, "alias_key": key}
+                for key, alias in rows.items()
+            ])
+            await self._db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["project_id", "alias_key"],
+                    set_={"node_id": stmt.excluded.node_id, "alias": stmt.excluded.alias},
+                )
+            )
+            mark_aliases_changed(project_id)
+        return await self.get_aliases(node_id)
+
+    async def get_aliases(self, node_id: int) -> list:
+        result = await self._db.execute(
+            select(KGNodeAlias)
+            .where(KGNodeAlias.node_id == node_id)
+            .order_by(KGNodeAlias.id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().all()
+
+    async def resolve_name(
+        self, project_id: int, name: str, label: str | None = None
+    ) -> int | None:
+        index = await get_name_index(self._db, project_id)
+        return index.resolve(name, label)
+
+    async def merge_nodes(
+        self, project_id: int, target_id: int, source_ids: list[int]
+    ) -> dict:
+        """Set-based merge, run inside the session's transaction.
+
+        Edges touching a source are rewired to the target with one UPDATE.
+        Before that, edges that would collide on (source, target, relation)
+        are folded into one survivor (the target's own edge if it has one,
+        else the oldest), whose properties gain the others' keys; edges
+        that would become target→target self-loops are dropped. On
+        property conflicts the target (or survivor) value wins.
+        """
+        sources = list(dict.fromkeys(i for i in source_ids if i != target_id))
+        result = await self._db.execute(
+            select(KGNode.id, KGNode.name, KGNode.properties_json).where(
+                KGNode.project_id == project_id,
+                KGNode.id.in_([target_id, *sources]),
+            )
+        )
+        nodes = {row.id: row for row in result.all()}
+        if target_id not in nodes or any(i not in nodes for i in sources):
+            raise ValueError("All nodes must exist in the project")
+        if not sources:
+            raise ValueError("No source nodes to merge")
+
+        src_set = set(sources)
+        touched = [target_id, *sources]
+        edges = KGEdge.__table__
+        result = await self._db.execute(
+            select(
+                edges.c.id, edges.c.source_node_id, edges.c.target_node_id,
+                edges.c.relation, edges.c.properties_json,
+            )
+            .where(
+                edges.c.project_id == project_id,
+                or_(
+                    edges.c.source_node_id.in_(touched),
+                    edges.c.target_node_id.in_(touched),
+                ),
+            )
+            .order_by(edges.c.id)
+        )
+
+        def remap(node_id: int) -> int:
+            return target_id if node_id in src_set else node_id
+
+        groups: dict[tuple[int, int, str], list] = defaultdict(list)
+        kept: dict[tuple[int, int, str], object] = {}
+        dropped: list[int] = []
+        for row in result.all():
+            moved = row.source_node_id in src_set or row.target_node_id in src_set
+            key = (remap(row.source_node_id), remap(row.target_node_id), row.relation)
+            if not moved:
+                kept[key] = row
+            elif key[0] == key[1] == target_id:
+                dropped.append(row.id)
+            else:
+                groups[key].append(row)
+
+        losers: list[int] = []
+        prop_updates: list[dict] = []
+        for key, rows in groups.items():
+            members = ([kept[key]] if key in kept else []) + rows
+            if len(members) == 1:
+                continue
+            survivor, *others = members
+            props: dict = {}
+            for row in reversed(members):
+                props.update(_safe_loads(row.properties_json))
+            props.update(_safe_loads(survivor.properties_json))
+            prop_updates.append({
+                "edge_id": survivor.id,
+                "props": json.dumps(props, ensure_ascii=False),
+            })
+            losers.extend(row.id for row in others)
+
+        doomed = dropped + losers
+        for i in range(0, len(doomed), _BATCH_ROWS):
+            await self._db.execute(
+                delete(edges).where(edges.c.id.in_(doomed[i:i + _BATCH_ROWS]))
+            )
+        if prop_updates:
+            await self._db.execute(
+                update(edges)
+                .where(edges.c.id == bindparam("edge_id"))
+                .values(properties_json=bindparam("props")),
+                prop_updates,
+            )
+        rewired = await self._db.execute(
+            update(edges)
+            .where(
+                edges.c.project_id == project_id,
+                or_(
+                    edges.c.source_node_id.in_(sources),
+                    edges.c.target_node_id.in_(sources),
+                ),
+            )
+            .values(
+                source_node_id=case(
+                    (edges.c.source_node_id.in_(sources), target_id),
+                    else_=edges.c.source_node_id,
+                ),
+                target_node_id=case(
+                    (edges.c.target_node_id.in_(sources), target_id),
+                    else_=edges.c.target_node_id,
+                ),
+            )
+        )
+
+        # Node properties: target wins, earlier sources beat later ones
+        props = {}
+        for node_id in reversed(touched):
+            props.update(_safe_loads(nodes[node_id].properties_json))
+        nodes_table = KGNode.__table__
+        await self._db.execute(
+            update(nodes_table)
+            .where(nodes_table.c.id == target_id)
+            .values(
+                properties_json=json.dumps(props, ensure_ascii=False),
+                updated_at=func.now(),
+            )
+        )
+        aliases_table = KGNodeAlias.__table__
+        await self._db.execute(
+            update(aliases_table)
+            .where(aliases_table.c.node_id.in_(sources))
+            .values(node_id=target_id)
+        )
+        await self._db.execute(delete(nodes_table).where(nodes_table.c.id.in_(sources)))
+        # SQLite does not enforce the FK cascade here (foreign_keys is off)
+        await self._db.execute(
+            delete(KGNodeMetric).where(KGNodeMetric.node_id.in_(sources))
+        )
+        await self.add_aliases(
+            project_id, target_id, [nodes[i].name for i in sources]
+        )
+
+        # Rows rewritten behind the ORM's back must not be served stale
+        session = self._db.sync_session
+        for obj in list(session.identity_map.values()):
+            if (
+                (isinstance(obj, KGEdge) and obj.project_id == project_id)
+                or (isinstance(obj, KGNode) and obj.id in touched)
+                or (isinstance(obj, KGNodeMetric) and obj.node_id in touched)
+            ):
+                session.expunge(obj)
+        # Moves the graph stamp, so ensure_node_metrics recomputes
+        mark_graph_changed(project_id)
+        mark_aliases_changed(project_id)
+        bump_generation(project_id)
+        return {
+            "node_id": target_id,
+            "merged": len(sources),
+            "edges_rewired": rewired.rowcount,
+            "edges_merged": len(losers),
+            "edges_dropped": len(dropped),
+        }
+
+    async def get_nodes(
+        self,
+        project_id: int,
+        label: str | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list:
+        stmt = select(KGNode).where(*self._node_filter(project_id, label))
+        if after_id is not None:
+            stmt = stmt.where(KGNode.id > after_id)
+        if not include_payload:
+            stmt = stmt.options(defer(KGNode.properties_json))
+        result = await self._db.execute(stmt.order_by(KGNode.id).limit(limit))
         return result.scalars().all()
 
+    async def get_edges(
+        self,
+        project_id: int,
+        node_id: int | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list:
+        stmt = select(KGEdge).where(*self._edge_filter(project_id, node_id))
+        if after_id is not None:
+            stmt = stmt.where(KGEdge.id > after_id)
+        if not include_payload:
+            stmt = stmt.options(defer(KGEdge.properties_json))
+        result = await self._db.execute(stmt.order_by(KGEdge.id).limit(limit))
+        return result.scalars().all()
+
+    async def count_nodes(self, project_id: int, label: str | None = None) -> int:
+        result = await self._db.execute(
+            select(func.count(KGNode.id)).where(*self._node_filter(project_id, label))
+        )
+        return result.scalar_one()
+
+    async def count_edges(self, project_id: int, node_id: int | None = None) -> int:
+        result = await self._db.execute(
+            select(func.count(KGEdge.id)).where(*self._edge_filter(project_id, node_id))
+        )
+        return result.scalar_one()
+
     async def delete_node(self, node_id: int) -> None:
         node = await self._db.get(KGNode, node_id)
         if node:
             await self._db.delete(node)
+            await self._db.execute(
+                delete(KGNodeMetric).where(KGNodeMetric.node_id == node_id)
+            )
             await self._db.flush()
+
+    async def neighborhood(
+        self,
+        project_id: int,
+        node_id: int,
+        hops: int = 1,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_nodes: int = 500,
+    ) -> dict | None:
+        snapshot = await get_graph_snapshot(self._db, project_id)
+        return snapshot.neighborhood(node_id, hops, relations, direction, max_nodes)
+
+    async def shortest_path(
+        self,
+        project_id: int,
+        source_id: int,
+        target_id: int,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_hops: int = 6,
+    ) -> dict | None:
+        snapshot = await get_graph_snapshot(self._db, project_id)
+        return snapshot.shortest_path(source_id, target_id, relations, direction, max_hops)
+
+    async def nodes_by_degree(
+        self,
+        project_id: int,
+        min_degree: int = 0,
+        max_degree: int | None = None,
+        relations: list[str] | None = None,
+        label: str | None = None,
+        direction: str = "both",
+        limit: int = 100,
+    ) -> list[dict]:
+        snapshot = await get_graph_snapshot(self._db, project_id)
+        return snapshot.filter_by_degree(
+            min_degree, max_degree, relations, label, direction, limit
+        )
+
+    def _ranked_filter(
+        self, project_id: int, label: str | None, community: int | None
+    ) -> list:
+        conds = [KGNodeMetric.project_id == project_id, *self._node_filter(project_id, label)]
+        if community is not None:
+            conds.append(KGNodeMetric.community == community)
+        return conds
+
+    async def get_ranked_nodes(
+        self,
+        project_id: int,
+        sort: str = "pagerank",
+        label: str | None = None,
+        community: int | None = None,
+        after: tuple | None = None,
+        limit: int | None = None,
+        include_payload: bool = True,
+    ) -> list[tuple]:
+        stmt = (
+            select(KGNode, KGNodeMetric)
+            .join(KGNodeMetric, KGNodeMetric.node_id == KGNode.id)
+            .where(*self._ranked_filter(project_id, label, community))
+        )
+        if sort == "id":
+            order = [KGNode.id]
+            if after is not None:
+                stmt = stmt.where(KGNode.id > after[0])
+        else:
+            key = {"pagerank": KGNodeMetric.pagerank, "degree": KGNodeMetric.degree}[sort]
+            order = [key.desc(), KGNode.id]
+            if after is not None:
+                value, after_id = after
+                stmt = stmt.where(
+                    or_(key < value, and_(key == value, KGNode.id > after_id))
+                )
+        if not include_payload:
+            stmt = stmt.options(defer(KGNode.properties_json))
+        result = await self._db.execute(stmt.order_by(*order).limit(limit))
+        return [tuple(row) for row in result.all()]
+
+    async def count_ranked_nodes(
+        self, project_id: int, label: str | None = None, community: int | None = None
+    ) -> int:
+        result = await self._db.execute(
+            select(func.count(KGNode.id))
+            .join(KGNodeMetric, KGNodeMetric.node_id == KGNode.id)
+            .where(*self._ranked_filter(project_id, label, community))
+        )
+        return result.scalar_one()
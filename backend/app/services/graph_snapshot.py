@@ -0,0 +1,440 @@
+"""In-process adjacency snapshot of a project's knowledge graph.
+
+Nodes are numbered densely (0..n-1, in id order). Edges live in a
+CSR-style layout: the incident edges of node i are the slots
+``offsets[i]:offsets[i + 1]`` of the parallel arrays ``nbr`` (neighbour
+index), ``rel`` (relation code), ``eid`` (edge id) and ``out`` (1 when node
+i is the source). Every edge is stored once per endpoint, so traversal can
+follow edges in either direction.
+
+Rows appended since the snapshot was built are picked up incrementally
+(only rows with a higher id are read) and kept in a small overlay until it
+is folded back into the arrays. Updates and deletes bump a per-project
+graph generation, which forces a full rebuild, as does a rollback of a
+session that wrote to the project (snapshots may be built from its
+uncommitted rows).
+"""
+
+from array import array
+from collections import defaultdict
+from typing import Iterable
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.tables import KGEdge, KGNode
+from app.services.cache import LRUCache, on_discarded_writes
+
+# project_id -> (stamp, GraphSnapshot)
+graph_snapshot_cache = LRUCache(maxsize=16)
+_graph_generations: defaultdict[int, int] = defaultdict(int)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_graph_writes(session, flush_context):
+    # Inserts are found by the id watermark; only rewrites need a rebuild
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, (KGNode, KGEdge)) and isinstance(obj.project_id, int):
+            _graph_generations[obj.project_id] += 1
+
+
+def graph_generation(project_id: int) -> int:
+    return _graph_generations[project_id]
+
+
+def mark_graph_changed(project_id: int) -> None:
+    """Force a rebuild after graph rewrites that bypass the ORM flush."""
+    _graph_generations[project_id] += 1
+
+
+@on_discarded_writes
+def _forget_rolled_back(project_id: int | None) -> None:
+    # A snapshot may hold rows that were never committed
+    if project_id is None:
+        for key in list(_graph_generations):
+            _graph_generations[key] += 1
+        graph_snapshot_cache.discard(lambda key: True)
+    else:
+        mark_graph_changed(project_id)
+
+
+class GraphSnapshot:
+    """Read-only traversal structure over one project's nodes and edges."""
+
+    def __init__(
+        self,
+        nodes: Iterable[tuple[int, str, str]],
+        edges: Iterable[tuple[int, int, int, str]],
+    ) -> None:
+        """nodes: (id, label, name); edges: (id, source_id, target_id, relation)."""
+        self.node_ids = array("q")
+        self.labels: list[str] = []
+        self.names: list[str] = []
+        self.index: dict[int, int] = {}
+        self.relations: list[str] = []
+        self._relation_codes: dict[str, int] = {}
+        self.max_node_id = 0
+        self.max_edge_id = 0
+        self._extra: dict[int, list[tuple[int, int, int, int]]] = {}
+        self._extra_size = 0
+        self._degree_cache: dict[tuple, tuple[list[int], list[int]]] = {}
+        self._add_nodes(nodes)
+        self._build_csr(list(self._resolve(edges)))
+
+    # ---------- construction ----------
+
+    def _add_nodes(self, nodes: Iterable[tuple[int, str, str]]) -> None:
+        for node_id, label, name in nodes:
+            self.index[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+            self.labels.append(label)
+            self.names.append(name)
+            self.max_node_id = max(self.max_node_id, node_id)
+
+    def _relation_code(self, relation: str) -> int:
+        code = self._relation_codes.get(relation)
+        if code is None:
+            code = self._relation_codes[relation] = len(self.relations)
+            self.relations.append(relation)
+        return code
+
+    def _resolve(self, edges):
+        """(edge id, src idx, tgt idx, relation code); dangling edges skipped."""
+        for edge_id, src, tgt, relation in edges:
+            self.max_edge_id = max(self.max_edge_id, edge_id)
+            s, t = self.index.get(src), self.index.get(tgt)
+            if s is not None and t is not None:
+                yield edge_id, s, t, self._relation_code(relation)
+
+    def _build_csr(self, edges: list[tuple[int, int, int, int]]) -> None:
+        n = len(self.node_ids)
+        # Flat edge list, kept alongside the CSR for whole-graph scans
+        self.e_id = array("q", [e[0] for e in edges])
+        self.e_src = array("l", [e[1] for e in edges])
+        self.e_tgt = array("l", [e[2] for e in edges])
+        self.e_rel = array("l", [e[3] for e in edges])
+        degree = [0] * n
+        for i in self.e_src:
+            degree[i] += 1
+        for i in self.e_tgt:
+            degree[i] += 1
+        offsets = array("q", [0]) * (n + 1)
+        total = 0
+        for i in range(n):
+            total += degree[i]
+            offsets[i + 1] = total
+        nbr = array("l", [0]) * total
+        rel = array("l", [0]) * total
+        eid = array("q", [0]) * total
+        out = array("b", [0]) * total
+        fill = offsets[:n]
+        for edge_id, s, t, code in edges:
+            slot = fill[s]
+            fill[s] = slot + 1
+            nbr[slot], rel[slot], eid[slot], out[slot] = t, code, edge_id, 1
+            slot = fill[t]
+            fill[t] = slot + 1
+            nbr[slot], rel[slot], eid[slot] = s, code, edge_id
+        self.offsets, self.nbr, self.rel, self.eid, self.out = offsets, nbr, rel, eid, out
+        self._extra = {}
+        self._extra_size = 0
+        self._degree_cache = {}
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.e_id)
+
+    def extend(
+        self,
+        nodes: Iterable[tuple[int, str, str]],
+        edges: Iterable[tuple[int, int, int, str]],
+    ) -> None:
+        """Add rows appended after the snapshot was built."""
+        self._degree_cache = {}
+        self._add_nodes(nodes)
+        grown = len(self.node_ids) + 1 - len(self.offsets)
+        if grown > 0:
+            # New nodes have no CSR slots; their edges live in the overlay
+            self.offsets.extend([self.offsets[-1]] * grown)
+        for edge_id, s, t, code in self._resolve(edges):
+            self._extra.setdefault(s, []).append((t, code, edge_id, 1))
+            self._extra.setdefault(t, []).append((s, code, edge_id, 0))
+            self._extra_size += 1
+            self.e_id.append(edge_id)
+            self.e_src.append(s)
+            self.e_tgt.append(t)
+            self.e_rel.append(code)
+        if self._extra_size > max(1024, self.edge_count // 4):
+            # Fold the overlay back into the CSR arrays
+            self._build_csr(list(zip(self.e_id, self.e_src, self.e_tgt, self.e_rel)))
+
+    # ---------- queries ----------
+
+    def incident(self, i: int):
+        """(neighbour idx, relation code, edge id, is_out) for node index i."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        yield from zip(
+            self.nbr[start:end], self.rel[start:end],
+            self.eid[start:end], self.out[start:end],
+        )
+        yield from self._extra.get(i, ())
+
+    def _edge_filter(self, relations, direction: str):
+        codes = None
+        if relations:
+            codes = {self._relation_codes[r] for r in relations if r in self._relation_codes}
+        want_out = {"both": None, "out": 1, "in": 0}[direction]
+
+        def ok(code: int, is_out: int) -> bool:
+            return (codes is None or code in codes) and (
+                want_out is None or is_out == want_out
+            )
+
+        return ok
+
+    def degrees(self, relations=None) -> tuple[list[int], list[int]]:
+        """(in-degree, out-degree) per node index, optionally per relation."""
+        key = tuple(sorted(relations or ()))
+        if key in self._degree_cache:
+            return self._degree_cache[key]
+        indeg = [0] * len(self.node_ids)
+        outdeg = [0] * len(self.node_ids)
+        if relations:
+            codes = {self._relation_codes[r] for r in relations if r in self._relation_codes}
+            for s, t, code in zip(self.e_src, self.e_tgt, self.e_rel):
+                if code in codes:
+                    outdeg[s] += 1
+                    indeg[t] += 1
+        else:
+            for s in self.e_src:
+                outdeg[s] += 1
+            for t in self.e_tgt:
+                indeg[t] += 1
+        self._degree_cache[key] = (indeg, outdeg)
+        return indeg, outdeg
+
+    def node_dict(self, i: int, **extra) -> dict:
+        return {
+            "id": self.node_ids[i],
+            "label": self.labels[i],
+            "name": self.names[i],
+            **extra,
+        }
+
+    def _edge_dict(self, i: int, j: int, code: int, edge_id: int, is_out: int) -> dict:
+        src, tgt = (i, j) if is_out else (j, i)
+        return {
+            "id": edge_id,
+            "source_node_id": self.node_ids[src],
+            "target_node_id": self.node_ids[tgt],
+            "relation": self.relations[code],
+        }
+
+    def neighborhood(
+        self,
+        node_id: int,
+        hops: int = 1,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_nodes: int = 500,
+    ) -> dict | None:
+        """Nodes within `hops` of node_id (breadth-first) and the edges between them."""
+        start = self.index.get(node_id)
+        if start is None:
+            return None
+        ok = self._edge_filter(relations, direction)
+        dist = {start: 0}
+        frontier = [start]
+        truncated = False
+        for depth in range(1, hops + 1):
+            nxt = []
+            for i in frontier:
+                for j, code, _, is_out in self.incident(i):
+                    if j in dist or not ok(code, is_out):
+                        continue
+                    if len(dist) >= max_nodes:
+                        truncated = True
+                        break
+                    dist[j] = depth
+                    nxt.append(j)
+            frontier = nxt
+            if truncated or not frontier:
+                break
+
+        # Induced subgraph: each edge once, from its source endpoint
+        rel_ok = self._edge_filter(relations, "both")
+        edges = [
+            self._edge_dict(i, j, code, edge_id, is_out)
+            for i in dist
+            for j, code, edge_id, is_out in self.incident(i)
+            if is_out and j in dist and rel_ok(code, is_out)
+        ]
+        edges.sort(key=lambda e: e["id"])
+        return {
+            "center": self.node_dict(start),
+            "nodes": [
+                self.node_dict(i, distance=d)
+                for i, d in sorted(dist.items(), key=lambda kv: (kv[1], kv[0]))
+            ],
+            "edges": edges,
+            "truncated": truncated,
+        }
+
+    def shortest_path(
+        self,
+        source_id: int,
+        target_id: int,
+        relations: list[str] | None = None,
+        direction: str = "both",
+        max_hops: int = 6,
+    ) -> dict | None:
+        """Fewest-hop relation path (bidirectional breadth-first search).
+
+        Returns None when either node is unknown, {"found": False, ...}
+        when no path of at most max_hops edges exists.
+        """
+        s, t = self.index.get(source_id), self.index.get(target_id)
+        if s is None or t is None:
+            return None
+        ok = self._edge_filter(relations, direction)
+        if s == t:
+            return {"found": True, "hops": 0, "nodes": [self.node_dict(s)], "edges": []}
+
+        # parent[node] = (previous node, code, edge id, is_out as seen from previous)
+        fwd: dict[int, tuple | None] = {s: None}
+        bwd: dict[int, tuple | None] = {t: None}
+        fwd_frontier, bwd_frontier = [s], [t]
+        meet = None
+        hops = 0
+        while fwd_frontier and bwd_frontier and hops < max_hops and meet is None:
+            hops += 1
+            # Expand the smaller side
+            forward = len(fwd_frontier) <= len(bwd_frontier)
+            frontier = fwd_frontier if forward else bwd_frontier
+            seen, other = (fwd, bwd) if forward else (bwd, fwd)
+            nxt = []
+            for i in frontier:
+                for j, code, edge_id, is_out in self.incident(i):
+                    # Backward search walks edges against the wanted direction
+                    if j in seen or not ok(code, is_out if forward else 1 - is_out):
+                        continue
+                    seen[j] = (i, code, edge_id, is_out)
+                    if j in other:
+                        meet = j
+                        break
+                    nxt.append(j)
+                if meet is not None:
+                    break
+            if forward:
+                fwd_frontier = nxt
+            else:
+                bwd_frontier = nxt
+
+        if meet is None:
+            return {"found": False, "hops": None, "nodes": [], "edges": []}
+
+        path = [meet]
+        edges = []
+        node = meet
+        while fwd[node] is not None:
+            prev, code, edge_id, is_out = fwd[node]
+            edges.append(self._edge_dict(prev, node, code, edge_id, is_out))
+            path.append(prev)
+            node = prev
+        path.reverse()
+        edges.reverse()
+        node = meet
+        while bwd[node] is not None:
+            prev, code, edge_id, is_out = bwd[node]
+            edges.append(self._edge_dict(prev, node, code, edge_id, is_out))
+            path.append(prev)
+            node = prev
+        return {
+            "found": True,
+            "hops": len(edges),
+            "nodes": [self.node_dict(i) for i in path],
+            "edges": edges,
+        }
+
+    def filter_by_degree(
+        self,
+        min_degree: int = 0,
+        max_degree: int | None = None,
+        relations: list[str] | None = None,
+        label: str | None = None,
+        direction: str = "both",
+        limit: int = 100,
+    ) -> list[dict]:
+        """Nodes whose degree falls in range, highest degree first."""
+        indeg, outdeg = self.degrees(relations)
+        rows = []
+        for i in range(len(self.node_ids)):
+            if label and self.labels[i] != label:
+                continue
+            degree = {"both": indeg[i] + outdeg[i], "in": indeg[i], "out": outdeg[i]}[
+                direction
+            ]
+            if degree < min_degree or (max_degree is not None and degree > max_degree):
+                continue
+            rows.append((degree, i))
+        rows.sort(key=lambda r: (-r[0], self.node_ids[r[1]]))
+        return [
+            self.node_dict(i, degree=d, in_degree=indeg[i], out_degree=outdeg[i])
+            for d, i in rows[:limit]
+        ]
+
+
+async def graph_stamp(db: AsyncSession, project_id: int) -> tuple:
+    """(node count, max node id, edge count, max edge id, generation)."""
+    node_stats = (
+        select(func.count(KGNode.id), func.coalesce(func.max(KGNode.id), 0))
+        .where(KGNode.project_id == project_id)
+    )
+    edge_stats = (
+        select(func.count(KGEdge.id), func.coalesce(func.max(KGEdge.id), 0))
+        .where(KGEdge.project_id == project_id)
+    )
+    nodes = (await db.execute(node_stats)).one()
+    edges = (await db.execute(edge_stats)).one()
+    return (*nodes, *edges, _graph_generations[project_id])
+
+
+async def _load_rows(db: AsyncSession, project_id: int, node_after: int = 0, edge_after: int = 0):
+    nodes = await db.execute(
+        select(KGNode.id, KGNode.label, KGNode.name)
+        .where(KGNode.project_id == project_id, KGNode.id > node_after)
+        .order_by(KGNode.id)
+    )
+    edges = await db.execute(
+        select(KGEdge.id, KGEdge.source_node_id, KGEdge.target_node_id, KGEdge.relation)
+        .where(KGEdge.project_id == project_id, KGEdge.id > edge_after)
+        .order_by(KGEdge.id)
+    )
+    return nodes.all(), edges.all()
+
+
+async def get_graph_snapshot(db: AsyncSession, project_id: int) -> GraphSnapshot:
+    """Current snapshot for a project; appended rows are applied in place."""
+    stamp = await graph_stamp(db, project_id)
+    cached = graph_snapshot_cache.get(project_id)
+    if cached is not None:
+        old_stamp, snapshot = cached
+        if old_stamp == stamp:
+            return snapshot
+        old_nodes, old_max_node, old_edges, old_max_edge, old_gen = old_stamp
+        if old_gen == stamp[4] and stamp[0] >= old_nodes and stamp[2] >= old_edges:
+            nodes, edges = await _load_rows(db, project_id, old_max_node, old_max_edge)
+            # Pure appends: every extra row has an id above the old watermark
+            if (
+                len(nodes) == stamp[0] - old_nodes
+                and len(edges) == stamp[2] - old_edges
+            ):
+                snapshot.extend(nodes, edges)
+                graph_snapshot_cache.put(project_id, (stamp, snapshot))
+                return snapshot
+
+    nodes, edges = await _load_rows(db, project_id)
+    snapshot = GraphSnapshot(nodes, edges)
+    graph_snapshot_cache.put(project_id, (stamp, snapshot))
+    return snapshot
@@ -0,0 +1,178 @@
+"""Project → Book → Chapter → Scene ancestry resolution.
+
+Each resolver is a single joined query, memoized on the session
+(``AsyncSession.info``), so one request pays for a given chain at most
+once no matter how many services ask for it. Sessions are request-scoped
+(see ``get_db``), which bounds the memo's lifetime; flushing any
+created, moved or deleted book/chapter/scene drops the memo.
+
+``project_of_row`` answers the same question synchronously for flush
+hooks, sharing the memo.
+"""
+
+from typing import NamedTuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Book,
+    Chapter,
+    ChapterSummary,
+    Project,
+    Scene,
+    SceneTextVersion,
+    SummaryRollup,
+)
+
+_MEMO_KEY = "ancestry_memo"
+
+
+class ChapterAncestry(NamedTuple):
+    chapter_id: int
+    chapter_sort: int
+    book_id: int
+    project_id: int
+
+
+class SceneAncestry(NamedTuple):
+    scene_id: int
+    scene_sort: int
+    chapter_id: int
+    chapter_sort: int
+    book_id: int
+    project_id: int
+
+    @property
+    def chapter(self) -> ChapterAncestry:
+        return ChapterAncestry(
+            self.chapter_id, self.chapter_sort, self.book_id, self.project_id
+        )
+
+
+def _memo(db: AsyncSession) -> dict:
+    return db.info.setdefault(_MEMO_KEY, {})
+
+
+def forget_ancestry(db: AsyncSession) -> None:
+    """Drop the session's ancestry memo."""
+    db.info.pop(_MEMO_KEY, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_on_move(session, flush_context):
+    if _MEMO_KEY not in session.info:
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Book, Chapter, Scene)):
+            session.info.pop(_MEMO_KEY, None)
+            return
+
+
+async def resolve_scene_ancestry(
+    db: AsyncSession, scene_id: int
+) -> SceneAncestry | None:
+    """Resolve scene_id → (chapter, book, project) in one query."""
+    memo = _memo(db)
+    key = ("scene", scene_id)
+    if key in memo:
+        return memo[key]
+
+    result = await db.execute(_scene_query(scene_id))
+    return _remember_scene(memo, key, result.one_or_none())
+
+
+async def resolve_chapter_ancestry(
+    db: AsyncSession, chapter_id: int
+) -> ChapterAncestry | None:
+    """Resolve chapter_id → (book, project) in one query."""
+    memo = _memo(db)
+    key = ("chapter", chapter_id)
+    if key in memo:
+        return memo[key]
+
+    result = await db.execute(_chapter_query(chapter_id))
+    row = result.one_or_none()
+    memo[key] = ChapterAncestry(*row) if row else None
+    return memo[key]
+
+
+def _scene_query(scene_id: int):
+    return (
+        select(
+            Scene.id,
+            Scene.sort_order,
+            Chapter.id,
+            Chapter.sort_order,
+            Book.id,
+            Book.project_id,
+        )
+        .join(Chapter, Chapter.id == Scene.chapter_id)
+        .join(Book, Book.id == Chapter.book_id)
+        .where(Scene.id == scene_id)
+    )
+
+
+def _chapter_query(chapter_id: int):
+    return (
+        select(Chapter.id, Chapter.sort_order, Book.id, Book.project_id)
+        .join(Book, Book.id == Chapter.book_id)
+        .where(Chapter.id == chapter_id)
+    )
+
+
+def _remember_scene(memo: dict, key: tuple, row) -> SceneAncestry | None:
+    ancestry = SceneAncestry(*row) if row else None
+    memo[key] = ancestry
+    if ancestry:
+        memo[("chapter", ancestry.chapter_id)] = ancestry.chapter
+    return ancestry
+
+
+# Parent reference of rows below the project: (attribute, memo kind)
+_PARENTS: dict[type, tuple[str, str]] = {
+    Chapter: ("book_id", "book"),
+    SummaryRollup: ("book_id", "book"),
+    Scene: ("chapter_id", "chapter"),
+    ChapterSummary: ("chapter_id", "chapter"),
+    SceneTextVersion: ("scene_id", "scene"),
+}
+
+
+def project_of_row(session: Session, obj: object) -> int | None:
+    """Project a flushed row belongs to, for flush hooks (sync).
+
+    Rows with a project_id answer directly; chapters, scenes, versions and
+    summaries go up through their parent, memoized like the resolvers
+    above. None when the chain is gone (deleted in the same flush) or the
+    row is not part of a project.
+    """
+    if isinstance(obj, Project):
+        return obj.id
+    # Read loaded state only: a deleted row cannot be refreshed
+    state = inspect(obj).dict
+    project_id = state.get("project_id")
+    if isinstance(project_id, int):
+        return project_id
+    parent = _PARENTS.get(type(obj))
+    parent_id = state.get(parent[0]) if parent else None
+    if not isinstance(parent_id, int):
+        return None
+
+    kind = parent[1]
+    memo = session.info.setdefault(_MEMO_KEY, {})
+    key = (kind, parent_id)
+    if key not in memo:
+        if kind == "book":
+            memo[key] = session.execute(
+                select(Book.project_id).where(Book.id == parent_id)
+            ).scalar_one_or_none()
+        elif kind == "chapter":
+            row = session.execute(_chapter_query(parent_id)).one_or_none()
+            memo[key] = ChapterAncestry(*row) if row else None
+        else:
+            row = session.execute(_scene_query(parent_id)).one_or_none()
+            _remember_scene(memo, key, row)
+    found = memo[key]
+    return found if kind == "book" or found is None else found.project_id
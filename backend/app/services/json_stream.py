@@ -0,0 +1,272 @@
+"""Incremental parser for JSON written by an LLM.
+
+``JSONStreamParser`` is fed text as it streams in and reports each
+element of the top-level "items" array (or of a top-level array), and
+each other top-level field of an object, as soon as that value closes,
+so callers can act before the response has finished. It tolerates what
+models wrap around JSON: preamble text and markdown fences are skipped,
+anything after the document is ignored, and ASCII double quotes between
+CJK characters inside a string (used as Chinese quotation marks) are
+escaped on the fly.
+
+Scanning jumps between structural characters with regexes, visiting
+each character once, and consumed text is dropped after every feed:
+time is linear in the response and memory is bounded by the largest
+single value.
+"""
+
+import json
+import logging
+import re
+from typing import Any, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+_CJK = r"\u4e00-\u9fff\u3400-\u4dbf"
+_CJK_RE = re.compile(f"[{_CJK}]")
+# An ASCII quote between two CJK chars is text, not the end of the string
+_CJK_QUOTE = f'(?<=[{_CJK}])"(?=[{_CJK}])'
+_STRING_BODY_RE = re.compile(rf'[^"\\]*(?:(?:\\[\s\S]|{_CJK_QUOTE})[^"\\]*)*')
+_REPAIR_RE = re.compile(_CJK_QUOTE)
+_START_RE = re.compile(r"[{\[]")
+_STRUCT_RE = re.compile(r'[{}\[\]",:]')
+# Inside a value being captured only nesting and strings matter
+_NESTED_RE = re.compile(r'[{}\[\]"]')
+_VALUE_RE = re.compile(r"\S")
+# strict=False: models often put raw newlines inside strings
+_decoder = json.JSONDecoder(strict=False)
+
+
+class JSONStreamParser:
+    """Push-style parser over one JSON document arriving in chunks.
+
+    ``feed`` and ``close`` return the events completed so far:
+    ("item", index, value) per element of the items array and
+    ("field", key, value) per other top-level field. With items_key
+    None every field of a top-level object is reported as a field.
+    An element that fails to decode is logged and skipped.
+    """
+
+    def __init__(self, items_key: str | None = "items") -> None:
+        self.items_key = items_key
+        self.complete = False
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._started = False
+        # Open containers: [bracket, next string is a key]
+        self._stack: list[list] = []
+        self._in_string = False
+        self._slot = False  # a value starts at the next non-space char
+        self._items_level: int | None = None
+        self._opens_items = False
+        self._key: Any = None
+        self._index = 0
+        self._events: list[tuple] = []
+        # Value being captured: kind ("item" | "field" | "key"), depth, shape
+        self._cap_kind: str | None = None
+        self._cap_level = 0
+        self._cap_shape = ""  # "container" | "string" | "scalar"
+        self._parts: list[str] = []
+        self._mark = 0
+
+    def feed(self, chunk: str) -> list[tuple]:
+        if not self.complete:
+            self._buf += chunk
+            self._scan()
+            self._trim()
+        return self._take()
+
+    def close(self) -> list[tuple]:
+        """Flush what waited on lookahead; call once the stream has ended."""
+        self._eof = True
+        if not self.complete:
+            self._scan()
+        return self._take()
+
+    def _take(self) -> list[tuple]:
+        events, self._events = self._events, []
+        return events
+
+    def _trim(self) -> None:
+        # Keep one consumed char: the quote check looks one char back
+        cut = self._pos - 1
+        if cut <= 0:
+            return
+        if self._cap_kind is not None:
+            self._parts.append(self._buf[self._mark:self._pos])
+            self._mark = self._pos - cut
+        self._buf = self._buf[cut:]
+        self._pos -= cut
+
+    # ---------- Captures ----------
+
+    def _begin(self, kind: str, pos: int, shape: str) -> None:
+        self._cap_kind = kind
+        self._cap_level = len(self._stack)
+        self._cap_shape = shape
+        self._parts = []
+        self._mark = pos
+
+    def _finish(self, end: int) -> None:
+        self._parts.append(self._buf[self._mark:end])
+        text = _REPAIR_RE.sub(r'\\"', "".join(self._parts).strip())
+        kind, self._cap_kind, self._parts = self._cap_kind, None, []
+        try:
+            value = _decoder.decode(text)
+        except json.JSONDecodeError:
+            logger.warning("Skipping malformed JSON value: %s", text[:200])
+            return
+        if kind == "key":
+            self._key = value
+        elif kind == "field":
+            self._events.append(("field", self._key, value))
+        else:
+            self._events.append(("item", self._index, value))
+            self._index += 1
+
+    def _value_starts(self, pos: int, char: str) -> None:
+        level = len(self._stack)
+        root = self._stack[0][0]
+        if level == 1 and root == "{":
+            if char == "[" and self.items_key is not None and self._key == self.items_key:
+                self._opens_items = True
+                return
+            kind = "field"
+        elif (level == 1 and root == "[") or level == self._items_level:
+            kind = "item"
+        else:
+            return
+        if self._cap_kind is None:
+            shape = "container" if char in "{[" else "string" if char == '"' else "scalar"
+            self._begin(kind, pos, shape)
+
+    # ---------- Scanner ----------
+
+    def _scan(self) -> None:
+        buf = self._buf
+        pos = self._pos
+        stack = self._stack
+        while True:
+            if not self._started:
+                m = _START_RE.search(buf, pos)
+                if not m:
+                    pos = len(buf)
+                    break
+                pos = m.start()
+                self._started = True
+            elif self._in_string:
+                end = _STRING_BODY_RE.match(buf, pos).end()
+                # Wait for more text when the string is cut short, after a
+                # lone backslash, or at a quote whose next char decides it
+                if end >= len(buf) or buf[end] == "\\" or (
+                    end + 1 == len(buf) and _CJK_RE.match(buf, end - 1)
+                ):
+                    if not self._eof:
+                        pos = end
+                        break
+                    if end >= len(buf) or buf[end] == "\\":
+                        pos = len(buf)
+                        break
+                self._in_string = False
+                pos = end + 1
+                if (
+                    self._cap_kind is not None
+                    and self._cap_shape == "string"
+                    and self._cap_level == len(stack)
+                ):
+                    self._finish(pos)
+                continue
+            elif self._slot:
+                m = _VALUE_RE.search(buf, pos)
+                if not m:
+                    pos = len(buf)
+                    break
+                pos = m.start()
+                self._slot = False
+                if buf[pos] not in "]}":
+                    self._value_starts(pos, buf[pos])
+
+            nested = self._cap_kind is not None and len(stack) > self._cap_level
+            m = (_NESTED_RE if nested else _STRUCT_RE).search(buf, pos)
+            if not m:
+                pos = len(buf)
+                break
+            i = m.start()
+            char = buf[i]
+            pos = i + 1
+            scalar_ends = (
+                self._cap_kind is not None
+                and self._cap_shape == "scalar"
+                and self._cap_level == len(stack)
+            )
+            if char == '"':
+                self._in_string = True
+                if len(stack) == 1 and stack[0][0] == "{" and stack[0][1]:
+                    self._begin("key", i, "string")
+            elif char in "{[":
+                stack.append([char, char == "{"])
+                self._slot = char == "["
+                if self._opens_items:
+                    self._opens_items = False
+                    self._items_level = len(stack)
+            elif char in "}]":
+                if scalar_ends:
+                    self._finish(i)
+                if not stack:
+                    continue
+                stack.pop()
+                if self._items_level is not None and len(stack) < self._items_level:
+                    self._items_level = None
+                if not stack:
+                    self.complete = True
+                    break
+                if (
+                    self._cap_kind is not None
+                    and self._cap_shape == "container"
+                    and self._cap_level == len(stack)
+                ):
+                    self._finish(pos)
+            elif char == ",":
+                if scalar_ends:
+                    self._finish(i)
+                if stack[-1][0] == "{":
+                    stack[-1][1] = True
+                else:
+                    self._slot = True
+            else:  # ":"
+                stack[-1][1] = False
+                self._slot = True
+        self._pos = pos
+
+
+def parse_json_items(raw: str, items_key: str = "items") -> list:
+    """Elements of the top-level items array (or top-level array) in raw text."""
+    parser = JSONStreamParser(items_key)
+    events = parser.feed(raw or "") + parser.close()
+    if not parser.complete:
+        logger.warning("Incomplete JSON in LLM output: %s", (raw or "")[:200])
+    return [value for kind, _, value in events if kind == "item"]
+
+
+def parse_json_object(raw: str) -> dict:
+    """Top-level fields of the JSON object in raw text ({} if there is none)."""
+    parser = JSONStreamParser(items_key=None)
+    events = parser.feed(raw or "") + parser.close()
+    if not parser.complete:
+        logger.warning("Incomplete JSON in LLM output: %s", (raw or "")[:200])
+    return {key: value for kind, key, value in events if kind == "field"}
+
+
+async def iter_json_events(
+    chunks: AsyncIterator[str], items_key: str | None = "items"
+) -> AsyncIterator[tuple]:
+    """Parser events for a streamed response, as each value closes."""
+    parser = JSONStreamParser(items_key)
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            yield event
+        if parser.complete:
+            break
+    for event in parser.close():
+        yield event
@@ -0,0 +1,226 @@
+"""Node importance for the knowledge graph: degree, PageRank, communities.
+
+Computed in bulk with NumPy over the edge arrays of the in-memory graph
+snapshot (``graph_snapshot``): a sparse matrix-vector product is a
+``bincount`` over the edge list, so the PageRank and label-propagation
+iterations never loop over nodes or edges in Python. Results are stored
+per node in ``kg_node_metrics`` for SQL sorting and filtering.
+
+``ensure_node_metrics`` recomputes only when the graph stamp moved since
+the last run, and warm-starts PageRank and label propagation from the
+previous result, so a few new edges cost a few iterations.
+"""
+
+import time
+
+import numpy as np
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import KGNodeMetric
+from app.services.cache import LRUCache, bump_generation
+from app.services.graph_snapshot import GraphSnapshot, get_graph_snapshot, graph_stamp
+
+# project_id -> (graph stamp, {node id: pagerank}, {node id: community})
+node_metrics_cache = LRUCache(maxsize=64)
+
+DAMPING = 0.85
+PAGERANK_TOL = 1e-6
+PAGERANK_MAX_ITER = 100
+COMMUNITY_MAX_ITER = 30
+
+
+def _edge_arrays(snapshot: GraphSnapshot) -> tuple[np.ndarray, np.ndarray]:
+    return (
+        np.asarray(snapshot.e_src, dtype=np.int64),
+        np.asarray(snapshot.e_tgt, dtype=np.int64),
+    )
+
+
+def pagerank(
+    n: int,
+    src: np.ndarray,
+    tgt: np.ndarray,
+    start: np.ndarray | None = None,
+    damping: float = DAMPING,
+    tol: float = PAGERANK_TOL,
+    max_iter: int = PAGERANK_MAX_ITER,
+) -> tuple[np.ndarray, int]:
+    """PageRank over the undirected graph; returns (scores summing to 1, iterations).
+
+    Relations are read in both directions (an item owned by a central
+    character is itself central). Rank of nodes without edges is spread
+    uniformly.
+    """
+    if n == 0:
+        return np.zeros(0), 0
+    u = np.concatenate([src, tgt])
+    v = np.concatenate([tgt, src])
+    deg = np.bincount(u, minlength=n).astype(np.float64)
+    dangling = deg == 0
+    inv_deg = np.divide(1.0, deg, out=np.zeros(n), where=~dangling)
+    x = np.full(n, 1.0 / n) if start is None else start / start.sum()
+    for iteration in range(1, max_iter + 1):
+        spread = np.bincount(v, weights=(x * inv_deg)[u], minlength=n)
+        nxt = damping * (spread + x[dangling].sum() / n) + (1.0 - damping) / n
+        err = np.abs(nxt - x).sum()
+        x = nxt
+        if err < n * tol:
+            break
+    return x / x.sum(), iteration
+
+
+def label_propagation(
+    n: int,
+    src: np.ndarray,
+    tgt: np.ndarray,
+    start: np.ndarray | None = None,
+    max_iter: int = COMMUNITY_MAX_ITER,
+    seed: int = 0,
+) -> tuple[np.ndarray, int]:
+    """Community label per node index; returns (labels, iterations).
+
+    Each round every node takes the label most common among its
+    neighbours (keeping its own on a tie, else a random one). Only a
+    random half of the nodes move per round, which stops the two-colour
+    oscillation of fully synchronous updates. A fixed seed keeps results
+    reproducible. Labels are node indices.
+    """
+    labels = np.arange(n) if start is None else start.copy()
+    keep = src != tgt
+    u = np.concatenate([src[keep], tgt[keep]])
+    v = np.concatenate([tgt[keep], src[keep]])
+    if not len(u):
+        return labels, 0
+    rng = np.random.default_rng(seed)
+    for iteration in range(1, max_iter + 1):
+        # (node, neighbour label) pairs with counts, sorted by node then label
+        pairs, counts = np.unique(u * n + labels[v], return_counts=True)
+        node, label = pairs // n, pairs % n
+        starts = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        best = np.zeros(n, dtype=counts.dtype)
+        best[node[starts]] = np.maximum.reduceat(counts, starts)
+        top = counts == best[node]
+        top_node, top_label = node[top], label[top]
+        # Break ties at random: shuffle the top pairs within each node
+        jitter = rng.integers(0, 1 << 20, len(top_node))
+        order = np.argsort((top_node << 20) | jitter)
+        top_node, top_label = top_node[order], top_label[order]
+        candidate = labels.copy()
+        first = np.flatnonzero(np.r_[True, top_node[1:] != top_node[:-1]])
+        candidate[top_node[first]] = top_label[first]
+        own = top_label == labels[top_node]
+        candidate[top_node[own]] = labels[top_node[own]]
+
+        changed = candidate != labels
+        if not changed.any():
+            return labels, iteration
+        move = changed & (rng.random(n) < 0.5)
+        labels[move] = candidate[move]
+    return labels, max_iter
+
+
+def compute_node_metrics(snapshot: GraphSnapshot, previous: tuple | None = None) -> dict:
+    """Degree, PageRank and community for every node of a snapshot.
+
+    previous: (pagerank by node id, community by node id) to warm-start from.
+    Returns node-index-aligned arrays plus iteration counts.
+    """
+    n = len(snapshot.node_ids)
+    node_ids = np.asarray(snapshot.node_ids, dtype=np.int64)
+    src, tgt = _edge_arrays(snapshot)
+    out_degree = np.bincount(src, minlength=n)
+    in_degree = np.bincount(tgt, minlength=n)
+
+    rank_start = label_start = None
+    if previous is not None and n:
+        old_rank, old_community = previous
+        rank_start = np.array([old_rank.get(int(i), 1.0 / n) for i in node_ids])
+        # Old communities are node ids; map them back to indices when still present
+        label_start = np.array(
+            [snapshot.index.get(old_community.get(int(i), int(i)), k)
+             for k, i in enumerate(node_ids)],
+            dtype=np.int64,
+        )
+    ranks, rank_iters = pagerank(n, src, tgt, rank_start)
+    labels, community_iters = label_propagation(n, src, tgt, label_start)
+
+    # Name each community by its smallest member id
+    community = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(community, labels, node_ids)
+    return {
+        "node_ids": node_ids,
+        "degree": in_degree + out_degree,
+        "in_degree": in_degree,
+        "out_degree": out_degree,
+        "pagerank": ranks,
+        "community": community[labels],
+        "pagerank_iterations": rank_iters,
+        "community_iterations": community_iters,
+    }
+
+
+async def recompute_node_metrics(db: AsyncSession, project_id: int) -> dict:
+    """Recompute and store metrics for every node of a project; returns a summary."""
+    stamp = await graph_stamp(db, project_id)
+    snapshot = await get_graph_snapshot(db, project_id)
+    cached = node_metrics_cache.get(project_id)
+    started = time.perf_counter()
+    metrics = compute_node_metrics(snapshot, cached[1:] if cached else None)
+    compute_ms = (time.perf_counter() - started) * 1000
+
+    node_ids = metrics["node_ids"].tolist()
+    rows = [
+        {
+            "node_id": node_id,
+            "project_id": project_id,
+            "degree": degree,
+            "in_degree": in_degree,
+            "out_degree": out_degree,
+            "pagerank": rank,
+            "community": community,
+        }
+        for node_id, degree, in_degree, out_degree, rank, community in zip(
+            node_ids,
+            metrics["degree"].tolist(),
+            metrics["in_degree"].tolist(),
+            metrics["out_degree"].tolist(),
+            metrics["pagerank"].tolist(),
+            metrics["community"].tolist(),
+        )
+    ]
+    await db.execute(delete(KGNodeMetric).where(KGNodeMetric.project_id == project_id))
+    if rows:
+        await db.execute(insert(KGNodeMetric), rows)
+
+    node_metrics_cache.put(
+        project_id,
+        (
+            stamp,
+            {r["node_id"]: r["pagerank"] for r in rows},
+            {r["node_id"]: r["community"] for r in rows},
+        ),
+    )
+    # Context packs rank facts by these values
+    bump_generation(project_id)
+    return {
+        "project_id": project_id,
+        "nodes": len(rows),
+        "edges": snapshot.edge_count,
+        "communities": len(set(metrics["community"].tolist())),
+        "pagerank_iterations": metrics["pagerank_iterations"],
+        "community_iterations": metrics["community_iterations"],
+        "compute_ms": round(compute_ms, 2),
+    }
+
+
+async def ensure_node_metrics(db: AsyncSession, project_id: int) -> bool:
+    """Recompute stored metrics if the graph changed since the last run.
+
+    Returns True when a recompute happened.
+    """
+    cached = node_metrics_cache.get(project_id)
+    if cached is not None and cached[0] == await graph_stamp(db, project_id):
+        return False
+    await recompute_node_metrics(db, project_id)
+    return True
@@ -1,15 +1,43 @@
-"""KG extraction service: parse chapter scenes and extract facts via LLM."""
+"""KG extraction service: parse chapter scenes and extract facts via LLM.
+
+A chapter is cut into overlapping windows at paragraph boundaries, short
+scenes sharing a window; the windows are extracted concurrently (bounded
+by KG_EXTRACT_CONCURRENCY) and their items merged by name, so wall time
+follows the largest window rather than the chapter length.
+
+Extraction is incremental per scene version: only scenes edited since
+the last run are sent (windows are packed over runs of adjacent edited
+scenes, with a bounded slice of the neighbouring scenes as context), each
+item is attributed to the scene versions it came from, and proposals
+whose source text was superseded are marked stale. Raw window outputs are
+also cached by content hash (``llm_cache``), so unchanged windows never
+cost a call.
+"""
 
+import asyncio
+import contextlib
 import json
 import logging
 import re
 
-from sqlalchemy import select
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.llm import call_llm
-from app.models.tables import Chapter, KGProposal, Scene, SceneTextVersion
-from app.services.graph_service import SQLiteGraphAdapter
+from app.models.tables import Chapter, KGProposal, KGSceneExtraction
+from app.services import kg_facts  # noqa: F401  (indexes proposals on flush)
+from app.services.graph_service import GraphService, SQLiteGraphAdapter
+from app.services.json_stream import parse_json_items
+from app.services.kg_names import normalize_name
+from app.services.llm_cache import (
+    get_cached_outputs,
+    llm_cache_key,
+    record_hits,
+    store_output,
+)
+from app.services.scene_text import get_chapter_scene_versions
 
 logger = logging.getLogger(__name__)
 
@@ -35,143 +63,513 @@ Rules:
 - confidence: 0.9+ only when the fact is stated explicitly.
 - Keep evidence short (under 30 chars) to avoid quoting issues.
 - Skip obvious/generic facts; focus on story-specific ones.
+- Text inside <context> tags comes from neighbouring scenes: use it only to
+  resolve references, and do not extract facts stated only there.
 """
 
 
-def _safe_loads_list(raw: str) -> list:
-    """Parse JSON array from LLM output, return [] on failure."""
-    # Strip markdown fences and preamble text
-    m = re.search(r"```(?:json)?\s*\n?(.*?)```", raw, re.DOTALL)
-    if m:
-        raw = m.group(1).strip()
-    else:
-        # Find first JSON structure
-        idx_arr = raw.find("[")
-        idx_obj = raw.find("{")
-        idx = -1
-        if idx_arr >= 0 and idx_obj >= 0:
-            idx = min(idx_arr, idx_obj)
-        elif idx_arr >= 0:
-            idx = idx_arr
-        elif idx_obj >= 0:
-            idx = idx_obj
-        if idx > 0:
-            raw = raw[idx:]
-
-    # Fix unescaped ASCII double quotes used as Chinese quotation marks
-    # Only match CJK unified ideographs, exclude fullwidth punctuation
-    raw = re.sub(
-        r'(?<=[\u4e00-\u9fff\u3400-\u4dbf])"(?=[\u4e00-\u9fff\u3400-\u4dbf])',
-        r'\\"',
-        raw,
-    )
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?.…」』\n])")
+
+
+def _split_long(paragraph: str, max_chars: int) -> list[str]:
+    """Cut an over-long paragraph at sentence ends (hard cut as a last resort)."""
+    pieces: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if len(current) + len(sentence) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def pack_windows(
+    scenes: list[str], max_chars: int, overlap: int
+) -> list[list[tuple[int, str]]]:
+    """Cut chapter text into windows of at most max_chars (plus overlap).
+
+    Returns each window as (scene index, paragraph) pieces. Windows end on
+    paragraph boundaries and prefer to end where a scene ends, so short
+    scenes share a window. Each window after the first repeats up to
+    `overlap` chars of trailing paragraphs from the previous one, so facts
+    spanning a cut are still seen whole. A chapter that fits is returned
+    as one window of whole scenes.
+    """
+    whole = "\n\n".join(scenes)
+    if len(whole) <= max_chars:
+        return [list(enumerate(scenes))] if whole.strip() else []
+
+    # (scene index, paragraph, starts a scene)
+    paragraphs: list[tuple[int, str, bool]] = []
+    for index, scene in enumerate(scenes):
+        first = True
+        for para in re.split(r"\n\s*\n", scene):
+            para = para.strip()
+            if not para:
+                continue
+            # Leave room for the overlap carried in front of a piece
+            for piece in _split_long(para, max(max_chars - overlap - 2, 1)):
+                paragraphs.append((index, piece, first))
+                first = False
+
+    windows: list[list[tuple[int, str]]] = []
+    current: list[tuple[int, str]] = []
+    size = 0
+    fresh = 0  # chars in current beyond the overlap carried into it
+
+    def close() -> None:
+        nonlocal current, size, fresh
+        windows.append(current)
+        carried: list[tuple[int, str]] = []
+        kept = 0
+        for index, para in reversed(current):
+            if kept + len(para) > overlap:
+                break
+            carried.insert(0, (index, para))
+            kept += len(para) + 2
+        if not carried and overlap > 0:
+            index, para = current[-1]
+            carried = [(index, para[-overlap:])]
+            kept = len(carried[0][1]) + 2
+        current, size, fresh = carried, max(kept - 2, 0), 0
+
+    for index, para, scene_start in paragraphs:
+        cost = len(para) + (2 if current else 0)
+        # Close when full, or at a scene break once half a window is new text
+        if fresh and (
+            size + cost > max_chars or (scene_start and fresh >= max_chars // 2)
+        ):
+            close()
+            cost = len(para) + (2 if current else 0)
+            if size + cost > max_chars:
+                current, size = [], 0
+                cost = len(para)
+        current.append((index, para))
+        size += cost
+        fresh += cost
+    if fresh:
+        windows.append(current)
+    return windows
+
+
+def _window_text(pieces: list[tuple[int, str]]) -> str:
+    return "\n\n".join(text for _, text in pieces)
+
+
+def _with_context(text: str, before: str, after: str) -> str:
+    parts = [f"<context>\n{before}\n</context>"] if before else []
+    parts.append(text)
+    if after:
+        parts.append(f"<context>\n{after}\n</context>")
+    return "\n\n".join(parts)
 
-    try:
-        data = json.loads(raw)
-        # Support {"items": [...]} wrapper
-        if isinstance(data, dict) and "items" in data:
-            return data["items"] if isinstance(data["items"], list) else []
-        return data if isinstance(data, list) else []
-    except (json.JSONDecodeError, TypeError):
-        logger.warning("Failed to parse KG extraction JSON: %s", raw[:200])
-        return []
 
+def _changed_runs(versions: list[int], changed: set[int]) -> list[list[int]]:
+    """Indices of changed scenes, grouped into runs of adjacent ones."""
+    runs: list[list[int]] = []
+    for index, version_id in enumerate(versions):
+        if version_id not in changed:
+            continue
+        if runs and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
 
-async def _collect_chapter_text(db: AsyncSession, chapter_id: int) -> str:
-    """Concatenate latest scene texts for a chapter."""
-    result = await db.execute(
-        select(Scene)
-        .where(Scene.chapter_id == chapter_id)
-        .order_by(Scene.sort_order)
-    )
-    scenes = result.scalars().all()
-
-    parts = []
-    for scene in scenes:
-        ver_result = await db.execute(
-            select(SceneTextVersion)
-            .where(SceneTextVersion.scene_id == scene.id)
-            .order_by(SceneTextVersion.version.desc())
-            .limit(1)
+
+def split_windows(scenes: list[str], max_chars: int, overlap: int) -> list[str]:
+    """Window texts of pack_windows (a chapter that fits: scenes joined by blank lines)."""
+    return [_window_text(w) for w in pack_windows(scenes, max_chars, overlap)]
+
+
+CACHE_KIND = "kg_extraction"
+
+
+def _window_messages(text: str) -> list[dict]:
+    return [
+        {"role": "system", "content": _EXTRACTION_SYSTEM},
+        {"role": "user", "content": text},
+    ]
+
+
+async def _extract_window(text: str, semaphore: asyncio.Semaphore) -> str | None:
+    """Raw LLM output for one window; None when the call fails."""
+    async with semaphore:
+        try:
+            response = await call_llm(
+                _window_messages(text), response_format={"type": "json_object"}
+            )
+            return response.choices[0].message.content or ""
+        except Exception as exc:  # noqa: BLE001
+            logger.error("LLM call failed during KG extraction: %s", exc)
+            return None
+
+
+def _parse_items(raw: str) -> list[dict]:
+    return [i for i in parse_json_items(raw) if isinstance(i, dict)]
+
+
+def _item_key(item: dict) -> tuple:
+    if item.get("category") == "relation":
+        return (
+            "relation",
+            normalize_name(str(item.get("source", ""))),
+            str(item.get("relation", "")).strip().lower(),
+            normalize_name(str(item.get("target", ""))),
         )
-        version = ver_result.scalar_one_or_none()
-        if version and version.content_md:
-            parts.append(version.content_md)
+    return (item.get("category", "entity"), normalize_name(str(item.get("name", ""))))
 
-    return "\n\n".join(parts)
 
+def _confidence(item: dict) -> float:
+    """The item's confidence clamped to [0, 1]; 0 when it is not a number."""
+    try:
+        value = float(item.get("confidence", 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+    # NaN fails every comparison
+    return min(max(value, 0.0), 1.0) if value == value else 0.0
 
-async def _approve_entity(graph: SQLiteGraphAdapter, project_id: int, item: dict) -> None:
-    """Create or update a node from an auto-approved entity proposal."""
-    await graph.upsert_node(
-        project_id=project_id,
-        label=item.get("label", "Concept"),
-        name=item.get("name", ""),
-        properties=item.get("properties", {}),
-    )
 
+def merge_window_items(windows: list[list[dict]]) -> list[dict]:
+    """Merge per-window items, deduplicating by (normalized) name.
 
-async def _approve_relation(
-    graph: SQLiteGraphAdapter, project_id: int, item: dict
+    The most confident copy of a fact supplies its fields, properties
+    from other copies fill gaps, and distinct evidence snippets are
+    joined. Items keep the order in which they were first seen.
+    """
+    merged: dict[tuple, dict] = {}
+    evidence: dict[tuple, list[str]] = {}
+    for items in windows:
+        for item in items:
+            key = _item_key(item)
+            snippet = str(item.get("evidence", "") or "")
+            if key not in merged:
+                merged[key] = dict(item)
+                evidence[key] = [snippet] if snippet else []
+                continue
+            kept = merged[key]
+            if _confidence(item) > _confidence(kept):
+                winner, other = dict(item), kept
+                merged[key] = winner
+            else:
+                winner, other = kept, item
+            props = other.get("properties")
+            if isinstance(props, dict) and props:
+                own = winner.get("properties")
+                winner["properties"] = {**props, **(own if isinstance(own, dict) else {})}
+            if snippet and snippet not in evidence[key]:
+                evidence[key].append(snippet)
+    for key, item in merged.items():
+        if len(evidence[key]) > 1:
+            item["evidence"] = " / ".join(evidence[key])
+    return list(merged.values())
+
+
+async def materialise_items(
+    graph: GraphService, project_id: int, items: list[dict]
 ) -> None:
-    """Create nodes for source/target then add edge for an auto-approved relation."""
-    source_id = await graph.ensure_node(
-        project_id=project_id,
-        name=item.get("source", ""),
-        fallback_label="Concept",
+    """Write approved entity/relation facts to the graph in batches.
+
+    Entities go first, so a relation naming an entity approved in the
+    same batch attaches to that node instead of a new Concept node.
+    """
+    entities = [i for i in items if i.get("category", "entity") == "entity"]
+    relations = [i for i in items if i.get("category") == "relation"]
+    await graph.upsert_nodes(
+        project_id,
+        [
+            {
+                "label": item.get("label", "Concept"),
+                "name": item.get("name", ""),
+                "properties": item.get("properties", {}),
+            }
+            for item in entities
+        ],
     )
-    target_id = await graph.ensure_node(
-        project_id=project_id,
-        name=item.get("target", ""),
+    if not relations:
+        return
+    node_ids = await graph.ensure_nodes(
+        project_id,
+        [
+            name
+            for item in relations
+            for name in (item.get("source", ""), item.get("target", ""))
+        ],
         fallback_label="Concept",
     )
-    await graph.upsert_edge(
-        project_id=project_id,
-        source_id=source_id,
-        target_id=target_id,
-        relation=item.get("relation", "related_to"),
-        properties={},
+    await graph.upsert_edges(
+        project_id,
+        [
+            {
+                "source_id": node_ids[2 * n],
+                "target_id": node_ids[2 * n + 1],
+                "relation": item.get("relation", "related_to"),
+                "properties": {},
+            }
+            for n, item in enumerate(relations)
+        ],
     )
 
 
+def _attribute(item: dict, parts: dict[int, str], context: str = "") -> list[int]:
+    """Versions of a window whose text holds the item's evidence (else names).
+
+    None when the item only shows up in the window's context.
+    """
+    if item.get("category") == "relation":
+        names = [item.get("source"), item.get("target")]
+    else:
+        names = [item.get("name")]
+    for needles in ([item.get("evidence")], names):
+        needles = [str(n).strip() for n in needles if n and str(n).strip()]
+        found = [v for v, text in parts.items() if any(n in text for n in needles)]
+        if found:
+            return found
+        if any(n in context for n in needles):
+            return []
+    return list(parts)
+
+
+async def _extract_windows(
+    db: AsyncSession,
+    scenes: list[tuple[int, int, str]],
+    changed: set[int],
+    force: bool,
+) -> tuple[list[list[tuple[dict, list[int]]]], set[int], list[str], dict[str, str]]:
+    """Items, with their source versions, of windows over the changed versions.
+
+    Each run of adjacent changed scenes is cut into windows (pack_windows),
+    so short scenes share a call; unchanged scenes are not sent, except
+    up to KG_EXTRACT_CONTEXT_CHARS of the scene before and after a run,
+    as context. Each item is attributed to the changed scenes of its
+    window that contain its evidence (or its names; else all of them);
+    items found only in the context are dropped. Windows already in the
+    result cache cost no LLM call (unless forced); the rest run
+    concurrently. Nothing is written here: returns the per-window
+    results, the changed versions none of whose windows failed, the cache
+    keys used and the fresh outputs to store, so the caller can do every
+    write after the calls.
+    """
+    versions = [version_id for _, version_id, _ in scenes]
+    scene_texts = [text.strip() for _, _, text in scenes]
+    reach = max(0, settings.KG_EXTRACT_CONTEXT_CHARS)
+    windows: list[list[tuple[int, str]]] = []
+    contexts: list[tuple[str, str]] = []
+    for run in _changed_runs(versions, changed):
+        packed = pack_windows(
+            [scene_texts[i] for i in run],
+            settings.KG_EXTRACT_WINDOW_CHARS,
+            settings.KG_EXTRACT_OVERLAP_CHARS,
+        )
+        for n, pieces in enumerate(packed):
+            first, last = run[0], run[-1]
+            before = scene_texts[first - 1][-reach:] if reach and n == 0 and first else ""
+            after = (
+                scene_texts[last + 1][:reach]
+                if reach and n == len(packed) - 1 and last + 1 < len(scenes)
+                else ""
+            )
+            windows.append([(run[i], para) for i, para in pieces])
+            contexts.append((before, after))
+    texts = [
+        _with_context(_window_text(pieces), *context)
+        for pieces, context in zip(windows, contexts)
+    ]
+    keys = [llm_cache_key(CACHE_KIND, _window_messages(t)) for t in texts]
+    cached = {} if force else await get_cached_outputs(db, keys)
+
+    semaphore = asyncio.Semaphore(max(1, settings.KG_EXTRACT_CONCURRENCY))
+    missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in cached))
+    outputs = await asyncio.gather(*(_extract_window(t, semaphore) for t in missing))
+    fresh = dict(zip(missing, outputs))
+
+    results: list[list[tuple[dict, list[int]]]] = []
+    failed: set[int] = set()
+    to_store: dict[str, str] = {}
+    for pieces, context, text, key in zip(windows, contexts, texts, keys):
+        raw = cached[key] if key in cached else fresh[text]
+        if raw is None:
+            failed.update(versions[index] for index, _ in pieces)
+            continue
+        items = _parse_items(raw)
+        # Unparseable output is not worth keeping
+        if items and key not in cached:
+            to_store[key] = raw
+        parts: dict[int, str] = {}
+        for index, para in pieces:
+            version_id = versions[index]
+            parts[version_id] = f"{parts[version_id]}\n\n{para}" if version_id in parts else para
+        attributed = [
+            (item, _attribute(item, parts, "\n".join(context))) for item in items
+        ]
+        results.append([(item, found) for item, found in attributed if found])
+    return results, changed - failed, list(cached), to_store
+
+
+def _proposal_key(proposal: KGProposal) -> tuple:
+    try:
+        data = json.loads(proposal.data_json or "{}")
+    except (json.JSONDecodeError, TypeError):
+        data = {}
+    return _item_key(data if isinstance(data, dict) else {})
+
+
+def _source_versions(proposal: KGProposal) -> list[int]:
+    try:
+        ids = json.loads(proposal.source_versions_json or "[]")
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [i for i in ids if isinstance(i, int)] if isinstance(ids, list) else []
+
+
 async def extract_kg_from_chapter(
-    db: AsyncSession, chapter_id: int, project_id: int
+    db: AsyncSession,
+    chapter_id: int,
+    project_id: int,
+    force: bool = False,
+    write_lock: asyncio.Lock | None = None,
+    stats: dict | None = None,
 ) -> list[KGProposal]:
-    """Extract KG facts from all scenes in a chapter.
+    """Extract KG facts from the scenes of a chapter that changed.
+
+    Extraction is tracked per scene version (kg_scene_extractions): only
+    scenes whose latest version differs from the one last extracted are
+    sent, with a little neighbouring text as context (see
+    _extract_windows). Each proposal records the
+    versions it came from. A fact found again keeps its proposal (no
+    duplicate); one whose every source version was superseded is marked
+    stale. A scene whose LLM call fails keeps its previous results and is
+    retried next run; ``stats["failed"]`` counts such scenes. ``force``
+    re-extracts every scene and bypasses the LLM result cache.
+
+    All writes happen after the LLM calls. With ``write_lock`` (chapters
+    of one project extracted concurrently on separate sessions) they run
+    under the lock and are committed before it is released, so one
+    chapter's new nodes are visible to the next.
 
     - Confidence >= 0.9 → auto_approved (node/edge created immediately)
     - Confidence 0.6-0.9 → pending (awaits user review)
     - Confidence < 0.6  → rejected (too uncertain)
+
+    Returns the chapter's current (non-stale) proposals.
     """
     chapter = await db.get(Chapter, chapter_id)
     if not chapter:
         logger.warning("Chapter %d not found, skipping extraction.", chapter_id)
         return []
 
-    text = await _collect_chapter_text(db, chapter_id)
-    if not text.strip():
-        return []
+    scenes = [s for s in await get_chapter_scene_versions(db, chapter_id) if s[2].strip()]
+    result = await db.execute(
+        select(KGSceneExtraction.scene_id, KGSceneExtraction.version_id)
+        .where(KGSceneExtraction.chapter_id == chapter_id)
+    )
+    done = dict(result.all())
+    present = {scene_id for scene_id, _, _ in scenes}
+    removed = [scene_id for scene_id in done if scene_id not in present]
+    changed = [s for s in scenes if force or done.get(s[0]) != s[1]]
 
-    messages = [
-        {"role": "system", "content": _EXTRACTION_SYSTEM},
-        {"role": "user", "content": text},
-    ]
+    result = await db.execute(
+        select(KGProposal)
+        .where(KGProposal.chapter_id == chapter_id, KGProposal.project_id == project_id)
+        .order_by(KGProposal.id)
+    )
+    existing = list(result.scalars().all())
+    if not changed and not removed:
+        return [p for p in existing if not p.stale]
 
-    try:
-        response = await call_llm(
-            messages, response_format={"type": "json_object"}
+    results, extracted, hits, to_store = await _extract_windows(
+        db, scenes, {version_id for _, version_id, _ in changed}, force
+    )
+    scene_of = {version_id: scene_id for scene_id, version_id, _ in scenes}
+    refreshed = {scene_of[v] for v in extracted}
+    if stats is not None:
+        stats["failed"] = len(changed) - len(extracted)
+    # Sources outside the re-extracted scenes stay valid
+    kept = {v for scene_id, v in done.items() if scene_id in present and scene_id not in refreshed}
+
+    async with write_lock or contextlib.nullcontext():
+        await record_hits(db, hits)
+        for key, raw in to_store.items():
+            await store_output(db, key, CACHE_KIND, raw)
+        await _reconcile_proposals(db, project_id, chapter_id, results, kept, existing)
+        await _record_scene_versions(db, project_id, chapter_id, extracted, scene_of, removed)
+        await db.flush()
+        if write_lock is not None:
+            await db.commit()
+
+    # Load server defaults (created_at) of new rows along with the rest
+    result = await db.execute(
+        select(KGProposal)
+        .where(
+            KGProposal.chapter_id == chapter_id,
+            KGProposal.project_id == project_id,
+            KGProposal.stale.is_(False),
         )
-        raw_content = response.choices[0].message.content or ""
-    except Exception as exc:  # noqa: BLE001
-        logger.error("LLM call failed during KG extraction: %s", exc)
-        return []
+        .order_by(KGProposal.id)
+        .execution_options(populate_existing=True)
+    )
+    return list(result.scalars().all())
+
+
+async def _reconcile_proposals(
+    db: AsyncSession,
+    project_id: int,
+    chapter_id: int,
+    windows: list[list[tuple[dict, list[int]]]],
+    kept: set[int],
+    existing: list[KGProposal],
+) -> None:
+    """Match fresh items to the chapter's proposals; add, revive or stale them.
+
+    windows: per window, each item with the versions it came from.
+    kept: source versions that remain valid (scenes not re-extracted).
+    """
+    # Merge across windows, remembering which versions produced each fact
+    sources: dict[tuple, list[int]] = {}
+    for window in windows:
+        for item, versions in window:
+            found = sources.setdefault(_item_key(item), [])
+            found.extend(v for v in versions if v not in found)
+    items = merge_window_items([[item for item, _ in window] for window in windows])
+
+    live: dict[tuple, KGProposal] = {}
+    revivable: dict[tuple, KGProposal] = {}
+    for proposal in existing:
+        key = _proposal_key(proposal)
+        still = [v for v in _source_versions(proposal) if v in kept]
+        new = sources.get(key, []) if key not in live else []
+        if proposal.stale:
+            revivable.setdefault(key, proposal)
+            continue
+        proposal.source_versions_json = json.dumps(sorted(set(still + new)))
+        proposal.stale = not (still or new)
+        if not proposal.stale:
+            live.setdefault(key, proposal)
 
-    items = _safe_loads_list(raw_content)
     graph = SQLiteGraphAdapter(db)
-    proposals: list[KGProposal] = []
+    approved: list[tuple[KGProposal, dict]] = []
 
     for item in items:
-        confidence = float(item.get("confidence", 0.0))
+        key = _item_key(item)
+        if key in live:
+            continue
+        if key in revivable:
+            # The fact is back (e.g. an edit was undone): reuse its proposal
+            proposal = revivable.pop(key)
+            proposal.stale = False
+            proposal.source_versions_json = json.dumps(sorted(sources[key]))
+            live[key] = proposal
+            continue
+
+        confidence = _confidence(item)
         category = item.get("category", "entity")
         evidence = item.get("evidence", "")
 
@@ -182,17 +580,6 @@ async def extract_kg_from_chapter(
         else:
             status = "pending"
 
-        # Materialise high-confidence facts immediately
-        if status == "auto_approved":
-            try:
-                if category == "entity":
-                    await _approve_entity(graph, project_id, item)
-                elif category == "relation":
-                    await _approve_relation(graph, project_id, item)
-            except Exception as exc:  # noqa: BLE001
-                logger.error("Failed to materialise auto-approved fact: %s", exc)
-                status = "pending"  # degrade gracefully
-
         proposal = KGProposal(
             project_id=project_id,
             chapter_id=chapter_id,
@@ -202,13 +589,56 @@ async def extract_kg_from_chapter(
             status=status,
             evidence_text=evidence,
             evidence_location=f"chapter:{chapter_id}",
+            source_versions_json=json.dumps(sorted(sources[key])),
+            stale=False,
         )
         db.add(proposal)
-        proposals.append(proposal)
-
-    if proposals:
-        await db.flush()
-        for p in proposals:
-            await db.refresh(p)
-
-    return proposals
+        live[key] = proposal
+        if status == "auto_approved" and category in ("entity", "relation"):
+            approved.append((proposal, item))
+
+    # Materialise high-confidence facts immediately, in one batch
+    if approved:
+        try:
+            await materialise_items(graph, project_id, [i for _, i in approved])
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Failed to materialise auto-approved facts: %s", exc)
+            for p, _ in approved:
+                p.status = "pending"  # degrade gracefully
+
+
+async def _record_scene_versions(
+    db: AsyncSession,
+    project_id: int,
+    chapter_id: int,
+    extracted: set[int],
+    scene_of: dict[int, int],
+    removed: list[int],
+) -> None:
+    """Remember the versions just extracted; forget scenes that left the chapter."""
+    if extracted:
+        stmt = insert(KGSceneExtraction).values(
+            [
+                {
+                    "scene_id": scene_of[v],
+                    "project_id": project_id,
+                    "chapter_id": chapter_id,
+                    "version_id": v,
+                }
+                for v in extracted
+            ]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[KGSceneExtraction.scene_id],
+                set_={
+                    "chapter_id": stmt.excluded.chapter_id,
+                    "version_id": stmt.excluded.version_id,
+                    "extracted_at": func.now(),
+                },
+            )
+        )
+    if removed:
+        await db.execute(
+            delete(KGSceneExtraction).where(KGSceneExtraction.scene_id.in_(removed))
+        )
@@ -0,0 +1,152 @@
+"""KG fact index: rendered fact lines + entity-name → proposal terms.
+
+A proposal's context line and the entity names it mentions are derived
+from ``data_json`` once, when the proposal is flushed, so ranking facts for
+a scene never decodes JSON at request time. Terms are normalized like node
+names (``kg_names.normalize_name``), so they join ``KGNode.name_key``.
+Rows written before the index existed are filled in by
+``backfill_fact_index`` at startup.
+
+``match_fact_terms`` finds a project's terms in scene text with one
+Aho-Corasick pass over an automaton cached per project.
+"""
+
+import json
+
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import KGFactTerm, KGProposal
+from app.services.cache import LRUCache, write_generation
+from app.services.kg_names import normalize_name, normalize_text
+from app.services.trigger_matcher import AhoCorasick
+
+# project_id -> (stamp, AhoCorasick over the project's terms)
+fact_term_matcher_cache = LRUCache(maxsize=64)
+
+# Matched terms handed to SQL per request, longest first
+MAX_MATCHED_TERMS = 200
+
+
+def _safe_loads(raw: str, default=None):
+    """Safely parse JSON, return default on failure."""
+    if default is None:
+        default = {}
+    try:
+        return json.loads(raw) if raw else default
+    except (json.JSONDecodeError, TypeError):
+        return default
+
+
+def render_fact_line(category: str, data: dict) -> str:
+    """Context-pack line for one fact ("" for unrenderable categories)."""
+    if category == "entity":
+        name = data.get("name", "")
+        label = data.get("label", "")
+        props = data.get("properties", {}) or {}
+        prop_str = ", ".join(f"{k}={v}" for k, v in props.items())
+        line = f"- [{label}] {name}"
+        if prop_str:
+            line += f" ({prop_str})"
+        return line
+    if category == "relation":
+        src = data.get("source", "?")
+        tgt = data.get("target", "?")
+        rel = data.get("relation", "?")
+        return f"- {src} --{rel}--> {tgt}"
+    return ""
+
+
+def fact_terms(category: str, data: dict) -> set[str]:
+    """Normalized entity names a fact is about (see kg_names.normalize_name)."""
+    if category == "entity":
+        names = [data.get("name")]
+    elif category == "relation":
+        names = [data.get("source"), data.get("target")]
+    else:
+        names = []
+    return {normalize_name(n) for n in names if isinstance(n, str) and n.strip()}
+
+
+def _index_proposal(session: Session, proposal: KGProposal) -> None:
+    data = _safe_loads(proposal.data_json)
+    if not isinstance(data, dict):
+        data = {}
+    proposal.fact_line = render_fact_line(proposal.category, data)
+    for term in fact_terms(proposal.category, data):
+        session.add(
+            KGFactTerm(
+                project_id=proposal.project_id, proposal=proposal, term=term
+            )
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _index_on_flush(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, KGProposal):
+            _index_proposal(session, obj)
+    for obj in session.dirty:
+        if (
+            isinstance(obj, KGProposal)
+            and inspect(obj).attrs.data_json.history.has_changes()
+        ):
+            session.execute(
+                delete(KGFactTerm).where(KGFactTerm.proposal_id == obj.id)
+            )
+            _index_proposal(session, obj)
+
+
+async def backfill_fact_index(db: AsyncSession) -> int:
+    """Index proposals that predate the fact index; returns rows indexed.
+
+    Also re-keys terms stored under the older lower-case-only form.
+    """
+    result = await db.execute(
+        select(KGProposal).where(KGProposal.fact_line.is_(None))
+    )
+    proposals = result.scalars().all()
+    for p in proposals:
+        _index_proposal(db.sync_session, p)
+    terms = await db.execute(select(KGFactTerm.term).distinct())
+    for term in terms.scalars().all():
+        if normalize_name(term) != term:
+            await db.execute(
+                update(KGFactTerm)
+                .where(KGFactTerm.term == term)
+                .values(term=normalize_name(term))
+            )
+    if proposals:
+        await db.flush()
+    return len(proposals)
+
+
+async def match_fact_terms(
+    db: AsyncSession, project_id: int, texts: list[str], limit: int = MAX_MATCHED_TERMS
+) -> list[str]:
+    """The project's fact terms occurring in texts, longest first, at most limit.
+
+    Texts are normalized like the terms. The automaton is rebuilt only
+    when the project's terms change.
+    """
+    haystack = "\n".join(normalize_text(t) for t in texts if t)
+    if not haystack.strip():
+        return []
+    result = await db.execute(
+        select(func.count(KGFactTerm.id), func.max(KGFactTerm.id))
+        .where(KGFactTerm.project_id == project_id)
+    )
+    stamp = (*result.one(), *write_generation(project_id))
+    cached = fact_term_matcher_cache.get(project_id, valid=lambda v: v[0] == stamp)
+    if cached is None:
+        terms = await db.execute(
+            select(KGFactTerm.term)
+            .where(KGFactTerm.project_id == project_id)
+            .distinct()
+        )
+        cached = (stamp, AhoCorasick(terms.scalars().all()))
+        fact_term_matcher_cache.put(project_id, cached)
+    automaton = cached[1]
+    found = [automaton.patterns[i] for i in automaton.find(haystack)]
+    return sorted(found, key=lambda t: (-len(t), t))[:limit]
@@ -0,0 +1,379 @@
+"""Whole-book KG extraction jobs: persisted, resumable, observable.
+
+A job stores one row per chapter (kg_extraction_job_chapters). Chapters
+go through a bounded pool of workers (KG_JOB_CONCURRENCY), each on its
+own session, with ``extract_kg_from_chapter`` as the unit of work. A
+chapter's state is committed as soon as it finishes, so after a restart
+``resume_jobs`` only runs chapters not yet done. A chapter whose result
+was committed but whose state was not is simply run again: scene-level
+tracking makes that a no-op. A job with failed chapters ends as "partial"
+(some chapters done) or "failed"; ``retry_job`` re-queues just those.
+
+Writes of one project are serialised by a lock shared with every job of
+that project; only the LLM calls overlap. Progress events are published
+to in-process subscribers (``watch_job``), which the SSE endpoint relays.
+"""
+
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models import Book, Chapter, KGExtractionJob, KGExtractionJobChapter
+from app.services.kg_analytics import ensure_node_metrics
+from app.services.kg_extraction import extract_kg_from_chapter
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# job_id -> runner task (this process)
+_tasks: dict[int, asyncio.Task] = {}
+_subscribers: defaultdict[int, set[asyncio.Queue]] = defaultdict(set)
+# project_id -> (write lock, jobs using it)
+_write_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+async def create_book_job(
+    db: AsyncSession, book_id: int, force: bool = False
+) -> KGExtractionJob | None:
+    """Queue extraction of every chapter of a book; None if the book is missing.
+
+    A book with an unfinished job gets that job back instead of a second one.
+    """
+    book = await db.get(Book, book_id)
+    if not book:
+        return None
+    active = await db.execute(
+        select(KGExtractionJob)
+        .where(
+            KGExtractionJob.book_id == book_id,
+            KGExtractionJob.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(KGExtractionJob.id)
+        .limit(1)
+    )
+    job = active.scalar_one_or_none()
+    if job:
+        return job
+
+    job = KGExtractionJob(project_id=book.project_id, book_id=book_id, force=force)
+    db.add(job)
+    await db.flush()
+    result = await db.execute(
+        select(Chapter.id)
+        .where(Chapter.book_id == book_id)
+        .order_by(Chapter.sort_order, Chapter.id)
+    )
+    rows = [
+        {"job_id": job.id, "chapter_id": chapter_id, "position": position}
+        for position, chapter_id in enumerate(result.scalars().all())
+    ]
+    if rows:
+        await db.execute(insert(KGExtractionJobChapter), rows)
+    await db.refresh(job)
+    return job
+
+
+async def retry_job(db: AsyncSession, job_id: int) -> KGExtractionJob | None:
+    """Re-queue the failed chapters of a job; None if it does not exist.
+
+    An unfinished job is returned as is. Raises ValueError when a finished
+    job has no failed chapters.
+    """
+    job = await db.get(KGExtractionJob, job_id, populate_existing=True)
+    if not job or job.status in ACTIVE_STATUSES:
+        return job
+    result = await db.execute(
+        update(KGExtractionJobChapter)
+        .where(
+            KGExtractionJobChapter.job_id == job_id,
+            KGExtractionJobChapter.status == "failed",
+        )
+        .values(status="pending", error="", started_at=None, finished_at=None)
+    )
+    if not result.rowcount:
+        raise ValueError("Job has no failed chapters")
+    job.status = "queued"
+    job.finished_at = None
+    await db.flush()
+    return job
+
+
+def _final_status(done: int, failed: int) -> str:
+    if not failed:
+        return "done"
+    return "partial" if done else "failed"
+
+
+async def get_job_progress(db: AsyncSession, job_id: int) -> dict | None:
+    """Job state with per-status chapter counts; None if it does not exist."""
+    job = await db.get(KGExtractionJob, job_id, populate_existing=True)
+    if not job:
+        return None
+    result = await db.execute(
+        select(KGExtractionJobChapter.status, func.count(KGExtractionJobChapter.id))
+        .where(KGExtractionJobChapter.job_id == job_id)
+        .group_by(KGExtractionJobChapter.status)
+    )
+    counts = dict(result.all())
+    return {
+        "id": job.id,
+        "project_id": job.project_id,
+        "book_id": job.book_id,
+        "status": job.status,
+        "force": job.force,
+        "total": sum(counts.values()),
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def get_job_chapters(db: AsyncSession, job_id: int) -> list[KGExtractionJobChapter]:
+    result = await db.execute(
+        select(KGExtractionJobChapter)
+        .where(KGExtractionJobChapter.job_id == job_id)
+        .order_by(KGExtractionJobChapter.position)
+        # Rows change under other sessions (the runner's)
+        .execution_options(populate_existing=True)
+    )
+    return list(result.scalars().all())
+
+
+# ---------- Progress events ----------
+
+def _publish(job_id: int, event: dict) -> None:
+    for queue in _subscribers.get(job_id, ()):
+        queue.put_nowait(event)
+
+
+@contextmanager
+def _subscription(job_id: int) -> Iterator[asyncio.Queue]:
+    queue: asyncio.Queue = asyncio.Queue()
+    _subscribers[job_id].add(queue)
+    try:
+        yield queue
+    finally:
+        _subscribers[job_id].discard(queue)
+        if not _subscribers[job_id]:
+            del _subscribers[job_id]
+
+
+async def watch_job(
+    job_id: int, session_factory: async_sessionmaker
+) -> AsyncIterator[dict]:
+    """Current progress, then one event per finished chapter, until the job ends.
+
+    Ends right after the snapshot when the job is already finished or is
+    not running in this process.
+    """
+    with _subscription(job_id) as queue:
+        async with session_factory() as db:
+            progress = await get_job_progress(db, job_id)
+        if progress is None:
+            return
+        yield progress
+        if progress["status"] not in ACTIVE_STATUSES or job_id not in _tasks:
+            return
+        while True:
+            event = await queue.get()
+            yield event
+            if event["status"] not in ACTIVE_STATUSES:
+                return
+
+
+# ---------- Running ----------
+
+def start_job(job_id: int, session_factory: async_sessionmaker) -> asyncio.Task:
+    """Run a job in the background (once per process); returns its task."""
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return task
+    task = asyncio.create_task(run_job(job_id, session_factory))
+    _tasks[job_id] = task
+
+    def _forget(finished: asyncio.Task) -> None:
+        if _tasks.get(job_id) is finished:
+            del _tasks[job_id]
+        if not finished.cancelled() and finished.exception():
+            logger.error("KG job %d stopped: %s", job_id, finished.exception())
+
+    task.add_done_callback(_forget)
+    return task
+
+
+def job_task(job_id: int) -> asyncio.Task | None:
+    return _tasks.get(job_id)
+
+
+async def resume_jobs(session_factory: async_sessionmaker) -> list[int]:
+    """Restart every unfinished job (startup); returns their ids."""
+    async with session_factory() as db:
+        result = await db.execute(
+            select(KGExtractionJob.id)
+            .where(KGExtractionJob.status.in_(ACTIVE_STATUSES))
+            .order_by(KGExtractionJob.id)
+        )
+        job_ids = list(result.scalars().all())
+    for job_id in job_ids:
+        start_job(job_id, session_factory)
+    return job_ids
+
+
+async def stop_jobs() -> None:
+    """Cancel runner tasks (shutdown); their jobs resume on the next start."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _acquire_lock(project_id: int) -> asyncio.Lock:
+    lock, users = _write_locks.get(project_id, (None, 0))
+    lock = lock or asyncio.Lock()
+    _write_locks[project_id] = (lock, users + 1)
+    return lock
+
+
+def _release_lock(project_id: int) -> None:
+    lock, users = _write_locks[project_id]
+    if users > 1:
+        _write_locks[project_id] = (lock, users - 1)
+    else:
+        del _write_locks[project_id]
+
+
+async def run_job(
+    job_id: int,
+    session_factory: async_sessionmaker,
+    concurrency: int | None = None,
+) -> None:
+    """Extract every pending chapter of a job, then record how it ended."""
+    async with session_factory() as db:
+        job = await db.get(KGExtractionJob, job_id)
+        if not job or job.status not in ACTIVE_STATUSES:
+            return
+        # Chapters cut off by a crash or shutdown start over
+        await db.execute(
+            update(KGExtractionJobChapter)
+            .where(
+                KGExtractionJobChapter.job_id == job_id,
+                KGExtractionJobChapter.status == "running",
+            )
+            .values(status="pending")
+        )
+        result = await db.execute(
+            select(KGExtractionJobChapter.id, KGExtractionJobChapter.chapter_id)
+            .where(
+                KGExtractionJobChapter.job_id == job_id,
+                KGExtractionJobChapter.status == "pending",
+            )
+            .order_by(KGExtractionJobChapter.position)
+        )
+        pending = result.all()
+        job.status = "running"
+        job.started_at = job.started_at or _now()
+        project_id, force = job.project_id, job.force
+        await db.commit()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for row in pending:
+        queue.put_nowait(tuple(row))
+    lock = _acquire_lock(project_id)
+
+    async def worker() -> None:
+        while not queue.empty():
+            row_id, chapter_id = queue.get_nowait()
+            await _run_chapter(
+                job_id, row_id, chapter_id, project_id, force, lock, session_factory
+            )
+
+    try:
+        workers = max(1, concurrency or settings.KG_JOB_CONCURRENCY)
+        await asyncio.gather(*(worker() for _ in range(min(workers, len(pending)))))
+        async with session_factory() as db:
+            async with lock:
+                try:
+                    await ensure_node_metrics(db, project_id)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("KG job %d: node metrics failed: %s", job_id, exc)
+                    await db.rollback()
+                result = await db.execute(
+                    select(
+                        func.count().filter(KGExtractionJobChapter.status == "done"),
+                        func.count().filter(KGExtractionJobChapter.status == "failed"),
+                    ).where(KGExtractionJobChapter.job_id == job_id)
+                )
+                status = _final_status(*result.one())
+                await db.execute(
+                    update(KGExtractionJob)
+                    .where(KGExtractionJob.id == job_id)
+                    .values(status=status, finished_at=_now())
+                )
+                await db.commit()
+            progress = await get_job_progress(db, job_id)
+        _publish(job_id, progress)
+    finally:
+        _release_lock(project_id)
+
+
+async def _run_chapter(
+    job_id: int,
+    row_id: int,
+    chapter_id: int,
+    project_id: int,
+    force: bool,
+    lock: asyncio.Lock,
+    session_factory: async_sessionmaker,
+) -> None:
+    async with session_factory() as db:
+        async with lock:
+            await db.execute(
+                update(KGExtractionJobChapter)
+                .where(KGExtractionJobChapter.id == row_id)
+                .values(status="running", started_at=_now())
+            )
+            await db.commit()
+        values: dict = {"finished_at": _now()}
+        stats: dict = {}
+        try:
+            proposals = await extract_kg_from_chapter(
+                db, chapter_id, project_id, force=force, write_lock=lock,
+                stats=stats,
+            )
+            values.update(status="done", proposals=len(proposals), error="")
+            # Scenes whose LLM call failed keep their old results; retry them
+            if stats.get("failed"):
+                values.update(
+                    status="failed",
+                    error=f"{stats['failed']} scene(s) failed to extract",
+                )
+        except Exception as exc:  # noqa: BLE001
+            logger.error("KG job %d: chapter %d failed: %s", job_id, chapter_id, exc)
+            await db.rollback()
+            values.update(status="failed", error=str(exc)[:500])
+        async with lock:
+            await db.execute(
+                update(KGExtractionJobChapter)
+                .where(KGExtractionJobChapter.id == row_id)
+                .values(**values)
+            )
+            await db.commit()
+        progress = await get_job_progress(db, job_id)
+    progress["chapter"] = {"chapter_id": chapter_id, **values}
+    _publish(job_id, progress)
@@ -0,0 +1,178 @@
+"""KG node name resolution: normalized keys, aliases, in-memory lookup.
+
+Every node carries ``name_key`` (its name normalized: NFKC width folding,
+case folding, whitespace collapsed), and ``kg_node_aliases`` maps further
+normalized spellings to nodes. ``NameIndex`` holds both per project so
+extraction and approval resolve names with dict lookups; it follows
+appended rows incrementally and is rebuilt when the graph is rewritten
+or a session that wrote to the project rolls back.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import KGNode, KGNodeAlias
+from app.services.cache import LRUCache, on_discarded_writes
+from app.services.graph_snapshot import graph_generation
+
+# project_id -> (stamp, NameIndex)
+name_index_cache = LRUCache(maxsize=64)
+_alias_generations: defaultdict[int, int] = defaultdict(int)
+
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_CJK_GAP_RE = re.compile(rf"(?<=[{_CJK}])\s+(?=[{_CJK}])")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """normalize_name without the length cap, for text searched for keys."""
+    key = unicodedata.normalize("NFKC", text or "").casefold().strip()
+    key = _CJK_GAP_RE.sub("", key)
+    return _WS_RE.sub(" ", key)
+
+
+def normalize_name(name: str) -> str:
+    """Lookup key for a name: full/half width and case folded, spacing collapsed.
+
+    Whitespace between CJK characters is dropped ("林 远" == "林远"); other
+    runs collapse to one space.
+    """
+    return normalize_text(name)[:200]
+
+
+@event.listens_for(Session, "before_flush")
+def _key_on_flush(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, KGNode):
+            obj.name_key = normalize_name(obj.name)
+        elif isinstance(obj, KGNodeAlias) and not obj.alias_key:
+            obj.alias_key = normalize_name(obj.alias)
+    for obj in session.dirty:
+        if isinstance(obj, KGNode) and inspect(obj).attrs.name.history.has_changes():
+            obj.name_key = normalize_name(obj.name)
+
+
+class NameIndex:
+    """normalized name → node ids for one project."""
+
+    def __init__(self, nodes, aliases) -> None:
+        """nodes: (id, label, name, name_key); aliases: (id, node_id, alias_key)."""
+        # key -> [(node id, label)] in id order
+        self._names: defaultdict[str, list[tuple[int, str]]] = defaultdict(list)
+        self._aliases: dict[str, int] = {}
+        self._labels: dict[int, str] = {}
+        self.names: dict[int, str] = {}
+        self.max_node_id = 0
+        self.max_alias_id = 0
+        self.extend(nodes, aliases)
+
+    def extend(self, nodes, aliases) -> None:
+        for node_id, label, name, key in nodes:
+            self._names[key].append((node_id, label))
+            self._labels[node_id] = label
+            self.names[node_id] = name
+            self.max_node_id = max(self.max_node_id, node_id)
+        for alias_id, node_id, key in aliases:
+            self._aliases[key] = node_id
+            self.max_alias_id = max(self.max_alias_id, alias_id)
+
+    def resolve(self, name: str, label: str | None = None) -> int | None:
+        """Node id for a name, or None.
+
+        A node's own name beats an alias; among several nodes the oldest
+        wins. With a label, only nodes of that label match.
+        """
+        key = normalize_name(name)
+        for node_id, node_label in self._names.get(key, ()):
+            if label is None or node_label == label:
+                return node_id
+        node_id = self._aliases.get(key)
+        if node_id is not None and (label is None or self._labels.get(node_id) == label):
+            return node_id
+        return None
+
+
+async def _index_stamp(db: AsyncSession, project_id: int) -> tuple:
+    nodes = (
+        await db.execute(
+            select(func.count(KGNode.id), func.coalesce(func.max(KGNode.id), 0))
+            .where(KGNode.project_id == project_id)
+        )
+    ).one()
+    aliases = (
+        await db.execute(
+            select(func.count(KGNodeAlias.id), func.coalesce(func.max(KGNodeAlias.id), 0))
+            .where(KGNodeAlias.project_id == project_id)
+        )
+    ).one()
+    return (
+        *nodes, *aliases, (graph_generation(project_id), _alias_generations[project_id])
+    )
+
+
+async def _load_rows(db: AsyncSession, project_id: int, node_after: int = 0, alias_after: int = 0):
+    nodes = await db.execute(
+        select(KGNode.id, KGNode.label, KGNode.name, KGNode.name_key)
+        .where(KGNode.project_id == project_id, KGNode.id > node_after)
+        .order_by(KGNode.id)
+    )
+    aliases = await db.execute(
+        select(KGNodeAlias.id, KGNodeAlias.node_id, KGNodeAlias.alias_key)
+        .where(KGNodeAlias.project_id == project_id, KGNodeAlias.id > alias_after)
+        .order_by(KGNodeAlias.id)
+    )
+    return nodes.all(), aliases.all()
+
+
+async def get_name_index(db: AsyncSession, project_id: int) -> NameIndex:
+    """Current name index for a project; appended rows are applied in place."""
+    stamp = await _index_stamp(db, project_id)
+    cached = name_index_cache.get(project_id)
+    if cached is not None:
+        old_stamp, index = cached
+        if old_stamp == stamp:
+            return index
+        old_nodes, old_max_node, old_aliases, old_max_alias, old_gen = old_stamp
+        if old_gen == stamp[4] and stamp[0] >= old_nodes and stamp[2] >= old_aliases:
+            nodes, aliases = await _load_rows(db, project_id, old_max_node, old_max_alias)
+            if (
+                len(nodes) == stamp[0] - old_nodes
+                and len(aliases) == stamp[2] - old_aliases
+            ):
+                index.extend(nodes, aliases)
+                name_index_cache.put(project_id, (stamp, index))
+                return index
+
+    index = NameIndex(*await _load_rows(db, project_id))
+    name_index_cache.put(project_id, (stamp, index))
+    return index
+
+
+def mark_aliases_changed(project_id: int) -> None:
+    """Force a rebuild after aliases are re-pointed in place."""
+    _alias_generations[project_id] += 1
+
+
+@on_discarded_writes
+def _forget_rolled_back(project_id: int | None) -> None:
+    # An index may hold names that were never committed
+    if project_id is None:
+        name_index_cache.discard(lambda key: True)
+    else:
+        mark_aliases_changed(project_id)
+
+
+async def backfill_name_keys(db: AsyncSession) -> int:
+    """Fill name_key for nodes that predate it; returns rows updated."""
+    result = await db.execute(select(KGNode).where(KGNode.name_key.is_(None)))
+    nodes = result.scalars().all()
+    for node in nodes:
+        node.name_key = normalize_name(node.name)
+    if nodes:
+        await db.flush()
+    return len(nodes)
@@ -0,0 +1,115 @@
+"""Content-hash cache for LLM results (KG extraction, chapter summaries).
+
+A result is keyed by sha256 over the task kind, the model and the exact
+messages sent, so unchanged chapter text re-run with the same prompt and
+model is served from ``llm_result_cache`` instead of a new LLM call.
+Editing the text, the system prompt or switching models changes the key.
+Only raw LLM output is stored; callers parse it as they would a live
+response. Per-row hit/miss counters back the stats endpoint; lookups
+are read only, so callers can count hits after their LLM calls and keep
+write transactions short.
+"""
+
+import hashlib
+import json
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import LLMResultCache
+
+
+def llm_cache_key(kind: str, messages: list[dict], model: str | None = None) -> str:
+    """Hash of everything that determines an LLM result."""
+    payload = json.dumps(
+        [kind, model or settings.LLM_MODEL, messages],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_outputs(db: AsyncSession, keys: list[str]) -> dict[str, str]:
+    """Cached raw outputs for the given keys (read only; see record_hits)."""
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(LLMResultCache.key, LLMResultCache.raw_output)
+        .where(LLMResultCache.key.in_(set(keys)))
+    )
+    return dict(result.all())
+
+
+async def record_hits(db: AsyncSession, keys: list[str]) -> None:
+    """Count one hit for each cached key that was used."""
+    if keys:
+        await db.execute(
+            update(LLMResultCache)
+            .where(LLMResultCache.key.in_(set(keys)))
+            .values(hits=LLMResultCache.hits + 1, updated_at=func.now())
+        )
+
+
+async def store_output(
+    db: AsyncSession, key: str, kind: str, raw: str, model: str | None = None
+) -> None:
+    """Save a fresh LLM output under its key, counting a miss."""
+    stmt = insert(LLMResultCache).values(
+        key=key,
+        kind=kind,
+        model=model or settings.LLM_MODEL,
+        raw_output=raw,
+        hits=0,
+        misses=1,
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[LLMResultCache.key],
+            set_={
+                "raw_output": stmt.excluded.raw_output,
+                "model": stmt.excluded.model,
+                "misses": LLMResultCache.misses + 1,
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+def _rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+async def cache_stats(db: AsyncSession) -> dict:
+    """Entry count, hits, misses and hit rate per kind and overall."""
+    result = await db.execute(
+        select(
+            LLMResultCache.kind,
+            func.count(LLMResultCache.id),
+            func.coalesce(func.sum(LLMResultCache.hits), 0),
+            func.coalesce(func.sum(LLMResultCache.misses), 0),
+        )
+        .group_by(LLMResultCache.kind)
+        .order_by(LLMResultCache.kind)
+    )
+    kinds = [
+        {
+            "kind": kind,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": _rate(hits, misses),
+        }
+        for kind, entries, hits, misses in result.all()
+    ]
+    hits = sum(k["hits"] for k in kinds)
+    misses = sum(k["misses"] for k in kinds)
+    return {
+        "entries": sum(k["entries"] for k in kinds),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": _rate(hits, misses),
+        "kinds": kinds,
+    }
@@ -0,0 +1,298 @@
+"""Streaming SillyTavern lorebook import/export.
+
+Import reads the upload incrementally: only one entry (plus the unread
+tail of the current network chunk) is decoded at a time, and entries are
+written in executemany batches. Export streams the JSON document out one
+batch of rows at a time. Memory stays flat in the lorebook size.
+"""
+
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import LoreEntry
+from app.services.lorebook import mark_lore_changed
+
+IMPORT_BATCH_SIZE = 500
+
+_WS = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _JSONReader:
+    """Pull-style reader over an async byte stream holding one JSON text."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks.__aiter__()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    async def _more(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+            text = self._utf8.decode(chunk)
+        except StopAsyncIteration:
+            self._eof = True
+            text = self._utf8.decode(b"", final=True)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return True
+
+    async def peek(self) -> str:
+        """Next non-whitespace character ("" at end of input)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WS:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not await self._more():
+                return ""
+
+    async def expect(self, char: str) -> None:
+        found = await self.peek()
+        if found != char:
+            raise ValueError(
+                f"expected {char!r}, got {found or 'end of input'!r}"
+            )
+        self._pos += 1
+
+    async def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not await self._more():
+                    raise
+                continue
+            # A number at the very end of the buffer may be cut short
+            if end == len(self._buf) and not self._eof:
+                await self._more()
+                continue
+            self._pos = end
+            return value
+
+
+async def _members(reader: _JSONReader) -> AsyncIterator[str | None]:
+    """Step through an object's keys (or an array's slots, as None).
+
+    The caller must consume each member's value from the reader before
+    asking for the next one.
+    """
+    opener = await reader.peek()
+    if not opener or opener not in "{[":
+        raise ValueError("expected an object or array")
+    closer = "}" if opener == "{" else "]"
+    await reader.expect(opener)
+    if await reader.peek() == closer:
+        await reader.expect(closer)
+        return
+    while True:
+        key = None
+        if closer == "}":
+            key = await reader.value()
+            if not isinstance(key, str):
+                raise ValueError("object keys must be strings")
+            await reader.expect(":")
+        yield key
+        if await reader.peek() == ",":
+            await reader.expect(",")
+            continue
+        await reader.expect(closer)
+        return
+
+
+def _is_st_entry(value: Any) -> bool:
+    return isinstance(value, dict) and any(
+        k in value for k in ("key", "content", "comment")
+    )
+
+
+async def iter_lorebook_upload(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[tuple[str, str, Any]]:
+    """Parse a lorebook upload incrementally.
+
+    Yields ("meta", key, value) for top-level fields other than "entries"
+    and ("entry", key, item) for each entry object, in document order.
+    "entries" may be an object (SillyTavern) or an array. A bare entries
+    map or array at the root is read as entries too. Raises ValueError
+    on malformed JSON.
+    """
+    reader = _JSONReader(chunks)
+    async for key in _members(reader):
+        if key == "entries" and await reader.peek() in ("{", "["):
+            async for entry_key in _members(reader):
+                item = await reader.value()
+                if isinstance(item, dict):
+                    yield "entry", entry_key or "", item
+            continue
+        value = await reader.value()
+        if _is_st_entry(value):
+            yield "entry", key or "", value
+        else:
+            yield "meta", key or "", value
+    if await reader.peek():
+        raise ValueError("unexpected data after the JSON document")
+
+
+def _st_item_to_row(project_id: int, item: dict) -> dict:
+    """Map a SillyTavern entry to LoreEntry column values."""
+    return {
+        "project_id": project_id,
+        "type": "Concept",
+        "title": str(item.get("comment") or "Untitled"),
+        "aliases_json": "[]",
+        "content_md": item.get("content", ""),
+        "secrets_md": "",
+        "triggers_json": json.dumps(
+            {
+                "keywords": item.get("key", []) or [],
+                "and_keywords": item.get("keysecondary", []) or [],
+            },
+            ensure_ascii=False,
+        ),
+        "priority": item.get("order", 5),
+        "locked": bool(item.get("constant", False)),
+    }
+
+
+class LoreImporter:
+    """Batched insert (or upsert-by-title) of imported lore entries.
+
+    Entries without a title (empty SillyTavern ``comment``) get a
+    placeholder title and are always inserted, never matched.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        project_id: int,
+        upsert: bool = False,
+        batch_size: int | None = None,
+    ) -> None:
+        self._db = db
+        self.project_id = project_id
+        self.upsert = upsert
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self.created_ids: list[int] = []
+        self.updated_ids: list[int] = []
+        # (row, has a real title to match on)
+        self._pending: list[tuple[dict, bool]] = []
+        self._title_ids: dict[str, int] | None = None
+
+    async def add(self, item: dict) -> None:
+        row = _st_item_to_row(self.project_id, item)
+        self._pending.append((row, bool(item.get("comment"))))
+        if len(self._pending) >= self.batch_size:
+            await self._write_batch()
+
+    async def finish(self) -> None:
+        if self._pending:
+            await self._write_batch()
+        if self.created_ids or self.updated_ids:
+            mark_lore_changed(self.project_id)
+
+    async def _write_batch(self) -> None:
+        pending, self._pending = self._pending, []
+        inserts = [row for row, _ in pending]
+        titled = [matchable for _, matchable in pending]
+        updates: dict[int, dict] = {}
+        if self.upsert:
+            if self._title_ids is None:
+                result = await self._db.execute(
+                    select(LoreEntry.title, LoreEntry.id)
+                    .where(LoreEntry.project_id == self.project_id)
+                    .order_by(LoreEntry.id)
+                )
+                self._title_ids = dict(result.all())
+            # Last occurrence of a title wins, within and across batches
+            by_title: dict[str, dict] = {}
+            untitled: list[dict] = []
+            for row, matchable in pending:
+                entry_id = self._title_ids.get(row["title"]) if matchable else None
+                if not matchable:
+                    untitled.append(row)
+                elif entry_id is None:
+                    by_title[row["title"]] = row
+                else:
+                    updates[entry_id] = row
+            inserts = [*by_title.values(), *untitled]
+            titled = [True] * len(by_title) + [False] * len(untitled)
+
+        if inserts:
+            result = await self._db.execute(
+                insert(LoreEntry).returning(LoreEntry.id), inserts
+            )
+            # Batched RETURNING rows are unordered; ids still follow input
+            ids = sorted(result.scalars().all())
+            self.created_ids.extend(ids)
+            if self._title_ids is not None:
+                for entry_id, row, matchable in zip(ids, inserts, titled):
+                    if matchable:
+                        self._title_ids[row["title"]] = entry_id
+        if updates:
+            await self._db.execute(
+                update(LoreEntry),
+                [{"id": entry_id, **row} for entry_id, row in updates.items()],
+            )
+            self.updated_ids.extend(updates)
+
+
+async def iter_lorebook_export(
+    db: AsyncSession,
+    project_id: int,
+    name: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """SillyTavern-compatible lorebook JSON, one row batch per chunk."""
+    yield '{"entries": {'
+    result = await db.stream(
+        select(
+            LoreEntry.id,
+            LoreEntry.title,
+            LoreEntry.content_md,
+            LoreEntry.triggers_json,
+            LoreEntry.priority,
+            LoreEntry.locked,
+        )
+        .where(LoreEntry.project_id == project_id)
+        .order_by(LoreEntry.priority.desc(), LoreEntry.id)
+        .execution_options(yield_per=batch_size)
+    )
+    idx = 0
+    async for rows in result.partitions():
+        parts = []
+        for entry_id, title, content, triggers_json, priority, locked in rows:
+            try:
+                triggers = json.loads(triggers_json) if triggers_json else {}
+            except (json.JSONDecodeError, TypeError):
+                triggers = {}
+            if not isinstance(triggers, dict):
+                triggers = {}
+            entry = {
+                "uid": entry_id,
+                "key": triggers.get("keywords", []),
+                "keysecondary": triggers.get("and_keywords", []),
+                "comment": title,
+                "content": content,
+                "order": priority,
+                "constant": locked,
+                "enabled": True,
+            }
+            parts.append(
+                f'{"," if idx else ""}"{idx}": '
+                + json.dumps(entry, ensure_ascii=False)
+            )
+            idx += 1
+        yield "".join(parts)
+    original = {"name": f"Lorebook - {name}", "description": ""}
+    yield '}, "originalData": ' + json.dumps(original, ensure_ascii=False) + "}"
@@ -1,12 +1,23 @@
 """Lorebook service: trigger matching and context injection."""
 
+import hashlib
 import json
 
-from sqlalchemy import select
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from app.models import LoreEntry, Scene, SceneTextVersion
-from app.services.text_utils import truncate_to_sentence
+from app.core.config import settings
+from app.models import LoreEntry, Scene, SceneLoreActivation, SceneTextVersion
+from app.services.cache import LRUCache, bump_generation, write_generation
+from app.services.hierarchy import resolve_scene_ancestry
+from app.services.scene_text import get_latest_scene_texts, is_latest_version
+from app.services.text_utils import CHARS, BudgetMeter
+from app.services.trigger_matcher import TriggerMatcher
+
+# project_id -> (stamp, TriggerMatcher)
+trigger_matcher_cache = LRUCache(maxsize=64)
 
 
 def _safe_loads(raw: str, default=None):
@@ -59,44 +70,323 @@ def _word_in_text(word: str, text: str) -> bool:
     return word in text
 
 
-async def get_scan_window(
-    db: AsyncSession, scene_id: int, depth: int = 2
-) -> str:
-    """Get text from current scene + previous scenes for trigger scanning.
+async def get_trigger_matcher(
+    db: AsyncSession, project_id: int
+) -> TriggerMatcher:
+    """Compiled matcher for a project, rebuilt only when its lore changes.
+
+    The stamp carries the project's write generation, which also covers
+    same-second edits and writes rolled back after the matcher was built.
+    """
+    result = await db.execute(
+        select(func.max(LoreEntry.updated_at), func.count(LoreEntry.id))
+        .where(LoreEntry.project_id == project_id)
+    )
+    stamp = (*result.one(), *write_generation(project_id))
+    cached = trigger_matcher_cache.get(project_id, valid=lambda v: v[0] == stamp)
+    if cached is not None:
+        return cached[1]
+
+    result = await db.execute(
+        select(
+            LoreEntry.id,
+            LoreEntry.title,
+            LoreEntry.aliases_json,
+            LoreEntry.triggers_json,
+            LoreEntry.locked,
+        )
+        .where(LoreEntry.project_id == project_id)
+        .order_by(LoreEntry.id)
+    )
+    matcher = TriggerMatcher(result.all())
+    trigger_matcher_cache.put(project_id, (stamp, matcher))
+    return matcher
+
+
+def mark_lore_changed(project_id: int) -> None:
+    """Invalidate caches after lore writes that bypass the ORM flush."""
+    bump_generation(project_id)
+
+
+def _draft_hash(text: str | None) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def _lore_stamp(updated_at, count: int) -> str:
+    return f"{updated_at}|{count}"
+
+
+def _lore_stamp_columns(project_id: int) -> tuple:
+    where = LoreEntry.project_id == project_id
+    return (
+        select(func.max(LoreEntry.updated_at)).where(where).scalar_subquery(),
+        select(func.count(LoreEntry.id)).where(where).scalar_subquery(),
+    )
+
+
+async def remember_activation(
+    db: AsyncSession, project_id: int, scene_id: int, text: str, entry_ids: list[int]
+) -> None:
+    """Record the lore entries a streamed draft of a scene triggered.
 
-    Collects the latest version text from the current scene and
-    up to (depth-1) preceding scenes in the same chapter.
+    Stored against a hash of the draft and the project's lore stamp. Once
+    the draft is saved unchanged as the scene's latest version,
+    inject_lorebook reuses the set instead of rescanning that scene's
+    text; saving other text drops it. Saving the version already moves
+    the context-pack stamp, so nothing is invalidated here.
     """
-    scene = await db.get(Scene, scene_id)
+    updated_at, count = (await db.execute(select(*_lore_stamp_columns(project_id)))).one()
+    stmt = insert(SceneLoreActivation).values(
+        scene_id=scene_id,
+        project_id=project_id,
+        text_hash=_draft_hash(text),
+        lore_stamp=_lore_stamp(updated_at, count),
+        entry_ids_json=json.dumps(sorted(set(entry_ids))),
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SceneLoreActivation.scene_id],
+            set_={
+                "project_id": stmt.excluded.project_id,
+                "text_hash": stmt.excluded.text_hash,
+                "lore_stamp": stmt.excluded.lore_stamp,
+                "entry_ids_json": stmt.excluded.entry_ids_json,
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+async def recall_activation(
+    db: AsyncSession, project_id: int, scene_id: int
+) -> frozenset[int] | None:
+    """Entries the scene's saved draft triggered, or None.
+
+    None when there is no record, the latest version is not the drafted
+    text, or the project's lore changed since (one query).
+    """
+    result = await db.execute(
+        select(
+            SceneLoreActivation.text_hash,
+            SceneLoreActivation.lore_stamp,
+            SceneLoreActivation.entry_ids_json,
+            SceneTextVersion.content_md,
+            *_lore_stamp_columns(project_id),
+        )
+        .join(
+            SceneTextVersion,
+            SceneTextVersion.scene_id == SceneLoreActivation.scene_id,
+        )
+        .where(SceneLoreActivation.scene_id == scene_id, is_latest_version())
+    )
+    row = result.first()
+    if (
+        row is None
+        or row.text_hash != _draft_hash(row.content_md)
+        or row.lore_stamp != _lore_stamp(*row[4:])
+    ):
+        return None
+    return frozenset(_safe_loads(row.entry_ids_json, []))
+
+
+@event.listens_for(Session, "before_flush")
+def _drop_stale_activation(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, SceneTextVersion) and isinstance(obj.scene_id, int):
+            session.execute(
+                delete(SceneLoreActivation).where(
+                    SceneLoreActivation.scene_id == obj.scene_id,
+                    SceneLoreActivation.text_hash != _draft_hash(obj.content_md),
+                )
+            )
+
+
+async def get_scan_texts(
+    db: AsyncSession, scene_id: int, depth: int | None = None
+) -> list[tuple[int, str]]:
+    """(scene_id, latest text) for the scan window, in scene order.
+
+    The current scene and up to (depth-1) preceding scenes in the same
+    chapter (default depth: LORE_SCAN_DEPTH); scenes without text are
+    left out. Two queries regardless of depth.
+    """
+    if depth is None:
+        depth = settings.LORE_SCAN_DEPTH
+    scene = await resolve_scene_ancestry(db, scene_id)
     if not scene:
-        return ""
+        return []
 
     # Get scenes in the same chapter, ordered by sort_order
     result = await db.execute(
-        select(Scene)
+        select(Scene.id)
         .where(
             Scene.chapter_id == scene.chapter_id,
-            Scene.sort_order <= scene.sort_order,
+            Scene.sort_order <= scene.scene_sort,
         )
         .order_by(Scene.sort_order.desc())
         .limit(depth)
     )
-    scenes = result.scalars().all()
-
-    texts = []
-    for s in reversed(scenes):
-        ver_result = await db.execute(
-            select(SceneTextVersion)
-            .where(SceneTextVersion.scene_id == s.id)
-            .order_by(SceneTextVersion.version.desc())
-            .limit(1)
-        )
-        version = ver_result.scalar_one_or_none()
-        if version and version.content_md:
-            texts.append(version.content_md)
+    scene_ids = result.scalars().all()
+    latest = await get_latest_scene_texts(db, scene_ids)
+    return [(sid, latest[sid]) for sid in reversed(scene_ids) if latest.get(sid)]
+
+
+async def get_scan_window(
+    db: AsyncSession, scene_id: int, depth: int | None = None
+) -> str:
+    """Get text from current scene + previous scenes for trigger scanning.
+
+    See get_scan_texts for the window.
+    """
+    texts = await get_scan_texts(db, scene_id, depth)
+    return "\n\n".join(text for _, text in texts)
+
+
+def _excluded(entry: LoreEntry, reason: str) -> dict:
+    return {"id": entry.id, "title": entry.title, "reason": reason}
+
+
+def _select_priority(
+    entries: list[LoreEntry], blocks: list[str], budget: int, meter: BudgetMeter
+) -> tuple[list[str], list[dict]]:
+    """Fill in priority order; the first misfit is trimmed, the rest cut."""
+    parts = []
+    excluded = []
+    total_len = 0
+    sep_cost = meter.measure("\n\n")
+    for idx, block in enumerate(blocks):
+        block_len = meter.measure(block)
+        if total_len + block_len > budget:
+            remaining = budget - total_len
+            if remaining > 50:
+                parts.append(meter.truncate(block, remaining))
+                excluded.append(_excluded(entries[idx], "truncated"))
+                idx += 1
+            excluded.extend(
+                _excluded(e, "after_budget_exhausted") for e in entries[idx:]
+            )
+            break
+        parts.append(block)
+        total_len += block_len + sep_cost  # separator newlines
+    return parts, excluded
+
+
+def _select_knapsack(
+    entries: list[LoreEntry], blocks: list[str], budget: int, meter: BudgetMeter
+) -> tuple[list[str], list[dict]]:
+    """Maximize summed priority of whole entries within budget.
+
+    Locked entries are forced in first (priority order; a locked entry
+    that no longer fits is trimmed, as in priority mode). The remaining
+    capacity is filled greedily by priority per unit of cost, skipping
+    misfits instead of stopping, then repaired: if the single best
+    fitting entry is worth more than the greedy set, the set is rebuilt
+    around it (the classic 1/2-approximation guarantee). O(n log n) in candidates.
+    Output keeps priority order.
+    """
+    sep_cost = meter.measure("\n\n")
+    costs = [meter.measure(b) + sep_cost for b in blocks]
+    chosen: dict[int, str] = {}
+    reasons: dict[int, str] = {}
+    remaining = budget
+
+    for idx, entry in enumerate(entries):
+        if not entry.locked:
+            continue
+        if costs[idx] - sep_cost <= remaining:
+            chosen[idx] = blocks[idx]
+            remaining -= costs[idx]
+        elif remaining > 50:
+            chosen[idx] = meter.truncate(blocks[idx], remaining)
+            reasons[idx] = "truncated"
+            remaining = 0
+        else:
+            reasons[idx] = "locked_over_budget"
+
+    optional = [i for i, e in enumerate(entries) if not e.locked]
+    # Value = priority (>= 1 so zero-priority entries still count)
+    value = {i: max(entries[i].priority or 0, 0) + 1 for i in optional}
+    order = sorted(
+        optional,
+        key=lambda i: (-value[i] / max(costs[i], 1), -value[i], entries[i].id),
+    )
+
+    def _fill(picked: list[int]) -> list[int]:
+        room = remaining - sum(costs[i] for i in picked)
+        for i in order:
+            if i not in picked and costs[i] - sep_cost <= room:
+                picked.append(i)
+                room -= costs[i]
+        return picked
+
+    greedy = _fill([])
+    best_single = max(
+        (i for i in optional if costs[i] - sep_cost <= remaining),
+        key=lambda i: (value[i], -costs[i], -entries[i].id),
+        default=None,
+    )
+    if best_single is not None and value[best_single] > sum(
+        value[i] for i in greedy
+    ):
+        repaired = _fill([best_single])
+        for i in set(greedy) - set(repaired):
+            reasons[i] = "displaced"
+        greedy = repaired
+
+    for i in greedy:
+        chosen[i] = blocks[i]
+        reasons.pop(i, None)
+    for i in optional:
+        if i not in chosen and i not in reasons:
+            reasons[i] = "over_budget"
+
+    parts = [chosen[i] for i in sorted(chosen)]
+    excluded = [_excluded(entries[i], reasons[i]) for i in sorted(reasons)]
+    return parts, excluded
+
+
+async def _load_entries(db: AsyncSession, ids) -> list[LoreEntry]:
+    result = await db.execute(
+        select(LoreEntry)
+        .where(LoreEntry.id.in_(ids))
+        .order_by(LoreEntry.priority.desc(), LoreEntry.id)
+    )
+    return list(result.scalars().all())
 
-    return "\n\n".join(texts)
 
+async def _activate_recursively(
+    db: AsyncSession,
+    matcher: TriggerMatcher,
+    selected: list[LoreEntry],
+    max_depth: int,
+    budget: int,
+    meter: BudgetMeter,
+) -> list[LoreEntry]:
+    """Follow triggers through entry content up to a fixpoint.
+
+    Each round feeds only the content added by the previous round into
+    one streaming match, so every injected character is scanned once and
+    AND keywords may be satisfied across rounds. Stops at the fixpoint,
+    after max_depth rounds, or once the collected content already fills
+    the lore budget (further entries could not be injected anyway).
+    """
+    watch = matcher.stream(already=[e.id for e in selected])
+    size = sum(meter.measure(e.content_md or "") for e in selected)
+    frontier = selected
+    added: list[LoreEntry] = []
+    for _ in range(max_depth):
+        if size >= budget:
+            break
+        new_ids = []
+        for entry in frontier:
+            new_ids += watch.feed(entry.content_md or "")
+            new_ids += watch.feed("\n\n")  # entries are separate texts
+        if not new_ids:
+            break
+        frontier = await _load_entries(db, new_ids)
+        added += frontier
+        size += sum(meter.measure(e.content_md or "") for e in frontier)
+    return added
 
 
 async def inject_lorebook(
@@ -104,48 +394,82 @@ async def inject_lorebook(
     project_id: int,
     scene_id: int,
     budget_chars: int = 4000,
+    meter: BudgetMeter = CHARS,
+    stats: dict | None = None,
+    scan_text: str | None = None,
+    selection: str | None = None,
+    recursion_depth: int | None = None,
+    scan_texts: list[tuple[int, str]] | None = None,
 ) -> str:
     """Main injection function: assemble lorebook context for LLM prompt.
 
     1. Get scan window text
-    2. Find all locked entries + triggered entries
+    2. Find all locked entries + triggered entries (compiled matcher;
+       only those rows are loaded); when the scene's latest text is a
+       saved streamed draft (remember_activation), its recorded entries
+       are used and only the other scenes are scanned; optionally,
+       entries triggered by the content of selected entries
+       (recursion_depth, default LORE_RECURSION_DEPTH; 0 disables)
     3. Sort by priority DESC
-    4. Truncate to budget (trim to sentence boundary)
+    4. Fit to budget: "priority" (default LORE_SELECTION_MODE) fills in
+       priority order and stops at the first misfit (trimmed to a sentence
+       boundary); "knapsack" maximizes total priority within the budget
     5. Return assembled text
+
+    budget_chars is in the meter's unit (chars unless a token meter is passed).
+    stats, when given, receives the full block of every selected entry,
+    the entries left out ("excluded": id, title, reason) and the ids of
+    every entry in play ("active").
+    scan_text, when given, is used instead of re-reading the scan window
+    (and is scanned whole); scan_texts is the window as get_scan_texts
+    returns it.
     """
-    scan_text = await get_scan_window(db, scene_id)
+    recalled = await recall_activation(db, project_id, scene_id)
+    if scan_text is None:
+        if scan_texts is None:
+            scan_texts = await get_scan_texts(db, scene_id)
+        scan_text = "\n\n".join(
+            text for sid, text in scan_texts
+            if recalled is None or sid != scene_id
+        )
 
-    # Fetch all lore entries for this project
-    result = await db.execute(
-        select(LoreEntry)
-        .where(LoreEntry.project_id == project_id)
-        .order_by(LoreEntry.priority.desc(), LoreEntry.id)
+    # Select: locked entries always included, others by trigger match
+    matcher = await get_trigger_matcher(db, project_id)
+    selected_ids = set(matcher.locked).union(
+        matcher.match(scan_text), recalled or ()
     )
-    all_entries = result.scalars().all()
+    if stats is not None:
+        stats["active"] = sorted(selected_ids)
+    if not selected_ids:
+        return ""
 
-    # Select: locked entries always included, others by trigger match
-    selected = []
-    for entry in all_entries:
-        if entry.locked or match_triggers(entry, scan_text):
-            selected.append(entry)
+    selected = await _load_entries(db, selected_ids)
 
-    if not selected:
-        return ""
+    if recursion_depth is None:
+        recursion_depth = settings.LORE_RECURSION_DEPTH
+    if recursion_depth > 0:
+        added = await _activate_recursively(
+            db, matcher, selected, recursion_depth, budget_chars, meter
+        )
+        if stats is not None:
+            stats["recursive"] = [e.id for e in added]
+            stats["active"] = sorted(selected_ids.union(stats["recursive"]))
+        if added:
+            selected = sorted(
+                [*selected, *added], key=lambda e: (-e.priority, e.id)
+            )
 
-    # Already sorted by priority DESC from query
+    # Sorted by priority DESC
     # Assemble text blocks
-    parts = []
-    total_len = 0
-    for entry in selected:
-        block = f"## {entry.title} ({entry.type})\n{entry.content_md}"
-        if total_len + len(block) > budget_chars:
-            remaining = budget_chars - total_len
-            if remaining > 50:
-                block = truncate_to_sentence(block, remaining)
-                parts.append(block)
-            break
-        parts.append(block)
-        total_len += len(block) + 2  # +2 for separator newlines
+    blocks = [f"## {e.title} ({e.type})\n{e.content_md}" for e in selected]
+    if stats is not None:
+        stats["items"] = blocks
+    if (selection or settings.LORE_SELECTION_MODE) == "knapsack":
+        parts, excluded = _select_knapsack(selected, blocks, budget_chars, meter)
+    else:
+        parts, excluded = _select_priority(selected, blocks, budget_chars, meter)
+    if stats is not None:
+        stats["excluded"] = excluded
 
     if not parts:
         return ""
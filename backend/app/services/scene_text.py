@@ -0,0 +1,79 @@
+"""Latest scene text lookups, batched.
+
+Every reader of "the current text of these scenes" goes through here so
+that N scenes cost one query, not N. The latest version is picked with a
+correlated MAX(version) per scene, which the (scene_id, version) index
+answers with a single seek.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models import Scene, SceneTextVersion
+
+
+def is_latest_version():
+    """Filter selecting only each scene's newest SceneTextVersion row."""
+    newer = aliased(SceneTextVersion)
+    return SceneTextVersion.version == (
+        select(func.max(newer.version))
+        .where(newer.scene_id == SceneTextVersion.scene_id)
+        .correlate(SceneTextVersion)
+        .scalar_subquery()
+    )
+
+
+async def get_latest_scene_texts(
+    db: AsyncSession, scene_ids: list[int]
+) -> dict[int, str]:
+    """Map scene_id → latest content_md (scenes without versions omitted)."""
+    if not scene_ids:
+        return {}
+    result = await db.execute(
+        select(SceneTextVersion.scene_id, SceneTextVersion.content_md)
+        .where(SceneTextVersion.scene_id.in_(set(scene_ids)), is_latest_version())
+    )
+    return {scene_id: content or "" for scene_id, content in result.all()}
+
+
+async def get_chapter_scene_texts(
+    db: AsyncSession, chapter_ids: list[int]
+) -> dict[int, list[tuple[str, str]]]:
+    """Map chapter_id → [(scene title, latest content_md)] in scene order.
+
+    Scenes without any version are omitted.
+    """
+    if not chapter_ids:
+        return {}
+    result = await db.execute(
+        select(Scene.chapter_id, Scene.title, SceneTextVersion.content_md)
+        .join(SceneTextVersion, SceneTextVersion.scene_id == Scene.id)
+        .where(Scene.chapter_id.in_(set(chapter_ids)), is_latest_version())
+        .order_by(Scene.chapter_id, Scene.sort_order, Scene.id)
+    )
+    texts: dict[int, list[tuple[str, str]]] = defaultdict(list)
+    for chapter_id, title, content in result.all():
+        texts[chapter_id].append((title, content or ""))
+    return dict(texts)
+
+
+async def get_chapter_scene_versions(
+    db: AsyncSession, chapter_id: int
+) -> list[tuple[int, int, str]]:
+    """[(scene_id, latest version id, content_md)] of a chapter, in scene order.
+
+    Scenes without any version are omitted.
+    """
+    result = await db.execute(
+        select(Scene.id, SceneTextVersion.id, SceneTextVersion.content_md)
+        .join(SceneTextVersion, SceneTextVersion.scene_id == Scene.id)
+        .where(Scene.chapter_id == chapter_id, is_latest_version())
+        .order_by(Scene.sort_order, Scene.id)
+    )
+    return [
+        (scene_id, version_id, content or "")
+        for scene_id, version_id, content in result.all()
+    ]
@@ -1,21 +1,29 @@
 """Chapter summary generation service."""
 
+import asyncio
+import hashlib
 import json
 import logging
-import re
 
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.core.config import settings
 from app.core.llm import call_llm
 from app.models import (
     Chapter,
     ChapterSummary,
-    Scene,
-    SceneTextVersion,
+    SummaryRollup,
 )
+from app.services.json_stream import parse_json_object
+from app.services.llm_cache import (
+    get_cached_outputs,
+    llm_cache_key,
+    record_hits,
+    store_output,
+)
+from app.services.scene_text import get_chapter_scene_texts
 
 logger = logging.getLogger(__name__)
 
@@ -45,33 +53,8 @@ async def _collect_chapter_text(
     db: AsyncSession, chapter_id: int
 ) -> str:
     """Concatenate all scene texts in a chapter (single query)."""
-    # Subquery: latest version per scene
-    latest_ver = (
-        select(
-            SceneTextVersion.scene_id,
-            func.max(SceneTextVersion.version).label(
-                "max_ver"
-            ),
-        )
-        .group_by(SceneTextVersion.scene_id)
-        .subquery()
-    )
-
-    result = await db.execute(
-        select(Scene.title, SceneTextVersion.content_md)
-        .join(latest_ver, latest_ver.c.scene_id == Scene.id)
-        .join(
-            SceneTextVersion,
-            (SceneTextVersion.scene_id == Scene.id)
-            & (
-                SceneTextVersion.version
-                == latest_ver.c.max_ver
-            ),
-        )
-        .where(Scene.chapter_id == chapter_id)
-        .order_by(Scene.sort_order)
-    )
-    rows = result.all()
+    scene_texts = await get_chapter_scene_texts(db, [chapter_id])
+    rows = scene_texts.get(chapter_id, [])
 
     parts = []
     for title, content_md in rows:
@@ -84,38 +67,23 @@ async def _collect_chapter_text(
     return text
 
 
-def _parse_summary_json(raw: str) -> dict:
-    """Parse summary JSON from LLM output with fence/quote repair."""
-    # Strip markdown fences
-    m = re.search(r"```(?:json)?\s*\n?(.*?)```", raw, re.DOTALL)
-    if m:
-        raw = m.group(1).strip()
-    else:
-        idx = raw.find("{")
-        if idx > 0:
-            raw = raw[idx:]
-    # Fix unescaped CJK quotes
-    raw = re.sub(
-        r'(?<=[\u4e00-\u9fff\u3400-\u4dbf])"(?=[\u4e00-\u9fff\u3400-\u4dbf])',
-        r'\\"',
-        raw,
-    )
-    try:
-        data = json.loads(raw)
-        return data if isinstance(data, dict) else {}
-    except (json.JSONDecodeError, TypeError):
-        logger.warning("Failed to parse summary JSON: %s", raw[:200])
-        return {}
-
-
 class EmptyChapterError(Exception):
     """Raised when chapter has no text content."""
 
 
+CACHE_KIND = "chapter_summary"
+
+
 async def generate_chapter_summary(
-    db: AsyncSession, chapter_id: int
+    db: AsyncSession, chapter_id: int, force: bool = False
 ) -> ChapterSummary:
-    """Generate and save a structured chapter summary."""
+    """Generate and save a structured chapter summary.
+
+    Unchanged chapter text is served from the LLM result cache: a saved
+    summary parsed from that same output is returned as is, otherwise the
+    cached output is parsed and saved again. ``force`` always calls the
+    LLM.
+    """
     chapter = await db.get(Chapter, chapter_id)
     if not chapter:
         raise ValueError(f"Chapter {chapter_id} not found")
@@ -133,18 +101,35 @@ async def generate_chapter_summary(
         {"role": "user", "content": prompt},
     ]
 
-    try:
-        response = await call_llm(
-            messages, response_format={"type": "json_object"}
+    key = llm_cache_key(CACHE_KIND, messages)
+    raw = None if force else (await get_cached_outputs(db, [key])).get(key)
+    cached = raw is not None
+    if cached:
+        await record_hits(db, [key])
+        existing = await db.execute(
+            select(ChapterSummary).where(
+                ChapterSummary.chapter_id == chapter_id
+            )
         )
-        raw = response.choices[0].message.content or ""
-    except Exception as exc:
-        logger.error("LLM call failed during summary generation: %s", exc)
-        raise
+        summary = existing.scalar_one_or_none()
+        # The row may hold the summary of other text (edited, then reverted)
+        if summary and summary.source_key == key:
+            return summary
+    else:
+        try:
+            response = await call_llm(
+                messages, response_format={"type": "json_object"}
+            )
+            raw = response.choices[0].message.content or ""
+        except Exception as exc:
+            logger.error("LLM call failed during summary generation: %s", exc)
+            raise
 
-    result = _parse_summary_json(raw)
+    result = parse_json_object(raw)
     if not result.get("narrative"):
         raise EmptyChapterError("LLM returned empty summary")
+    if not cached:
+        await store_output(db, key, CACHE_KIND, raw)
 
     def _dumps(obj):
         return json.dumps(obj, ensure_ascii=False)
@@ -165,6 +150,7 @@ async def generate_chapter_summary(
         summary.plot_threads_json = _dumps(
             result.get("plot_threads", [])
         )
+        summary.source_key = key
     else:
         summary = ChapterSummary(
             chapter_id=chapter_id,
@@ -173,6 +159,7 @@ async def generate_chapter_summary(
             keywords_json=_dumps(result.get("keywords", [])),
             entities_json=_dumps(result.get("entities", [])),
             plot_threads_json=_dumps(result.get("plot_threads", [])),
+            source_key=key,
         )
         db.add(summary)
         try:
@@ -191,3 +178,183 @@ async def generate_chapter_summary(
     await db.flush()
     await db.refresh(summary)
     return summary
+
+
+# ---------- Summary hierarchy (chapter → arc → book) ----------
+
+_ROLLUP_SYSTEM = """\
+你是一位专业的小说编辑。下面是按时间顺序排列的若干段{unit}摘要，
+请将它们压缩为一段连贯的{target}，保留主要人物、关键事件和未解决的情节线索。
+返回一个 JSON 对象：{{"narrative": "压缩后的摘要"}}
+
+规则：
+- 只输出合法 JSON，不要 markdown 围栏
+- narrative 用中文书写
+"""
+
+
+def _source_hash(children: list[tuple[int, str]]) -> str:
+    payload = "\n".join(f"{key}:{text}" for key, text in children)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _condense(texts: list[str], unit: str, target: str) -> str:
+    """Ask the LLM to roll several summaries up into one."""
+    messages = [
+        {
+            "role": "system",
+            "content": _ROLLUP_SYSTEM.format(unit=unit, target=target),
+        },
+        {"role": "user", "content": "\n\n".join(texts)},
+    ]
+    response = await call_llm(messages, response_format={"type": "json_object"})
+    raw = response.choices[0].message.content or ""
+    return parse_json_object(raw).get("narrative", "")
+
+
+async def _refresh_node(
+    db: AsyncSession,
+    book_id: int,
+    existing: dict,
+    level: str,
+    arc_index: int,
+    children: list[tuple[int, str]],
+    sort_range: tuple[int, int],
+) -> SummaryRollup | None:
+    """Regenerate one rollup node if its children changed.
+
+    Nodes with fewer than two children are removed (the children already
+    say everything). LLM failures keep the previous node.
+    """
+    node = existing.pop((level, arc_index), None)
+    if len(children) < 2:
+        if node:
+            await db.delete(node)
+        return None
+
+    source_hash = _source_hash(children)
+    if node and node.source_hash == source_hash:
+        return node
+
+    unit, target = ("章节", "分卷摘要") if level == "arc" else ("分卷", "全书梗概")
+    try:
+        text = await _condense([t for _, t in children], unit, target)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Rollup %s/%d failed: %s", level, arc_index, exc)
+        return node
+    if not text:
+        return node
+
+    if node is None:
+        node = SummaryRollup(book_id=book_id, level=level, arc_index=arc_index)
+        db.add(node)
+    node.summary_md = text
+    node.source_hash = source_hash
+    node.first_sort, node.last_sort = sort_range
+    return node
+
+
+async def refresh_rollups(
+    db: AsyncSession, book_id: int
+) -> list[SummaryRollup]:
+    """Bring a book's arc and book rollups up to date with its summaries.
+
+    Chapters are grouped into arcs of SUMMARY_ARC_SIZE by position in the
+    book; the book synopsis rolls up the arcs. Only nodes whose children
+    changed (by content hash) cost an LLM call. Returns the current nodes.
+
+    Requests do not call this directly; see schedule_rollup_refresh.
+    """
+    result = await db.execute(
+        select(Chapter.id, Chapter.sort_order, ChapterSummary.summary_md)
+        .outerjoin(ChapterSummary, ChapterSummary.chapter_id == Chapter.id)
+        .where(Chapter.book_id == book_id)
+        .order_by(Chapter.sort_order, Chapter.id)
+    )
+    chapters = result.all()
+    result = await db.execute(
+        select(SummaryRollup).where(SummaryRollup.book_id == book_id)
+    )
+    existing = {(r.level, r.arc_index): r for r in result.scalars()}
+
+    size = max(1, settings.SUMMARY_ARC_SIZE)
+    arcs: list[SummaryRollup] = []
+    for arc_index, start in enumerate(range(0, len(chapters), size)):
+        done = [c for c in chapters[start:start + size] if c.summary_md]
+        node = await _refresh_node(
+            db, book_id, existing, "arc", arc_index,
+            [(c.id, c.summary_md) for c in done],
+            (done[0].sort_order, done[-1].sort_order) if done else (0, 0),
+        )
+        if node:
+            arcs.append(node)
+
+    book = await _refresh_node(
+        db, book_id, existing, "book", 0,
+        [(a.arc_index, a.summary_md) for a in arcs],
+        (arcs[0].first_sort, arcs[-1].last_sort) if arcs else (0, 0),
+    )
+
+    # Arcs past the end of a shrunken book
+    for node in existing.values():
+        await db.delete(node)
+
+    await db.flush()
+    return arcs + ([book] if book else [])
+
+
+# book_id -> refresh task (this process); book ids asked again meanwhile
+_rollup_tasks: dict[int, asyncio.Task] = {}
+_rollup_again: set[int] = set()
+
+
+def schedule_rollup_refresh(
+    book_id: int, session_factory: async_sessionmaker
+) -> asyncio.Task:
+    """Refresh a book's rollups in the background; returns the task.
+
+    Call after committing the summaries it should see. A request made
+    while a refresh runs makes that task run once more when it is done,
+    so the last summaries always get rolled up.
+    """
+    task = _rollup_tasks.get(book_id)
+    if task is not None and not task.done():
+        _rollup_again.add(book_id)
+        return task
+    task = asyncio.create_task(_run_rollup_refresh(book_id, session_factory))
+    _rollup_tasks[book_id] = task
+
+    def _forget(finished: asyncio.Task) -> None:
+        if _rollup_tasks.get(book_id) is finished:
+            del _rollup_tasks[book_id]
+
+    task.add_done_callback(_forget)
+    return task
+
+
+def rollup_task(book_id: int) -> asyncio.Task | None:
+    return _rollup_tasks.get(book_id)
+
+
+async def _run_rollup_refresh(
+    book_id: int, session_factory: async_sessionmaker
+) -> None:
+    while True:
+        _rollup_again.discard(book_id)
+        async with session_factory() as db:
+            try:
+                await refresh_rollups(db, book_id)
+                await db.commit()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Rollup refresh of book %d failed: %s", book_id, exc)
+                await db.rollback()
+        if book_id not in _rollup_again:
+            return
+
+
+async def stop_rollup_refreshes() -> None:
+    """Cancel pending refreshes (shutdown); the next summary change redoes them."""
+    tasks = list(_rollup_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,14 +1,110 @@
 """Shared text utilities."""
 
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_SEPS = ["\n", "。", ".", "！", "!", "？", "?", "；", ";"]
+
+_FALLBACK_ENCODING = "cl100k_base"
 
-def truncate_to_sentence(text: str, budget: int) -> str:
-    """Truncate text to budget chars, trimming at sentence boundary."""
-    if len(text) <= budget:
-        return text
 
-    truncated = text[:budget]
-    for sep in ["\n", "。", ".", "！", "!", "？", "?", "；", ";"]:
+def _trim_to_boundary(truncated: str, budget: int) -> str:
+    """Cut a hard-truncated prefix back to its last sentence boundary."""
+    for sep in _SENTENCE_SEPS:
         idx = truncated.rfind(sep)
         if idx > budget // 2:
             return truncated[: idx + 1]
     return truncated
+
+
+def truncate_to_sentence(text: str, budget: int) -> str:
+    """Truncate text to budget chars, trimming at sentence boundary."""
+    if len(text) <= budget:
+        return text
+    return _trim_to_boundary(text[:budget], budget)
+
+
+# ---------- Token budgeting ----------
+
+class _CharTokenizer:
+    """Offline stand-in: one token per character.
+
+    Used only when tiktoken cannot load its BPE files (no network and no
+    TIKTOKEN_CACHE_DIR). For CJK prose this slightly over-counts, so
+    budgets stay on the safe side.
+    """
+
+    name = "char"
+
+    def encode(self, text: str) -> list[int]:
+        return [ord(c) for c in text]
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(chr(t) for t in tokens)
+
+
+@lru_cache(maxsize=8)
+def get_tokenizer(model: str | None = None):
+    """Return the tokenizer for a model, loaded once per model name."""
+    name = (model or settings.LLM_MODEL).split("/")[-1]
+    try:
+        try:
+            return tiktoken.encoding_for_model(name)
+        except KeyError:
+            return tiktoken.get_encoding(_FALLBACK_ENCODING)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(
+            "tiktoken unavailable for %s (%s); counting characters", name, exc
+        )
+        return _CharTokenizer()
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Token count of a text block (memoized per block and model)."""
+    if not text:
+        return 0
+    return len(get_tokenizer(model).encode(text))
+
+
+def truncate_to_tokens(
+    text: str, budget: int, model: str | None = None
+) -> str:
+    """Truncate text to budget tokens, trimming at sentence boundary."""
+    if count_tokens(text, model) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    tokenizer = get_tokenizer(model)
+    # A cut inside a multi-byte character decodes to U+FFFD; drop it
+    truncated = tokenizer.decode(tokenizer.encode(text)[:budget]).rstrip("�")
+    return _trim_to_boundary(truncated, len(truncated))
+
+
+class BudgetMeter:
+    """Measure/truncate pair for one budget unit ("chars" or "tokens")."""
+
+    def __init__(self, unit: str = "chars", model: str | None = None) -> None:
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown budget unit: {unit}")
+        self.unit = unit
+        self.model = model
+
+    def measure(self, text: str) -> int:
+        if self.unit == "tokens":
+            return count_tokens(text, self.model)
+        return len(text)
+
+    def truncate(self, text: str, budget: int) -> str:
+        if self.unit == "tokens":
+            return truncate_to_tokens(text, budget, self.model)
+        return truncate_to_sentence(text, budget)
+
+
+CHARS = BudgetMeter("chars")
@@ -0,0 +1,190 @@
+"""Compiled lorebook trigger matching (Aho-Corasick).
+
+A ``TriggerMatcher`` is built once per project from every entry's title,
+aliases and keywords. Matching lowercases the scan text once and walks it
+a single time, collecting every pattern that occurs, then evaluates each
+entry's OR/AND rules against that match set. Semantics are identical to
+``lorebook.match_triggers``.
+"""
+
+import json
+from collections import deque
+from typing import Iterable
+
+
+class AhoCorasick:
+    """Multi-pattern substring automaton over plain Python dicts."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns: list[str] = []
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (len(self.patterns),)
+        self.patterns.append(pattern)
+
+    def _link(self) -> None:
+        """Breadth-first failure links; outputs merged along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def walk(self, text: str, state: int = 0) -> tuple[set[int], int]:
+        """Advance from state over text; returns (patterns ended, new state).
+
+        Feeding consecutive chunks with the returned state finds matches
+        that straddle chunk boundaries.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[int] = set()
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found, state
+
+    def find(self, text: str) -> set[int]:
+        """Indices of every pattern occurring in text (one pass)."""
+        return self.walk(text)[0]
+
+
+def _safe_loads(raw: str, default):
+    try:
+        value = json.loads(raw) if raw else default
+    except (json.JSONDecodeError, TypeError):
+        return default
+    return value if isinstance(value, type(default)) else default
+
+
+class TriggerMatcher:
+    """Per-project compiled triggers for all lore entries."""
+
+    def __init__(self, rows: Iterable[tuple]) -> None:
+        """rows: (id, title, aliases_json, triggers_json, locked)."""
+        index: dict[str, int] = {}
+
+        def _ids(words) -> frozenset[int]:
+            ids = set()
+            for word in words:
+                if isinstance(word, str) and word:
+                    ids.add(index.setdefault(word.lower(), len(index)))
+            return frozenset(ids)
+
+        self.locked: list[int] = []
+        self.titles: dict[int, str] = {}
+        # (entry id, OR pattern ids, AND pattern ids or None)
+        self._rules: list[tuple[int, frozenset[int], frozenset[int] | None]] = []
+        for entry_id, title, aliases_json, triggers_json, locked in rows:
+            if locked:
+                self.locked.append(entry_id)
+            self.titles[entry_id] = title
+            triggers = _safe_loads(triggers_json, {})
+            aliases = _safe_loads(aliases_json, [])
+            or_ids = _ids([title, *aliases, *(triggers.get("keywords") or [])])
+            and_words = triggers.get("and_keywords") or []
+            and_ids = _ids(and_words) if and_words else None
+            self._rules.append((entry_id, or_ids, and_ids))
+        self._automaton = AhoCorasick(sorted(index, key=index.get))
+        # pattern id -> rules it can satisfy the OR / AND side of
+        self._by_pattern: list[list[int]] = [[] for _ in index]
+        self._by_and_pattern: list[list[int]] = [[] for _ in index]
+        for rule_idx, (_, or_ids, and_ids) in enumerate(self._rules):
+            for pattern_id in or_ids:
+                self._by_pattern[pattern_id].append(rule_idx)
+            for pattern_id in and_ids or ():
+                self._by_and_pattern[pattern_id].append(rule_idx)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def match(self, scan_text: str) -> list[int]:
+        """Ids of entries whose triggers fire on scan_text."""
+        if not scan_text:
+            return []
+        found = self._automaton.find(scan_text.lower())
+        candidates = {r for p in found for r in self._by_pattern[p]}
+        matched = []
+        for rule_idx in sorted(candidates):
+            entry_id, _, and_ids = self._rules[rule_idx]
+            if and_ids is None or and_ids <= found:
+                matched.append(entry_id)
+        return matched
+
+    def stream(self, already: Iterable[int] = ()) -> "StreamingTriggerMatch":
+        """Start incremental matching over a text stream."""
+        return StreamingTriggerMatch(self, already)
+
+
+class StreamingTriggerMatch:
+    """Trigger evaluation over text arriving in chunks.
+
+    Automaton state carries across ``feed`` calls, so a keyword split
+    between two chunks still fires. A rule is only re-evaluated when one
+    of its own patterns is seen for the first time, so the total cost is
+    O(streamed text + rules touched).
+    """
+
+    def __init__(self, matcher: TriggerMatcher, already: Iterable[int] = ()) -> None:
+        self._matcher = matcher
+        self._state = 0
+        self._found: set[int] = set()
+        self._already = set(already)
+        # Every entry the stream triggered, in firing order
+        self.triggered: list[int] = []
+        self._triggered_set: set[int] = set()
+
+    @property
+    def activated(self) -> list[int]:
+        """Triggered entries that were not active before the stream."""
+        return [e for e in self.triggered if e not in self._already]
+
+    def feed(self, chunk: str) -> list[int]:
+        """Consume a chunk; returns entries newly triggered by it."""
+        matcher = self._matcher
+        found, self._state = matcher._automaton.walk(chunk.lower(), self._state)
+        new = found - self._found
+        if not new:
+            return []
+        self._found |= new
+
+        candidates = set()
+        for pattern_id in new:
+            candidates.update(matcher._by_pattern[pattern_id])
+            candidates.update(matcher._by_and_pattern[pattern_id])
+        fired = []
+        for rule_idx in sorted(candidates):
+            entry_id, or_ids, and_ids = matcher._rules[rule_idx]
+            if entry_id in self._triggered_set:
+                continue
+            if not or_ids.isdisjoint(self._found) and (
+                and_ids is None or and_ids <= self._found
+            ):
+                fired.append(entry_id)
+        self.triggered.extend(fired)
+        self._triggered_set.update(fired)
+        return [e for e in fired if e not in self._already]
@@ -0,0 +1,177 @@
+"""Benchmark: context pack assembly, total and per layer.
+
+Builds a throwaway SQLite project with thousands of lore entries and KG
+proposals, then times assemble_context_pack with the cache off, using
+the report's per-layer wall times to show where the time goes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_context_pack --lore 3000 --kg 3000 --runs 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import (
+    BibleField,
+    Book,
+    Chapter,
+    ChapterSummary,
+    KGProposal,
+    LoreEntry,
+    Project,
+    Scene,
+    SceneTextVersion,
+)
+from app.services.context_pack import assemble_context_pack
+
+
+async def _populate(session: AsyncSession, n_lore: int, n_kg: int, n_chapters: int):
+    project = Project(title="Bench")
+    session.add(project)
+    await session.flush()
+    book = Book(project_id=project.id, title="Book")
+    session.add(book)
+    await session.flush()
+
+    chapters = [
+        Chapter(book_id=book.id, title=f"第{i}章", sort_order=i, status="done")
+        for i in range(1, n_chapters + 1)
+    ]
+    session.add_all(chapters)
+    await session.flush()
+    session.add_all(
+        ChapterSummary(chapter_id=ch.id, summary_md=f"第{ch.sort_order}章摘要。" * 20)
+        for ch in chapters
+    )
+    current = chapters[-1]
+    scene = Scene(chapter_id=current.id, title="Scene", sort_order=1)
+    session.add(scene)
+    await session.flush()
+    session.add(
+        SceneTextVersion(
+            scene_id=scene.id,
+            version=1,
+            content_md="\n\n".join(f"角色{i}走进了城堡{i}。" for i in range(0, 200, 7)),
+            char_count=0,
+        )
+    )
+    session.add_all(
+        BibleField(project_id=project.id, key=f"设定{i}", value_md="世界规则。" * 10, locked=True)
+        for i in range(5)
+    )
+
+    await session.execute(
+        insert(LoreEntry),
+        [
+            {
+                "project_id": project.id,
+                "type": "Character",
+                "title": f"角色{i}",
+                "aliases_json": json.dumps([f"别名{i}"], ensure_ascii=False),
+                "content_md": f"角色{i}的背景故事。" * 5,
+                "triggers_json": json.dumps(
+                    {"keywords": [f"城堡{i}"], "and_keywords": []}, ensure_ascii=False
+                ),
+                "priority": i % 10,
+            }
+            for i in range(n_lore)
+        ],
+    )
+    # KG proposals go through the ORM so the before_flush hook renders
+    # fact_line and KGFactTerm rows, as the extraction pipeline does
+    session.add_all(
+        KGProposal(
+            project_id=project.id,
+            chapter_id=chapters[i % n_chapters].id,
+            category="entity",
+            data_json=json.dumps(
+                {"label": "Character", "name": f"角色{i}", "properties": {"age": i}},
+                ensure_ascii=False,
+            ),
+            confidence=0.9 + (i % 10) / 100,
+            status="auto_approved",
+        )
+        for i in range(n_kg)
+    )
+    await session.commit()
+    return project.id, current.id, scene.id
+
+
+async def _check_layers(session_factory, ids) -> None:
+    """Fail fast if a layer is empty, which would make the timings moot."""
+    project_id, chapter_id, scene_id = ids
+    async with session_factory() as session:
+        _, report = await assemble_context_pack(
+            session, scene_id, chapter_id, project_id,
+            use_cache=False, with_report=True,
+        )
+    layers = report["layers"]
+    empty = [name for name, layer in layers.items() if not layer["used"]]
+    for part in ("kg", "lore"):
+        if not layers["kg_lore"][part]["items"]:
+            empty.append(f"kg_lore.{part}")
+    if empty:
+        raise SystemExit(f"empty context layers: {', '.join(empty)}")
+
+
+async def _time(session_factory, ids, runs: int) -> dict[str, list[float]]:
+    """Wall-time samples (ms): "total" plus one series per layer."""
+    project_id, chapter_id, scene_id = ids
+    samples: dict[str, list[float]] = {"total": []}
+    for _ in range(runs):
+        async with session_factory() as session:
+            start = time.perf_counter()
+            _, report = await assemble_context_pack(
+                session, scene_id, chapter_id, project_id,
+                use_cache=False, with_report=True,
+            )
+            samples["total"].append((time.perf_counter() - start) * 1000)
+        for name, layer in report["layers"].items():
+            samples.setdefault(name, []).append(layer["wall_ms"])
+    return samples
+
+
+async def main(n_lore: int, n_kg: int, n_chapters: int, runs: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+        async with session_factory() as session:
+            ids = await _populate(session, n_lore, n_kg, n_chapters)
+
+        await _check_layers(session_factory, ids)
+
+        # Warm up connections and SQLite page cache
+        await _time(session_factory, ids, runs=2)
+
+        print(f"lore={n_lore} kg={n_kg} chapters={n_chapters} runs={runs}")
+        for label, samples in (await _time(session_factory, ids, runs)).items():
+            print(
+                f"{label:>10}: median {statistics.median(samples):7.1f} ms"
+                f"  p90 {sorted(samples)[int(runs * 0.9) - 1]:7.1f} ms"
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lore", type=int, default=3000)
+    parser.add_argument("--kg", type=int, default=3000)
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.lore, args.kg, args.chapters, args.runs))
@@ -1,15 +1,31 @@
+import asyncio
+
 import pytest
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.database import Base, get_db
 from app.main import app
+from app.services.context_pack import invalidate_context_pack_cache
+from app.services.graph_snapshot import graph_snapshot_cache
+from app.services.kg_analytics import node_metrics_cache
+from app.services.kg_facts import fact_term_matcher_cache
+from app.services.kg_names import name_index_cache
+from app.services.lorebook import trigger_matcher_cache
+from app.services.summary import _rollup_tasks
 
 TEST_DB_URL = "sqlite+aiosqlite:///:memory:"
 
 
 @pytest.fixture
 async def db_session():
+    # In-process caches must not leak across per-test in-memory databases
+    invalidate_context_pack_cache()
+    trigger_matcher_cache.clear()
+    graph_snapshot_cache.clear()
+    name_index_cache.clear()
+    node_metrics_cache.clear()
+    fact_term_matcher_cache.clear()
     engine = create_async_engine(TEST_DB_URL)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -31,8 +47,16 @@ async def client(db_session):
             await db_session.rollback()
             raise
 
+    async def settle_background(response):
+        # Background rollup refreshes share the test's single connection
+        await asyncio.gather(*_rollup_tasks.values())
+
     app.dependency_overrides[get_db] = override_get_db
     transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+    async with AsyncClient(
+        transport=transport,
+        base_url="http://test",
+        event_hooks={"response": [settle_background]},
+    ) as ac:
         yield ac
     app.dependency_overrides.clear()
@@ -3,6 +3,7 @@
 import json
 
 import pytest
+from sqlalchemy import select, text
 
 from app.models.tables import KGEdge, KGNode
 from app.services.consistency import run_consistency_check
@@ -121,6 +122,52 @@ async def test_character_status_no_conflict(client, db_session):
     assert char_conflicts == []
 
 
+@pytest.mark.asyncio
+async def test_lifecycle_columns_from_properties(client, db_session):
+    """status / *_location / narrative_day are generated from the JSON and indexed."""
+    pid = await _setup_project(client)
+    dead = _make_node(pid, "Character", "A", {"Status": "DEAD", "death_location": "chapter:1"})
+    plot = _make_node(pid, "Event", "Feud", {"status": "resolved", "resolved_location": "x"})
+    broken = KGNode(project_id=pid, label="Character", name="B", properties_json="{not json")
+    db_session.add_all([dead, plot, broken])
+    await db_session.flush()
+    edge = _make_edge(pid, dead.id, plot.id, "at", {"narrative_day": "3"})
+    db_session.add(edge)
+    await db_session.flush()
+
+    rows = (
+        await db_session.execute(
+            select(KGNode.name, KGNode.status, KGNode.death_location, KGNode.resolved_location)
+            .where(KGNode.project_id == pid)
+            .order_by(KGNode.id)
+        )
+    ).all()
+    assert [tuple(r) for r in rows] == [
+        ("A", "dead", "chapter:1", None),
+        ("Feud", "resolved", None, "x"),
+        ("B", None, None, None),
+    ]
+    day = await db_session.scalar(select(KGEdge.narrative_day).where(KGEdge.id == edge.id))
+    assert day == 3
+
+    # Updating the JSON updates the column
+    dead.properties_json = json.dumps({"status": "alive"})
+    await db_session.flush()
+    status = await db_session.scalar(select(KGNode.status).where(KGNode.id == dead.id))
+    assert status == "alive"
+
+    plan = (
+        await db_session.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT name FROM kg_nodes "
+                "WHERE project_id = :p AND status = 'dead'"
+            ),
+            {"p": pid},
+        )
+    ).all()
+    assert any("ix_kg_nodes_project_status" in row[-1] for row in plan)
+
+
 # ---------- Test: possession ----------
 
 @pytest.mark.asyncio
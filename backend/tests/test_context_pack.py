@@ -359,3 +359,434 @@ async def test_custom_budget(client, db_session):
         db_session, sid, ch2_id, pid, total_budget=50000
     )
     assert len(pack_small) < len(pack_large)
+
+
+# ==================== Result cache ====================
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_layer_queries(client, db_session):
+    """Repeat assembly on unchanged inputs is served from the cache."""
+    from app.services import context_pack
+    from app.services.context_pack import assemble_context_pack, context_pack_cache
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    first = await assemble_context_pack(db_session, sid, ch2_id, pid)
+    assert context_pack_cache.stats()["misses"] == 1
+
+    with patch.object(
+        context_pack, "_build_context_pack", new=AsyncMock(side_effect=AssertionError)
+    ):
+        second = await assemble_context_pack(db_session, sid, ch2_id, pid)
+
+    assert second == first
+    stats = context_pack_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidated_by_new_scene_version(client, db_session):
+    """Saving a new scene version changes the stamp and rebuilds the pack."""
+    from app.services.context_pack import assemble_context_pack, context_pack_cache
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    first = await assemble_context_pack(db_session, sid, ch2_id, pid)
+    await client.post(
+        f"/api/scenes/{sid}/versions",
+        json={"content_md": "城堡的大门缓缓打开。", "created_by": "user"},
+    )
+    second = await assemble_context_pack(db_session, sid, ch2_id, pid)
+
+    assert second != first
+    assert "城堡的大门缓缓打开" in second
+    assert context_pack_cache.stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidated_by_lore_edit(client, db_session):
+    """Editing a lore entry within the same second still invalidates."""
+    from app.services.context_pack import assemble_context_pack
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+    await assemble_context_pack(db_session, sid, ch2_id, pid)
+
+    resp = await client.get(f"/api/lore?project_id={pid}")
+    eid = resp.json()[0]["id"]
+    await client.put(f"/api/lore/{eid}", json={"content_md": "林远其实是王子。"})
+
+    pack = await assemble_context_pack(db_session, sid, ch2_id, pid)
+    assert "林远其实是王子" in pack
+
+
+@pytest.mark.asyncio
+async def test_cache_opt_out_and_budget_key(client, db_session):
+    """use_cache=False bypasses the cache; budgets are cached separately."""
+    from app.services.context_pack import assemble_context_pack, context_pack_cache
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    await assemble_context_pack(db_session, sid, ch2_id, pid, use_cache=False)
+    assert context_pack_cache.stats()["size"] == 0
+
+    await assemble_context_pack(db_session, sid, ch2_id, pid, total_budget=500)
+    await assemble_context_pack(db_session, sid, ch2_id, pid, total_budget=1000)
+    assert context_pack_cache.stats()["size"] == 2
+
+
+def test_lru_cache_eviction():
+    from app.services.cache import LRUCache
+
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # refresh "a"
+    cache.put("c", 3)  # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c", valid=lambda v: v > 5) is None  # stale → dropped
+    assert len(cache) == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_bump_only_their_project(client, db_session):
+    """Scene-level writes resolve to their project; cache tables bump nothing."""
+    from app.models import LLMResultCache, SceneTextVersion
+    from app.services.cache import write_generation
+
+    pid, _, _, _, sid = await _setup_full_project(client)
+    other = (await client.post("/api/projects", json={"title": "Other"})).json()["id"]
+
+    before, other_before = write_generation(pid), write_generation(other)
+    db_session.add(
+        SceneTextVersion(scene_id=sid, version=9, content_md="新的一稿。", char_count=5)
+    )
+    await db_session.flush()
+    after = write_generation(pid)
+    assert after[0] == before[0]  # global untouched
+    assert after[1] > before[1]
+    assert write_generation(other) == other_before
+
+    db_session.add(LLMResultCache(key="k" * 64, kind="test", raw_output="{}"))
+    await db_session.flush()
+    assert write_generation(pid) == after
+
+
+# ==================== Token budgeting ====================
+
+
+def test_truncate_to_tokens_respects_budget():
+    from app.services.text_utils import count_tokens, truncate_to_tokens
+
+    text = "林远走进了古老的森林。他手持魔法剑。远处有一座城堡。" * 20
+    budget = count_tokens(text) // 3
+
+    result = truncate_to_tokens(text, budget)
+    assert count_tokens(result) <= budget
+    assert result.endswith("。")
+    assert text.startswith(result)
+    assert truncate_to_tokens("短文本。", 100) == "短文本。"
+    assert truncate_to_tokens(text, 0) == ""
+
+
+@pytest.mark.asyncio
+async def test_token_mode_reports_layer_usage(client, db_session):
+    """Token mode keeps every layer within its token budget and reports it."""
+    from app.services.context_pack import assemble_context_pack
+    from app.services.text_utils import count_tokens
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    pack, report = await assemble_context_pack(
+        db_session, sid, ch2_id, pid,
+        total_budget=400, budget_mode="tokens", with_report=True,
+    )
+
+    assert report["unit"] == "tokens"
+    assert report["used"] == count_tokens(pack)
+    assert report["used"] <= 400
+    for name in ("system", "longterm", "kg_lore", "recent"):
+        layer = report["layers"][name]
+        assert layer["used"] <= layer["budget"]
+    assert report["layers"]["recent"]["used"] > 0
+    assert "最近文本" in pack
+
+
+@pytest.mark.asyncio
+async def test_token_mode_layer_caps_from_settings(client, db_session):
+    """Layer budgets come from the CTX_* token settings on large totals."""
+    from app.core.config import settings
+    from app.services.context_pack import assemble_context_pack
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    _, report = await assemble_context_pack(
+        db_session, sid, ch2_id, pid,
+        total_budget=100_000, budget_mode="tokens", with_report=True,
+    )
+    layers = report["layers"]
+    assert layers["system"]["budget"] == settings.CTX_SYSTEM_MAX
+    assert layers["longterm"]["budget"] == settings.CTX_LONGTERM_MAX
+    assert layers["kg_lore"]["budget"] == settings.CTX_STRUCTURED_MAX
+
+
+# ==================== Layer report / explain ====================
+
+
+@pytest.mark.asyncio
+async def test_report_has_per_layer_profile(client, db_session):
+    """Report carries timings, SQL counts, sizes and item accounting."""
+    from app.services.context_pack import assemble_context_pack
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    pack, report = await assemble_context_pack(
+        db_session, sid, ch2_id, pid, use_cache=False, with_report=True
+    )
+
+    assert report["cache"] == "off"
+    assert report["sql_count"] >= sum(
+        layer["sql_count"] for layer in report["layers"].values()
+    )
+    for layer in report["layers"].values():
+        assert layer["wall_ms"] >= 0
+        assert layer["sql_count"] >= 1
+        assert layer["used"] <= layer["raw"]
+    assert report["layers"]["system"]["items"] == 1
+    assert report["layers"]["longterm"]["items"] == 1
+    lore = report["layers"]["kg_lore"]["lore"]
+    assert lore == {
+        "items": 1, "dropped": 0, "excluded": [], "active": lore["active"]
+    }
+    assert len(lore["active"]) == 1
+    assert report["layers"]["recent"]["dropped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_report_counts_dropped_lore_entries(client, db_session):
+    """Lore entries that do not fit the layer budget are reported dropped."""
+    from app.services.context_pack import assemble_context_pack
+
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+    for i in range(5):
+        await client.post(
+            "/api/lore",
+            json={
+                "project_id": pid,
+                "title": f"森林{i}",
+                "content_md": "古老森林的传说。" * 30,
+                "triggers": {"keywords": ["森林"], "and_keywords": []},
+            },
+        )
+
+    _, report = await assemble_context_pack(
+        db_session, sid, ch2_id, pid, total_budget=2000, with_report=True
+    )
+    lore = report["layers"]["kg_lore"]["lore"]
+    assert lore["items"] == 6
+    assert lore["dropped"] >= 4
+    assert report["cache"] == "miss"
+
+
+@pytest.mark.asyncio
+async def test_explain_endpoint(client):
+    pid, _, _, ch2_id, sid = await _setup_full_project(client)
+
+    resp = await client.post(
+        "/api/generate/context-pack/explain",
+        json={"scene_id": sid, "include_text": True},
+    )
+    assert resp.status_code == 200
+    report = resp.json()
+    assert report["cache"] == "off"
+    assert set(report["layers"]) == {"system", "longterm", "kg_lore", "recent"}
+    assert "最近文本" in report["text"]
+
+    resp = await client.post(
+        "/api/generate/context-pack/explain", json={"scene_id": 9999}
+    )
+    assert resp.status_code == 404
+
+
+# ==================== KG fact ranking ====================
+
+
+async def _add_fact(db, pid, ch_id, data, confidence, category="entity"):
+    from app.models.tables import KGProposal
+
+    p = KGProposal(
+        project_id=pid,
+        chapter_id=ch_id,
+        category=category,
+        data_json=json.dumps(data, ensure_ascii=False),
+        confidence=confidence,
+        status="auto_approved",
+    )
+    db.add(p)
+    await db.flush()
+    return p
+
+
+@pytest.mark.asyncio
+async def test_fact_index_populated_on_flush(client, db_session):
+    from sqlalchemy import select
+
+    from app.models import KGFactTerm
+
+    pid, _, ch1_id, _, _ = await _setup_full_project(client)
+    p = await _add_fact(
+        db_session, pid, ch1_id,
+        {"source": "林远", "relation": "师从", "target": "Elder Mo"},
+        0.9, category="relation",
+    )
+    assert p.fact_line == "- 林远 --师从--> Elder Mo"
+    terms = (
+        await db_session.execute(
+            select(KGFactTerm.term).where(KGFactTerm.proposal_id == p.id)
+        )
+    ).scalars().all()
+    assert sorted(terms) == ["elder mo", "林远"]
+
+    # Editing data_json re-indexes the proposal
+    p.category = "entity"
+    p.data_json = json.dumps({"name": "苏晴", "label": "Character"})
+    await db_session.flush()
+    assert p.fact_line == "- [Character] 苏晴"
+    terms = (
+        await db_session.execute(
+            select(KGFactTerm.term).where(KGFactTerm.proposal_id == p.id)
+        )
+    ).scalars().all()
+    assert terms == ["苏晴"]
+
+
+@pytest.mark.asyncio
+async def test_kg_facts_ranked_by_scene_relevance(client, db_session):
+    """Facts about entities in the scan window beat higher-confidence ones."""
+    from app.services.context_pack import _get_kg_facts_text, get_kg_lore_text
+
+    pid, _, ch1_id, _, sid = await _setup_full_project(client)
+    for i in range(20):
+        await _add_fact(
+            db_session, pid, ch1_id,
+            {"name": f"路人{i}", "label": "Character"}, 0.99,
+        )
+    await _add_fact(
+        db_session, pid, ch1_id,
+        {"name": "林远", "label": "Character", "properties": {"role": "剑士"}},
+        0.7,
+    )
+    await _add_fact(
+        db_session, pid, ch1_id, {"name": "苏晴", "label": "Character"}, 0.6
+    )
+
+    # Without scene context, confidence order wins and 林远 is crowded out
+    stats: dict = {}
+    text = await _get_kg_facts_text(db_session, pid, 80, stats=stats)
+    assert "林远" not in text
+    assert stats["dropped"] > 0
+
+    # Scan window mentions 林远; the scene card lists 苏晴
+    card = {
+        "title": "t", "location": "森林", "time": "夜", "characters": ["苏晴"],
+        "conflict": "c", "turning_point": "p",
+    }
+    resp = await client.put(f"/api/scenes/{sid}/card", json={"scene_card": card})
+    assert resp.status_code == 200
+    text = await get_kg_lore_text(db_session, pid, sid, 200)
+    lines = text.split("\n")
+    assert lines[1] == "- [Character] 林远 (role=剑士)"
+    assert lines[2] == "- [Character] 苏晴"
+
+
+@pytest.mark.asyncio
+async def test_kg_facts_ranked_by_centrality(client, db_session):
+    """Without scene matches, facts about central entities come first."""
+    from app.services.context_pack import _get_kg_facts_text
+    from app.services.graph_service import SQLiteGraphAdapter
+    from app.services.kg_analytics import recompute_node_metrics
+
+    pid, _, ch1_id, _, _ = await _setup_full_project(client)
+    for name in ["路人", "林远"]:
+        await _add_fact(db_session, pid, ch1_id, {"name": name, "label": "Character"}, 0.9)
+    graph = SQLiteGraphAdapter(db_session)
+    others = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": n} for n in ["甲", "乙", "丙"]
+    ])
+    (hero,) = await graph.ensure_nodes(pid, ["林远"], "Character")
+    await graph.upsert_edges(pid, [
+        {"source_id": hero, "target_id": o, "relation": "knows"} for o in others
+    ])
+
+    before = await _get_kg_facts_text(db_session, pid, 10_000)
+    assert before.index("路人") < before.index("林远")
+    await recompute_node_metrics(db_session, pid)
+    after = await _get_kg_facts_text(db_session, pid, 10_000)
+    assert after.index("林远") < after.index("路人")
+
+
+@pytest.mark.asyncio
+async def test_fact_terms_share_node_name_keys(client, db_session):
+    """Width, spacing and case-folded spellings match and get centrality."""
+    from app.services.context_pack import _get_kg_facts_text
+    from app.services.graph_service import SQLiteGraphAdapter
+    from app.services.kg_analytics import recompute_node_metrics
+    from app.services.kg_facts import match_fact_terms
+
+    pid, _, ch1_id, _, _ = await _setup_full_project(client)
+    await _add_fact(db_session, pid, ch1_id, {"name": "路人", "label": "Character"}, 0.9)
+    await _add_fact(db_session, pid, ch1_id, {"name": "林 远", "label": "Character"}, 0.9)
+    await _add_fact(db_session, pid, ch1_id, {"name": "Straße", "label": "Location"}, 0.8)
+
+    assert await match_fact_terms(db_session, pid, ["ＳＴＲＡＳＳＥ上的林远"]) == [
+        "strasse", "林远",
+    ]
+    assert await match_fact_terms(db_session, pid, ["林远"], limit=0) == []
+
+    graph = SQLiteGraphAdapter(db_session)
+    others = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": n} for n in ["甲", "乙"]
+    ])
+    (hero,) = await graph.ensure_nodes(pid, ["林远"], "Character")
+    await graph.upsert_edges(pid, [
+        {"source_id": hero, "target_id": o, "relation": "knows"} for o in others
+    ])
+    await recompute_node_metrics(db_session, pid)
+    text = await _get_kg_facts_text(db_session, pid, 10_000)
+    assert text.index("林 远") < text.index("路人")
+
+
+@pytest.mark.asyncio
+async def test_backfill_fact_index(client, db_session):
+    from sqlalchemy import select, update
+
+    from app.models.tables import KGFactTerm, KGProposal
+    from app.services.kg_facts import backfill_fact_index
+
+    pid, _, ch1_id, _, _ = await _setup_full_project(client)
+    p = await _add_fact(
+        db_session, pid, ch1_id, {"name": "林远", "label": "Character"}, 0.9
+    )
+    await db_session.execute(
+        update(KGProposal).where(KGProposal.id == p.id).values(fact_line=None)
+    )
+    db_session.expire(p)
+
+    assert await backfill_fact_index(db_session) == 1
+    assert p.fact_line == "- [Character] 林远"
+    assert await backfill_fact_index(db_session) == 0
+
+    # Terms from the older lower-case-only index are re-keyed
+    await db_session.execute(
+        update(KGFactTerm).where(KGFactTerm.proposal_id == p.id).values(term="林 远")
+    )
+    await backfill_fact_index(db_session)
+    terms = await db_session.execute(
+        select(KGFactTerm.term).where(KGFactTerm.proposal_id == p.id)
+    )
+    assert set(terms.scalars().all()) == {"林远"}
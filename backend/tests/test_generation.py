@@ -112,6 +112,46 @@ async def test_generate_scene_card_404(client):
     assert resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_stream_scene_card(client):
+    """Fields arrive as they close; the card is repaired and completed."""
+    _pid, _bid, cid, sid = await _setup_hierarchy(client)
+    raw = (
+        '```json\n{"title": "飞船坠落", "location": "荒漠星球", '
+        '"characters": ["林远", "AI助手"], '
+        '"conflict": "他喊"快走"然后跑", "target_chars": 1200}\n```'
+    )
+
+    async def mock_stream(*args, **kwargs):
+        for i in range(0, len(raw), 7):
+            yield raw[i:i + 7]
+
+    with patch(
+        "app.api.generation.call_llm_stream", side_effect=mock_stream
+    ) as mock_llm:
+        resp = await client.post(
+            "/api/generate/scene-card/stream",
+            json={"chapter_id": cid, "scene_id": sid},
+        )
+
+    assert resp.status_code == 200
+    events = [
+        json.loads(e[6:]) for e in resp.text.strip().split("\n\n")
+    ]
+    assert [e["field"] for e in events[:-1]] == [
+        "title", "location", "characters", "conflict", "target_chars",
+    ]
+    assert events[3]["value"] == '他喊"快走"然后跑'
+    card = events[-1]["scene_card"]
+    assert events[-1]["done"] is True
+    assert card["characters"] == ["林远", "AI助手"]
+    assert card["time"] == ""
+    assert card["target_chars"] == 1200
+    assert mock_llm.call_args.kwargs["response_format"] == {
+        "type": "json_object"
+    }
+
+
 @pytest.mark.asyncio
 async def test_stream_scene_draft(client):
     """SSE streaming with mocked LLM."""
@@ -154,6 +194,93 @@ async def test_stream_scene_draft(client):
     done_event = events[-1]
     assert done_event["done"] is True
     assert done_event["char_count"] > 0
+    assert set(done_event["context_usage"]["layers"]) == {
+        "system", "longterm", "kg_lore", "recent",
+    }
+
+
+@pytest.mark.asyncio
+async def test_stream_scene_draft_reports_lore_activation(client, db_session):
+    """Lore triggered by the streamed prose shows up in the done event."""
+    from app.services.lorebook import inject_lorebook, recall_activation
+    from app.services.trigger_matcher import TriggerMatcher
+
+    pid, _bid, _cid, sid = await _setup_hierarchy(client)
+    for title, keywords in [("荒漠星球", []), ("外星遗迹", ["遗迹"])]:
+        await client.post("/api/lore", json={
+            "project_id": pid, "title": title, "content_md": f"{title}设定。",
+            "triggers": {"keywords": keywords, "and_keywords": []},
+        })
+
+    async def mock_stream(*args, **kwargs):
+        # "荒漠星球" is split across chunks
+        for chunk in ["林远望着荒", "漠星", "球上的遗", "迹"]:
+            yield chunk
+
+    with patch("app.api.generation.call_llm_stream", side_effect=mock_stream):
+        resp = await client.post(
+            "/api/generate/scene-draft",
+            json={"scene_id": sid, "scene_card": MOCK_SCENE_CARD.model_dump()},
+        )
+
+    done_event = json.loads(resp.text.strip().split("\n\n")[-1][6:])
+    assert [e["title"] for e in done_event["lore_activated"]] == [
+        "荒漠星球", "外星遗迹",
+    ]
+
+    # Unsaved drafts activate nothing
+    assert await recall_activation(db_session, pid, sid) is None
+
+    # Saved unchanged, the draft's set is reused instead of rescanning it
+    draft = "".join(["林远望着荒", "漠星", "球上的遗", "迹"])
+    await client.post(
+        f"/api/scenes/{sid}/versions", json={"content_md": draft}
+    )
+    assert await recall_activation(db_session, pid, sid) == {
+        e["id"] for e in done_event["lore_activated"]
+    }
+    stats: dict = {}
+    with patch.object(TriggerMatcher, "match", return_value=set()) as match:
+        text = await inject_lorebook(db_session, pid, sid, stats=stats)
+    assert match.call_args.args == ("",)
+    assert "荒漠星球设定" in text and "外星遗迹设定" in text
+
+    # Editing the text drops the record
+    await client.post(
+        f"/api/scenes/{sid}/versions", json={"content_md": "林远离开了。"}
+    )
+    assert await recall_activation(db_session, pid, sid) is None
+    assert "荒漠星球设定" not in await inject_lorebook(db_session, pid, sid)
+
+
+@pytest.mark.asyncio
+async def test_stream_scene_draft_keeps_context_pack_cache(client):
+    """A draft neither rescans before streaming nor invalidates the pack."""
+    from app.services.trigger_matcher import TriggerMatcher
+
+    _pid, _bid, _cid, sid = await _setup_hierarchy(client)
+
+    async def mock_stream(*args, **kwargs):
+        yield "林远"
+
+    caches, scans = [], []
+    original = TriggerMatcher.match
+    for _ in range(2):
+        with patch(
+            "app.api.generation.call_llm_stream", side_effect=mock_stream
+        ), patch.object(
+            TriggerMatcher, "match", autospec=True, side_effect=original
+        ) as match:
+            resp = await client.post(
+                "/api/generate/scene-draft",
+                json={"scene_id": sid, "scene_card": MOCK_SCENE_CARD.model_dump()},
+            )
+        done_event = json.loads(resp.text.strip().split("\n\n")[-1][6:])
+        caches.append(done_event["context_usage"]["cache"])
+        scans.append(match.call_count)
+    # Only the pack build scans; the cached second draft scans nothing
+    assert scans == [1, 0]
+    assert caches == ["miss", "hit"]
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,94 @@
+"""Tests for single-query ancestry resolution."""
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Scene
+from app.services.hierarchy import (
+    forget_ancestry,
+    resolve_chapter_ancestry,
+    resolve_scene_ancestry,
+)
+
+
+async def _setup_tree(client):
+    resp = await client.post("/api/projects", json={"title": "Tree"})
+    pid = resp.json()["id"]
+    resp = await client.post("/api/books", json={"project_id": pid, "title": "B"})
+    bid = resp.json()["id"]
+    resp = await client.post(
+        "/api/chapters", json={"book_id": bid, "title": "C", "sort_order": 4}
+    )
+    cid = resp.json()["id"]
+    resp = await client.post(
+        "/api/scenes", json={"chapter_id": cid, "title": "S", "sort_order": 2}
+    )
+    sid = resp.json()["id"]
+    return pid, bid, cid, sid
+
+
+class _QueryCounter:
+    def __init__(self, session):
+        self.engine = session.bind.sync_engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@pytest.mark.asyncio
+async def test_scene_ancestry_single_query_and_memo(client, db_session):
+    pid, bid, cid, sid = await _setup_tree(client)
+    forget_ancestry(db_session)
+
+    with _QueryCounter(db_session) as counter:
+        ancestry = await resolve_scene_ancestry(db_session, sid)
+        again = await resolve_scene_ancestry(db_session, sid)
+        chapter = await resolve_chapter_ancestry(db_session, cid)
+
+    assert counter.count == 1
+    assert again is ancestry
+    assert ancestry.project_id == pid
+    assert ancestry.book_id == bid
+    assert ancestry.chapter_id == cid
+    assert ancestry.scene_sort == 2
+    assert chapter.chapter_sort == 4
+    assert chapter.project_id == pid
+
+
+@pytest.mark.asyncio
+async def test_ancestry_missing_returns_none(db_session):
+    assert await resolve_scene_ancestry(db_session, 9999) is None
+    assert await resolve_chapter_ancestry(db_session, 9999) is None
+
+
+@pytest.mark.asyncio
+async def test_get_scene_project_id_uses_ancestry(client, db_session):
+    from app.services.context_pack import get_scene_project_id
+
+    pid, _, _, sid = await _setup_tree(client)
+    forget_ancestry(db_session)
+    assert await get_scene_project_id(db_session, sid) == pid
+    assert await get_scene_project_id(db_session, 9999) is None
+
+
+@pytest.mark.asyncio
+async def test_ancestry_memo_dropped_when_scene_moves(client, db_session):
+    pid, bid, cid, sid = await _setup_tree(client)
+    resp = await client.post("/api/chapters", json={"book_id": bid, "title": "C2"})
+    cid2 = resp.json()["id"]
+
+    assert (await resolve_scene_ancestry(db_session, sid)).chapter_id == cid
+
+    scene = await db_session.get(Scene, sid)
+    scene.chapter_id = cid2
+    await db_session.flush()
+
+    assert (await resolve_scene_ancestry(db_session, sid)).chapter_id == cid2
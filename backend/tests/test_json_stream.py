@@ -0,0 +1,112 @@
+"""Tests for the incremental JSON parser used on LLM output."""
+
+import json
+
+import pytest
+
+from app.services.json_stream import (
+    JSONStreamParser,
+    iter_json_events,
+    parse_json_items,
+    parse_json_object,
+)
+
+RAW = (
+    'Sure, here you go:\n```json\n'
+    '{"items": [{"name": "林远", "evidence": "他说"你好"然后", '
+    '"p": {"x": [1, {"y": "]"}], "z": "a\\\\"}}, 3, [1, 2], '
+    '{"a": {"b": [1, "}"]}}], "note": "ok", "n": 12.5}\n```\n'
+    'trailing [junk'
+)
+
+EXPECTED_ITEMS = [
+    {
+        "name": "林远",
+        "evidence": '他说"你好"然后',
+        "p": {"x": [1, {"y": "]"}], "z": "a\\"},
+    },
+    3,
+    [1, 2],
+    {"a": {"b": [1, "}"]}},
+]
+
+
+def _feed(raw: str, size: int, items_key: str | None = "items") -> list[tuple]:
+    parser = JSONStreamParser(items_key)
+    events = []
+    for i in range(0, len(raw), size):
+        events += parser.feed(raw[i:i + size])
+    return events + parser.close()
+
+
+def test_parse_items_with_fences_and_preamble():
+    assert parse_json_items(RAW) == EXPECTED_ITEMS
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 13, 64])
+def test_chunk_boundaries_do_not_matter(size):
+    events = _feed(RAW, size)
+    assert [e for e in events if e[0] == "item"] == [
+        ("item", i, v) for i, v in enumerate(EXPECTED_ITEMS)
+    ]
+    assert [e for e in events if e[0] == "field"] == [
+        ("field", "note", "ok"),
+        ("field", "n", 12.5),
+    ]
+
+
+def test_top_level_array_and_other_shapes():
+    assert parse_json_items('[{"a": 1}, {"b": 2}]') == [{"a": 1}, {"b": 2}]
+    assert parse_json_items('{"other": [1]}') == []
+    assert parse_json_items("no json here") == []
+    assert parse_json_object('[1, 2]') == {}
+
+
+def test_object_fields_with_cjk_quotes():
+    raw = '{"narrative": "她说"走吧"就走", "key_events": ["相遇"], "n": -3e2}'
+    assert parse_json_object(raw) == {
+        "narrative": '她说"走吧"就走',
+        "key_events": ["相遇"],
+        "n": -300.0,
+    }
+
+
+def test_truncated_output_keeps_completed_values():
+    raw = '{"items": [{"name": "林远"}, {"name": "苏'
+    assert parse_json_items(raw) == [{"name": "林远"}]
+    assert parse_json_object('{"title": "标题", "location": "荒') == {
+        "title": "标题"
+    }
+
+
+def test_malformed_value_is_skipped():
+    raw = '{"items": [{"name": "a"}, {"name": nope}, {"name": "b"}]}'
+    assert parse_json_items(raw) == [{"name": "a"}, {"name": "b"}]
+
+
+def test_value_reported_when_it_closes():
+    parser = JSONStreamParser(items_key=None)
+    assert parser.feed('{"title": "飞船') == []
+    assert parser.feed('坠落", "time": ') == [("field", "title", "飞船坠落")]
+    # A number is only complete once something follows it
+    assert parser.feed("30") == []
+    assert parser.feed("50}") == [("field", "time", 3050)]
+    assert parser.complete
+
+
+def test_large_input_streams():
+    items = [{"name": f"角色{i}", "evidence": "他说\"好\"了"} for i in range(5000)]
+    raw = json.dumps({"items": items}, ensure_ascii=False)
+    events = _feed(raw, 4096)
+    assert len(events) == 5000
+    assert events[-1] == ("item", 4999, items[-1])
+
+
+@pytest.mark.asyncio
+async def test_iter_json_events():
+    async def chunks():
+        for part in ['{"a": [1,', ' 2], "b"', ': "x"}', "ignored"]:
+            yield part
+
+    events = [e async for e in iter_json_events(chunks(), items_key=None)]
+    assert events == [("field", "a", [1, 2]), ("field", "b", "x")]
@@ -1,5 +1,6 @@
 """Tests for Knowledge Graph API endpoints."""
 
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -224,6 +225,498 @@ async def test_extract_invalid_chapter(client):
     assert resp.json() == []
 
 
+def test_split_windows_overlap_and_boundaries():
+    from app.services.kg_extraction import split_windows
+
+    scenes = ["短场景。"]
+    assert split_windows(scenes, 100, 10) == ["短场景。"]
+
+    scenes = [
+        "\n\n".join(f"S{s}P{p}。" + "字" * 40 for p in range(4)) for s in range(3)
+    ]
+    windows = split_windows(scenes, 150, 50)
+    assert len(windows) > 3
+    assert all(len(w) <= 150 for w in windows)
+    for prev, nxt in zip(windows, windows[1:]):
+        # Each window repeats the previous window's last paragraph
+        assert nxt.startswith(prev.split("\n\n")[-1])
+    # Every paragraph survives whole in some window
+    for scene in scenes:
+        for para in scene.split("\n\n"):
+            assert any(para in w for w in windows)
+
+    # A paragraph longer than a window is cut at sentence ends
+    windows = split_windows(["甲" * 80 + "。" + "乙" * 80 + "。"], 120, 20)
+    assert windows[0] == "甲" * 80 + "。"
+    assert windows[-1].endswith("乙" * 80 + "。")
+
+
+@pytest.mark.asyncio
+async def test_extract_tolerates_bad_confidence(client):
+    """Non-numeric or out-of-range confidence is defaulted or clamped."""
+    pid, _bid, cid, _sid = await _setup_project_with_chapter(client)
+    items = [
+        {"category": "entity", "label": "Character", "name": "林远",
+         "confidence": "high", "evidence": "林远"},
+        {"category": "entity", "label": "Location", "name": "星辰号",
+         "confidence": 1.7, "evidence": "星辰号"},
+        {"category": "entity", "label": "Item", "name": "罗盘",
+         "confidence": None, "evidence": "罗盘"},
+    ]
+    mock_call = AsyncMock(
+        return_value=_mock_llm_response(json.dumps({"items": items}, ensure_ascii=False))
+    )
+    with patch("app.services.kg_extraction.call_llm", mock_call):
+        resp = await client.post(
+            "/api/kg/extract", json={"chapter_id": cid, "project_id": pid}
+        )
+    assert resp.status_code == 200
+    got = {p["data"]["name"]: (p["confidence"], p["status"]) for p in resp.json()}
+    assert got == {
+        "林远": (0.0, "rejected"),
+        "星辰号": (1.0, "auto_approved"),
+        "罗盘": (0.0, "rejected"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_extract_long_chapter_in_concurrent_windows(client, monkeypatch):
+    """Windows run in parallel (bounded) and their items are merged by name."""
+    import asyncio
+
+    from app.core.config import settings
+
+    pid, _bid, cid, sid = await _setup_project_with_chapter(client)
+    paragraphs = [f"第{i}段：林远与张婷同行。" + "路" * 60 for i in range(12)]
+    await client.post(
+        f"/api/scenes/{sid}/versions",
+        json={"content_md": "\n\n".join(paragraphs), "created_by": "user"},
+    )
+    monkeypatch.setattr(settings, "KG_EXTRACT_WINDOW_CHARS", 200)
+    monkeypatch.setattr(settings, "KG_EXTRACT_OVERLAP_CHARS", 50)
+    monkeypatch.setattr(settings, "KG_EXTRACT_CONCURRENCY", 2)
+
+    running = peak = calls = 0
+
+    async def fake_llm(messages, **kwargs):
+        nonlocal running, peak, calls
+        calls += 1
+        n = calls
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        items = [
+            {"category": "entity", "label": "Character", "name": "林远",
+             "properties": {f"k{n}": n}, "confidence": 0.5 + n / 100,
+             "evidence": f"e{n}"},
+            {"category": "relation", "source": "林远", "target": "张婷",
+             "relation": "travels_with", "confidence": 0.95, "evidence": "同行"},
+        ]
+        if n == 1:
+            items.append({"category": "entity", "label": "Character",
+                          "name": "ＺＨＡＮＧ", "confidence": 0.7, "evidence": "x"})
+        if n == 2:
+            items.append({"category": "entity", "label": "Character",
+                          "name": "zhang", "confidence": 0.8, "evidence": "y"})
+        return _mock_llm_response(json.dumps({"items": items}, ensure_ascii=False))
+
+    with patch("app.services.kg_extraction.call_llm", side_effect=fake_llm):
+        resp = await client.post(
+            "/api/kg/extract", json={"chapter_id": cid, "project_id": pid}
+        )
+    assert resp.status_code == 200
+    assert calls > 3
+    assert peak == 2
+
+    proposals = resp.json()
+    assert len(proposals) == 3
+    by_name = {p["data"].get("name"): p for p in proposals}
+    hero = by_name["林远"]
+    assert hero["confidence"] == pytest.approx(0.5 + calls / 100)
+    assert hero["data"]["properties"] == {f"k{n}": n for n in range(1, calls + 1)}
+    assert hero["evidence_text"].split(" / ") == [f"e{n}" for n in range(1, calls + 1)]
+    # Full-width / case variants collapse; the more confident spelling wins
+    assert by_name["zhang"]["confidence"] == 0.8
+    assert by_name["zhang"]["evidence_text"] == "x / y"
+
+
+@pytest.mark.asyncio
+async def test_extract_reuses_cached_windows(client, monkeypatch):
+    """Unchanged windows are served from the result cache; force bypasses it."""
+    from app.core.config import settings
+
+    pid, _bid, cid, sid = await _setup_project_with_chapter(client)
+    paragraphs = [f"第{i}段：林远巡视星辰号。" + "航" * 60 for i in range(12)]
+
+    async def write(text):
+        await client.post(
+            f"/api/scenes/{sid}/versions",
+            json={"content_md": text, "created_by": "user"},
+        )
+
+    await write("\n\n".join(paragraphs))
+    monkeypatch.setattr(settings, "KG_EXTRACT_WINDOW_CHARS", 200)
+    monkeypatch.setattr(settings, "KG_EXTRACT_OVERLAP_CHARS", 50)
+
+    async def extract(**extra):
+        mock_call = AsyncMock(return_value=_mock_llm_response(MOCK_LLM_RESPONSE))
+        with patch("app.services.kg_extraction.call_llm", mock_call):
+            resp = await client.post(
+                "/api/kg/extract",
+                json={"chapter_id": cid, "project_id": pid, **extra},
+            )
+        assert resp.status_code == 200
+        return resp.json(), mock_call.await_count
+
+    first, first_calls = await extract()
+    assert first_calls > 3
+    again, calls = await extract()
+    assert calls == 0
+    assert [p["id"] for p in again] == [p["id"] for p in first]
+
+    # Only the windows around the edit go back to the LLM
+    await write("\n\n".join(paragraphs[:-1] + ["结尾改写。"]))
+    _, calls = await extract()
+    assert 0 < calls < first_calls
+
+    _, calls = await extract(force=True)
+    assert calls == first_calls
+
+    stats = (await client.get("/api/llm-cache/stats")).json()
+    kinds = {k["kind"]: k for k in stats["kinds"]}
+    extraction = kinds["kg_extraction"]
+    # The unchanged re-run never reached the cache (scene versions matched)
+    assert extraction["hits"] == first_calls - 1
+    assert extraction["misses"] == first_calls + 1 + first_calls
+    assert 0 < stats["hit_rate"] < 1
+
+
+@pytest.mark.asyncio
+async def test_extract_only_changed_scenes(client):
+    """Scenes share a window; items map back to scene versions; stale facts."""
+    pid, _bid, cid, sid1 = await _setup_project_with_chapter(client)
+    resp = await client.post(
+        "/api/scenes", json={"chapter_id": cid, "title": "Scene 2"}
+    )
+    sid2 = resp.json()["id"]
+
+    async def write(sid, text):
+        resp = await client.post(
+            f"/api/scenes/{sid}/versions",
+            json={"content_md": text, "created_by": "user"},
+        )
+        return resp.json()["id"]
+
+    v1 = await write(sid1, "林远登上了星辰号，张婷送行。")
+    v2 = await write(sid2, "张婷在港口等待。")
+
+    def entity(name, confidence=0.75):
+        return {"category": "entity", "label": "Character", "name": name,
+                "confidence": confidence, "evidence": name}
+
+    sent = []
+
+    async def fake_llm(messages, **kwargs):
+        # Names anywhere in the prompt, context included
+        text = messages[-1]["content"]
+        sent.append(text)
+        items = [entity(n) for n in ("林远", "张婷", "港口") if n in text]
+        return _mock_llm_response(json.dumps({"items": items}, ensure_ascii=False))
+
+    async def extract(**extra):
+        with patch("app.services.kg_extraction.call_llm", side_effect=fake_llm):
+            resp = await client.post(
+                "/api/kg/extract",
+                json={"chapter_id": cid, "project_id": pid, **extra},
+            )
+        assert resp.status_code == 200
+        return {p["data"]["name"]: p for p in resp.json()}
+
+    first = await extract()
+    # Both scenes go out in one call
+    assert sent == ["林远登上了星辰号，张婷送行。\n\n张婷在港口等待。"]
+    assert first["张婷"]["source_version_ids"] == sorted([v1, v2])
+    assert first["港口"]["source_version_ids"] == [v2]
+
+    sent.clear()
+    assert (await extract()).keys() == first.keys()
+    assert sent == []
+
+    # Scene 1 drops 张婷; scene 2 still mentions her. Only scene 1 is
+    # extracted; names seen only in scene 2's context are not credited to it
+    sent.clear()
+    v3 = await write(sid1, "林远独自离开。")
+    second = await extract()
+    assert sent == ["林远独自离开。\n\n<context>\n张婷在港口等待。\n</context>"]
+    assert {name: p["id"] for name, p in second.items()} == {
+        name: p["id"] for name, p in first.items()
+    }
+    assert second["林远"]["source_version_ids"] == [v3]
+    assert second["张婷"]["source_version_ids"] == [v2]
+
+    # Scene 2 rewritten to something without 港口 or 张婷
+    await write(sid2, "空白。")
+    third = await extract()
+    assert set(third) == {"林远"}
+    resp = await client.get(
+        "/api/kg/proposals",
+        params={"project_id": pid, "include_stale": True},
+    )
+    stale = {p["data"]["name"] for p in resp.json() if p["stale"]}
+    assert stale == {"张婷", "港口"}
+
+    # Restoring the text revives the stale proposals instead of duplicating
+    await write(sid2, "张婷在港口等待。")
+    fourth = await extract()
+    assert fourth["港口"]["id"] == first["港口"]["id"]
+    resp = await client.get("/api/kg/proposals", params={"project_id": pid})
+    assert len(resp.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_extract_sends_only_edited_scene(client, monkeypatch):
+    """Editing one scene of a short chapter sends that scene, not the chapter."""
+    from app.core.config import settings
+    from app.services.kg_extraction import pack_windows
+
+    pid, _bid, cid, sid = await _setup_project_with_chapter(client)
+    sids = [sid]
+    for n in range(3):
+        resp = await client.post(
+            "/api/scenes", json={"chapter_id": cid, "title": f"S{n}"}
+        )
+        sids.append(resp.json()["id"])
+    texts = [f"角色{n}在第{n}个地点。" for n in range(4)]
+    for scene_id, text in zip(sids, texts):
+        await client.post(
+            f"/api/scenes/{scene_id}/versions", json={"content_md": text}
+        )
+    # Short scenes share windows
+    assert [[i for i, _ in w] for w in pack_windows(texts, 30, 0)] == [[0, 1], [2, 3]]
+
+    sent = []
+
+    async def fake_llm(messages, **kwargs):
+        sent.append(messages[-1]["content"])
+        return _mock_llm_response(json.dumps({"items": []}))
+
+    async def extract():
+        sent.clear()
+        with patch("app.services.kg_extraction.call_llm", side_effect=fake_llm):
+            resp = await client.post(
+                "/api/kg/extract", json={"chapter_id": cid, "project_id": pid}
+            )
+        assert resp.status_code == 200
+
+    async def edit(text):
+        await client.post(
+            f"/api/scenes/{sids[2]}/versions", json={"content_md": text}
+        )
+
+    # The whole chapter fits one window: the first run sends it once
+    await extract()
+    assert sent == ["\n\n".join(texts)]
+
+    monkeypatch.setattr(settings, "KG_EXTRACT_CONTEXT_CHARS", 0)
+    await edit("角色2离开了。")
+    await extract()
+    assert sent == ["角色2离开了。"]
+
+    # With context: a bounded slice of each neighbour, marked as such
+    monkeypatch.setattr(settings, "KG_EXTRACT_CONTEXT_CHARS", 4)
+    await edit("角色2回来了。")
+    await extract()
+    assert sent == [
+        f"<context>\n{texts[1][-4:]}\n</context>\n\n角色2回来了。"
+        f"\n\n<context>\n{texts[3][:4]}\n</context>"
+    ]
+
+
+# ==================== Whole-book extraction jobs ====================
+
+
+async def _setup_book(client, chapters: int):
+    resp = await client.post("/api/projects", json={"title": "KG Job"})
+    pid = resp.json()["id"]
+    resp = await client.post("/api/books", json={"project_id": pid, "title": "Book"})
+    bid = resp.json()["id"]
+    for n in range(chapters):
+        resp = await client.post(
+            "/api/chapters", json={"book_id": bid, "title": f"Chapter {n}"}
+        )
+        resp = await client.post(
+            "/api/scenes", json={"chapter_id": resp.json()["id"], "title": "Scene"}
+        )
+        await client.post(
+            f"/api/scenes/{resp.json()['id']}/versions",
+            json={"content_md": f"角色{n}登场。", "created_by": "user"},
+        )
+    return pid, bid
+
+
+def _fake_chapter_llm(sent: list):
+    async def fake_llm(messages, **kwargs):
+        text = messages[-1]["content"]
+        sent.append(text)
+        await asyncio.sleep(0.01)
+        item = {"category": "entity", "label": "Character", "name": text[:3],
+                "confidence": 0.95, "evidence": text}
+        return _mock_llm_response(json.dumps({"items": [item]}, ensure_ascii=False))
+
+    return fake_llm
+
+
+@pytest.mark.asyncio
+async def test_book_extraction_job(client, db_session, monkeypatch):
+    """A job extracts every chapter through the pool and reports progress."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from app.core.config import settings
+    from app.services.kg_jobs import job_task, watch_job
+
+    monkeypatch.setattr(settings, "KG_JOB_CONCURRENCY", 2)
+    pid, bid = await _setup_book(client, 3)
+    sent: list[str] = []
+
+    with patch("app.services.kg_extraction.call_llm", side_effect=_fake_chapter_llm(sent)):
+        resp = await client.post(f"/api/kg/books/{bid}/extract-job")
+        assert resp.status_code == 202
+        job_id = resp.json()["id"]
+        assert resp.json()["total"] == 3
+
+        # Starting again while it runs returns the same job
+        resp = await client.post(f"/api/kg/books/{bid}/extract-job")
+        assert resp.json()["id"] == job_id
+
+        factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        events = [e async for e in watch_job(job_id, factory)]
+
+    assert sorted(sent) == [f"角色{n}登场。" for n in range(3)]
+    # Snapshot, one event per chapter finished after it, then the end
+    snapshot, chapters, final = events[0], events[1:-1], events[-1]
+    assert snapshot["total"] == 3
+    assert snapshot["done"] + len(chapters) == 3
+    assert all(e["chapter"]["status"] == "done" for e in chapters)
+    assert (final["status"], final["done"]) == ("done", 3)
+
+    resp = await client.get(f"/api/kg/jobs/{job_id}")
+    job = resp.json()
+    assert (job["status"], job["done"], job["failed"]) == ("done", 3, 0)
+    assert [c["proposals"] for c in job["chapters"]] == [1, 1, 1]
+    resp = await client.get("/api/kg/nodes", params={"project_id": pid})
+    assert sorted(n["name"] for n in resp.json()) == ["角色0", "角色1", "角色2"]
+
+    # A finished job streams its final state and ends
+    resp = await client.get(f"/api/kg/jobs/{job_id}/events")
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    lines = [line for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert len(lines) == 1 and json.loads(lines[0][6:])["status"] == "done"
+
+    # A second run finds every scene already extracted
+    sent.clear()
+    with patch("app.services.kg_extraction.call_llm", side_effect=_fake_chapter_llm(sent)):
+        resp = await client.post(f"/api/kg/books/{bid}/extract-job")
+        second = resp.json()["id"]
+        assert second != job_id
+        await job_task(second)
+    assert sent == []
+
+
+@pytest.mark.asyncio
+async def test_extraction_job_resumes(client, db_session):
+    """A restarted job skips finished chapters and redoes interrupted ones."""
+    from sqlalchemy import update
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from app.models import KGExtractionJob, KGExtractionJobChapter
+    from app.services.kg_jobs import create_book_job, get_job_chapters, job_task, resume_jobs
+
+    _pid, bid = await _setup_book(client, 3)
+    job = await create_book_job(db_session, bid)
+    rows = await get_job_chapters(db_session, job.id)
+    # As left by a crash: chapter 0 finished, chapter 1 in flight
+    await db_session.execute(
+        update(KGExtractionJobChapter)
+        .where(KGExtractionJobChapter.id == rows[0].id)
+        .values(status="done", proposals=7)
+    )
+    await db_session.execute(
+        update(KGExtractionJobChapter)
+        .where(KGExtractionJobChapter.id == rows[1].id)
+        .values(status="running")
+    )
+    await db_session.execute(
+        update(KGExtractionJob).where(KGExtractionJob.id == job.id).values(status="running")
+    )
+    await db_session.commit()
+
+    sent: list[str] = []
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    with patch("app.services.kg_extraction.call_llm", side_effect=_fake_chapter_llm(sent)):
+        assert await resume_jobs(factory) == [job.id]
+        await job_task(job.id)
+
+    assert sorted(sent) == ["角色1登场。", "角色2登场。"]
+    job_out = (await client.get(f"/api/kg/jobs/{job.id}")).json()
+    assert job_out["status"] == "done"
+    assert [(c["status"], c["proposals"]) for c in job_out["chapters"]] == [
+        ("done", 7), ("done", 1), ("done", 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_extraction_job_partial_and_retry(client, db_session):
+    """Failed chapters end the job as partial; retry reruns only those."""
+    from app.services.kg_jobs import job_task
+
+    _pid, bid = await _setup_book(client, 3)
+    sent: list[str] = []
+    ok = _fake_chapter_llm(sent)
+
+    async def flaky_llm(messages, **kwargs):
+        if "角色1" in messages[-1]["content"]:
+            raise RuntimeError("provider down")
+        return await ok(messages, **kwargs)
+
+    with patch("app.services.kg_extraction.call_llm", side_effect=flaky_llm):
+        job_id = (await client.post(f"/api/kg/books/{bid}/extract-job")).json()["id"]
+        await job_task(job_id)
+    job = (await client.get(f"/api/kg/jobs/{job_id}")).json()
+    assert (job["status"], job["done"], job["failed"]) == ("partial", 2, 1)
+    assert job["chapters"][1]["error"] == "1 scene(s) failed to extract"
+
+    sent.clear()
+    with patch("app.services.kg_extraction.call_llm", side_effect=ok):
+        resp = await client.post(f"/api/kg/jobs/{job_id}/retry")
+        assert resp.status_code == 202
+        assert (resp.json()["pending"], resp.json()["done"]) == (1, 2)
+        await job_task(job_id)
+    assert sent == ["角色1登场。"]
+    job = (await client.get(f"/api/kg/jobs/{job_id}")).json()
+    assert (job["status"], job["done"], job["failed"]) == ("done", 3, 0)
+    assert [c["error"] for c in job["chapters"]] == ["", "", ""]
+
+    # Nothing left to retry
+    resp = await client.post(f"/api/kg/jobs/{job_id}/retry")
+    assert resp.status_code == 400
+    assert (await client.post("/api/kg/jobs/9999/retry")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_extraction_job_all_chapters_failed(client, db_session):
+    from app.services.kg_jobs import job_task
+
+    _pid, bid = await _setup_book(client, 2)
+    with patch(
+        "app.services.kg_extraction.call_llm", side_effect=RuntimeError("down")
+    ):
+        job_id = (await client.post(f"/api/kg/books/{bid}/extract-job")).json()["id"]
+        await job_task(job_id)
+    job = (await client.get(f"/api/kg/jobs/{job_id}")).json()
+    assert (job["status"], job["failed"]) == ("failed", 2)
+
+
 # ==================== Proposals CRUD ====================
 
 
@@ -551,3 +1044,548 @@ async def test_node_upsert(client):
     names = [n["name"] for n in chars]
     # "林远" should appear only once (upsert)
     assert names.count("林远") == 1
+
+
+# ==================== Batch graph writes ====================
+
+
+@pytest.mark.asyncio
+async def test_batch_upserts_return_ids_in_input_order(client, db_session):
+    """upsert_nodes / ensure_nodes / upsert_edges dedupe and keep order."""
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+
+    ids = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": "甲", "properties": {"v": 1}},
+        {"label": "Character", "name": "乙"},
+        {"label": "Character", "name": "甲", "properties": {"v": 2}},
+    ])
+    assert ids[0] == ids[2] != ids[1]
+    again = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": "乙", "properties": {"v": 3}},
+    ])
+    assert again == [ids[1]]
+
+    ensured = await graph.ensure_nodes(pid, ["丙", "甲", "丙"], "Concept")
+    assert ensured[1] == ids[0]
+    assert ensured[0] == ensured[2] not in ids
+
+    edge_ids = await graph.upsert_edges(pid, [
+        {"source_id": ids[0], "target_id": ids[1], "relation": "knows"},
+        {"source_id": ids[1], "target_id": ids[0], "relation": "knows"},
+        {"source_id": ids[0], "target_id": ids[1], "relation": "knows",
+         "properties": {"since": "ch1"}},
+    ])
+    assert edge_ids[0] == edge_ids[2] != edge_ids[1]
+
+    nodes = {n["name"]: n for n in
+             (await client.get(f"/api/kg/nodes?project_id={pid}")).json()}
+    assert nodes["甲"]["properties"] == {"v": 2}
+    assert nodes["乙"]["properties"] == {"v": 3}
+    assert nodes["丙"]["label"] == "Concept"
+    edges = (await client.get(f"/api/kg/edges?project_id={pid}")).json()
+    assert len(edges) == 2
+    assert {"since": "ch1"} in [e["properties"] for e in edges]
+
+
+@pytest.mark.asyncio
+async def test_bulk_approve_batches_graph_writes(client, db_session):
+    """Approving many relations costs a constant number of statements."""
+    from app.core.profiling import Probe
+    from app.models.tables import KGProposal
+
+    pid, _bid, cid, _sid = await _setup_project_with_chapter(client)
+
+    async def _pending(n: int) -> list[int]:
+        proposals = [
+            KGProposal(
+                project_id=pid, chapter_id=cid, category="relation", confidence=0.7,
+                status="pending", evidence_text="", evidence_location="",
+                data_json=json.dumps({
+                    "source": f"人物{i}", "target": f"人物{i + 1}",
+                    "relation": "knows",
+                }, ensure_ascii=False),
+            )
+            for i in range(n)
+        ]
+        db_session.add_all(proposals)
+        await db_session.flush()
+        return [p.id for p in proposals]
+
+    counts = []
+    for n in (5, 50):
+        ids = await _pending(n)
+        with Probe() as probe:
+            resp = await client.post(
+                f"/api/kg/proposals/bulk-approve?project_id={pid}",
+                json={"ids": ids},
+            )
+        assert resp.status_code == 200
+        assert {p["status"] for p in resp.json()} == {"user_approved"}
+        counts.append(probe.sql_count)
+    assert counts[0] == counts[1]
+
+    edges = (await client.get(f"/api/kg/edges?project_id={pid}")).json()
+    assert len(edges) == 50
+
+
+# ==================== Graph snapshot traversal ====================
+
+
+async def _chain_graph(client, db_session):
+    """A -knows-> B -knows-> C -owns-> D, plus A -owns-> D and isolated E."""
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    a, b, c, d, e = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": n} for n in "ABCDE"
+    ])
+    await graph.upsert_edges(pid, [
+        {"source_id": a, "target_id": b, "relation": "knows"},
+        {"source_id": b, "target_id": c, "relation": "knows"},
+        {"source_id": c, "target_id": d, "relation": "owns"},
+        {"source_id": a, "target_id": d, "relation": "owns"},
+    ])
+    return pid, graph, (a, b, c, d, e)
+
+
+@pytest.mark.asyncio
+async def test_graph_neighborhood(client, db_session):
+    pid, _graph, (a, b, c, d, _e) = await _chain_graph(client, db_session)
+
+    resp = await client.get(
+        f"/api/kg/graph/neighborhood?project_id={pid}&node_id={b}&hops=1"
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {n["id"]: n["distance"] for n in data["nodes"]} == {b: 0, a: 1, c: 1}
+    assert {(e["source_node_id"], e["target_node_id"]) for e in data["edges"]} == {
+        (a, b), (b, c),
+    }
+
+    resp = await client.get(
+        f"/api/kg/graph/neighborhood?project_id={pid}&node_id={b}"
+        "&hops=3&relation=knows&direction=out"
+    )
+    assert [n["id"] for n in resp.json()["nodes"]] == [b, c]
+
+    resp = await client.get(
+        f"/api/kg/graph/neighborhood?project_id={pid}&node_id=99999"
+    )
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_graph_shortest_path(client, db_session):
+    pid, _graph, (a, b, c, d, e) = await _chain_graph(client, db_session)
+
+    resp = await client.get(
+        f"/api/kg/graph/path?project_id={pid}&source_id={b}&target_id={d}"
+    )
+    data = resp.json()
+    assert data["found"] and data["hops"] == 2
+    assert [n["id"] for n in data["nodes"]] in ([b, a, d], [b, c, d])
+
+    # Following edge direction only: B -> C -> D
+    resp = await client.get(
+        f"/api/kg/graph/path?project_id={pid}&source_id={b}&target_id={d}"
+        "&direction=out"
+    )
+    data = resp.json()
+    assert [n["id"] for n in data["nodes"]] == [b, c, d]
+    assert [x["relation"] for x in data["edges"]] == ["knows", "owns"]
+
+    resp = await client.get(
+        f"/api/kg/graph/path?project_id={pid}&source_id={d}&target_id={a}"
+        "&relation=knows"
+    )
+    assert resp.json()["found"] is False
+    resp = await client.get(
+        f"/api/kg/graph/path?project_id={pid}&source_id={a}&target_id={e}"
+    )
+    assert resp.json() == {"found": False, "hops": None, "nodes": [], "edges": []}
+
+
+@pytest.mark.asyncio
+async def test_graph_degree_filter_and_incremental_refresh(client, db_session):
+    from app.services.graph_snapshot import get_graph_snapshot
+
+    pid, graph, (a, b, c, d, e) = await _chain_graph(client, db_session)
+
+    resp = await client.get(f"/api/kg/graph/nodes?project_id={pid}&min_degree=2")
+    assert [(n["id"], n["degree"]) for n in resp.json()] == [
+        (a, 2), (b, 2), (c, 2), (d, 2),
+    ]
+    resp = await client.get(
+        f"/api/kg/graph/nodes?project_id={pid}&relation=owns&direction=in&min_degree=1"
+    )
+    assert [(n["id"], n["in_degree"]) for n in resp.json()] == [(d, 2)]
+
+    # Appended rows extend the cached snapshot instead of rebuilding it
+    before = await get_graph_snapshot(db_session, pid)
+    (f,) = await graph.upsert_nodes(pid, [{"label": "Item", "name": "F"}])
+    await graph.upsert_edges(pid, [{"source_id": e, "target_id": f, "relation": "owns"}])
+    after = await get_graph_snapshot(db_session, pid)
+    assert after is before
+    path = after.shortest_path(e, f)
+    assert path["hops"] == 1
+
+    # Deletes force a rebuild
+    await graph.delete_node(f)
+    rebuilt = await get_graph_snapshot(db_session, pid)
+    assert rebuilt is not before
+    assert f not in rebuilt.index
+
+
+@pytest.mark.asyncio
+async def test_graph_caches_dropped_on_rollback(client, db_session):
+    """Snapshots and name indexes built from rolled-back rows are not reused."""
+    from app.services.graph_service import SQLiteGraphAdapter
+    from app.services.graph_snapshot import get_graph_snapshot
+    from app.services.kg_names import get_name_index
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    (a,) = await graph.upsert_nodes(pid, [{"label": "Character", "name": "甲"}])
+    await db_session.commit()
+
+    (b,) = await graph.upsert_nodes(pid, [{"label": "Character", "name": "乙"}])
+    assert (await get_graph_snapshot(db_session, pid)).names == ["甲", "乙"]
+    assert (await get_name_index(db_session, pid)).resolve("乙") == b
+    await db_session.rollback()
+
+    # Same count and max id as the discarded state
+    (c,) = await graph.upsert_nodes(pid, [{"label": "Character", "name": "丙"}])
+    assert c == b
+    assert (await get_graph_snapshot(db_session, pid)).names == ["甲", "丙"]
+    index = await get_name_index(db_session, pid)
+    assert (index.resolve("乙"), index.resolve("丙")) == (None, c)
+    assert index.resolve("甲") == a
+
+
+# ==================== Keyset pagination ====================
+
+
+@pytest.mark.asyncio
+async def test_nodes_and_edges_keyset_pagination(client, db_session):
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    ids = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": f"N{i}", "properties": {"i": i}}
+        for i in range(7)
+    ])
+    await graph.upsert_edges(pid, [
+        {"source_id": ids[i], "target_id": ids[i + 1], "relation": "next"}
+        for i in range(6)
+    ])
+
+    seen, cursor = [], None
+    while True:
+        url = f"/api/kg/nodes?project_id={pid}&limit=3&include_payload=false"
+        if cursor:
+            url += f"&cursor={cursor}"
+        resp = await client.get(url)
+        assert resp.headers["X-Total-Count"] == "7"
+        page = resp.json()
+        assert all("properties" not in n for n in page)
+        seen += [n["id"] for n in page]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == sorted(ids)
+
+    resp = await client.get(f"/api/kg/edges?project_id={pid}&node_id={ids[3]}&limit=1")
+    assert resp.headers["X-Total-Count"] == "2"
+    assert resp.json()[0]["properties"] == {}
+    resp = await client.get(
+        f"/api/kg/edges?project_id={pid}&node_id={ids[3]}"
+        f"&cursor={resp.headers['X-Next-Cursor']}"
+    )
+    assert len(resp.json()) == 1
+
+    # Unpaginated legacy response still carries the payload
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}")
+    assert len(resp.json()) == 7
+    assert resp.json()[0]["properties"] == {"i": 0}
+
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}&cursor=not-a-cursor")
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_proposals_keyset_pagination(client, db_session):
+    """Pages follow (confidence desc, id) across equal confidences."""
+    from app.models.tables import KGProposal
+
+    pid, _bid, cid, _sid = await _setup_project_with_chapter(client)
+    confidences = [0.9, 0.7, 0.7, 0.7, 0.5, 0.95, 0.7]
+    db_session.add_all([
+        KGProposal(
+            project_id=pid, chapter_id=cid, category="entity",
+            data_json=json.dumps({"name": f"E{i}"}), confidence=c,
+            status="pending", evidence_text="", evidence_location="",
+        )
+        for i, c in enumerate(confidences)
+    ])
+    await db_session.flush()
+
+    full = (await client.get(f"/api/kg/proposals?project_id={pid}")).json()
+    paged, cursor = [], None
+    while True:
+        url = f"/api/kg/proposals?project_id={pid}&status=pending&limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        resp = await client.get(url)
+        assert resp.headers["X-Total-Count"] == "7"
+        paged += resp.json()
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [p["id"] for p in paged] == [p["id"] for p in full]
+    assert [p["confidence"] for p in paged] == sorted(confidences, reverse=True)
+
+    resp = await client.get(
+        f"/api/kg/proposals?project_id={pid}&include_payload=false"
+    )
+    assert "data" not in resp.json()[0]
+    assert resp.json()[0]["reviewed_at"] is None
+
+
+# ==================== Name resolution ====================
+
+
+def test_normalize_name():
+    from app.services.kg_names import normalize_name
+
+    assert normalize_name("林 远") == normalize_name("林远")
+    assert normalize_name("ＡＢＣ") == normalize_name("abc")
+    assert normalize_name("  Harry \t Potter ") == "harry potter"
+
+
+@pytest.mark.asyncio
+async def test_variant_names_resolve_to_one_node(client, db_session):
+    """Width/case/spacing variants and aliases hit the existing node."""
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+
+    (ship,) = await graph.upsert_nodes(
+        pid, [{"label": "Item", "name": "Star Ship", "properties": {"v": 1}}]
+    )
+    ids = await graph.ensure_nodes(
+        pid, ["ＳＴＡＲ  ｓｈｉｐ", "林 远", "林远", "star ship"], "Concept"
+    )
+    assert ids[0] == ids[3] == ship
+    assert ids[1] == ids[2] != ship
+
+    # Same label + variant spelling updates the node instead of adding one
+    again = await graph.upsert_nodes(
+        pid, [{"label": "Item", "name": "STAR SHIP", "properties": {"v": 2}}]
+    )
+    assert again == [ship]
+    nodes = (await client.get(f"/api/kg/nodes?project_id={pid}")).json()
+    assert len(nodes) == 2
+    assert next(n for n in nodes if n["id"] == ship)["properties"] == {"v": 2}
+
+    resp = await client.post(
+        f"/api/kg/nodes/{ship}/aliases?project_id={pid}",
+        json={"aliases": ["星辰号", "Star Ship"]},
+    )
+    assert [a["alias"] for a in resp.json()] == ["星辰号"]
+    assert await graph.ensure_nodes(pid, ["星辰号"], "Concept") == [ship]
+
+    resp = await client.get(f"/api/kg/resolve?project_id={pid}&name=星辰号")
+    assert resp.json()["name"] == "Star Ship"
+    resp = await client.get(
+        f"/api/kg/resolve?project_id={pid}&name=星辰号&label=Character"
+    )
+    assert resp.status_code == 404
+
+
+# ==================== Node merge ====================
+
+
+@pytest.mark.asyncio
+async def test_merge_nodes_rewires_and_dedupes_edges(client, db_session):
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    full, short, baoyu, garden = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": "林黛玉", "properties": {"home": "潇湘馆"}},
+        {"label": "Character", "name": "黛玉", "properties": {"home": "?", "age": 12}},
+        {"label": "Character", "name": "贾宝玉"},
+        {"label": "Location", "name": "大观园"},
+    ])
+    await graph.upsert_edges(pid, [
+        {"source_id": full, "target_id": baoyu, "relation": "loves",
+         "properties": {"since": "ch3"}},
+        {"source_id": short, "target_id": baoyu, "relation": "loves",
+         "properties": {"since": "ch5", "note": "x"}},
+        {"source_id": short, "target_id": garden, "relation": "lives_in"},
+        {"source_id": baoyu, "target_id": short, "relation": "loves"},
+        {"source_id": short, "target_id": full, "relation": "same_as"},
+    ])
+    # Load stale ORM copies into the session to be sure they are dropped
+    await client.get(f"/api/kg/edges?project_id={pid}")
+
+    resp = await client.post(
+        f"/api/kg/nodes/{full}/merge?project_id={pid}",
+        json={"source_ids": [short]},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["merged"] == 1
+    assert data["edges_merged"] == 1
+    assert data["edges_dropped"] == 1
+    assert data["node"]["properties"] == {"home": "潇湘馆", "age": 12}
+    assert [a["alias"] for a in data["aliases"]] == ["黛玉"]
+
+    edges = (await client.get(f"/api/kg/edges?project_id={pid}")).json()
+    keys = {(e["source_node_id"], e["target_node_id"], e["relation"]): e for e in edges}
+    assert set(keys) == {
+        (full, baoyu, "loves"), (full, garden, "lives_in"), (baoyu, full, "loves"),
+    }
+    assert keys[(full, baoyu, "loves")]["properties"] == {"since": "ch3", "note": "x"}
+
+    nodes = (await client.get(f"/api/kg/nodes?project_id={pid}")).json()
+    assert short not in [n["id"] for n in nodes]
+    assert await graph.ensure_nodes(pid, ["黛玉"], "Concept") == [full]
+    path = await graph.shortest_path(pid, garden, baoyu)
+    assert path["hops"] == 2
+
+
+@pytest.mark.asyncio
+async def test_merge_nodes_drops_source_metrics(client, db_session):
+    """Merged-away nodes leave no metric rows; the analytics stamp moves."""
+    from sqlalchemy import func, select
+
+    from app.models import KGNodeMetric
+    from app.services.graph_service import SQLiteGraphAdapter
+    from app.services.graph_snapshot import graph_stamp
+    from app.services.kg_analytics import ensure_node_metrics
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    a, b, c = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": n} for n in ["甲", "乙", "丙"]
+    ])
+    await graph.upsert_edges(pid, [
+        {"source_id": b, "target_id": c, "relation": "knows"},
+    ])
+    await ensure_node_metrics(db_session, pid)
+    stamp = await graph_stamp(db_session, pid)
+
+    await graph.merge_nodes(pid, a, [b])
+    rows = await db_session.execute(select(KGNodeMetric.node_id))
+    assert sorted(rows.scalars().all()) == [a, c]
+    assert await graph.count_ranked_nodes(pid) == 2
+    assert await graph_stamp(db_session, pid) != stamp
+    assert await ensure_node_metrics(db_session, pid)
+
+    await graph.delete_node(c)
+    count = await db_session.execute(select(func.count()).select_from(KGNodeMetric))
+    assert count.scalar() == 1
+
+
+@pytest.mark.asyncio
+async def test_merge_nodes_validation(client, db_session):
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    (a,) = await SQLiteGraphAdapter(db_session).upsert_nodes(
+        pid, [{"label": "Character", "name": "A"}]
+    )
+    resp = await client.post(
+        f"/api/kg/nodes/{a}/merge?project_id={pid}", json={"source_ids": [99999]}
+    )
+    assert resp.status_code == 400
+    resp = await client.post(
+        f"/api/kg/nodes/99999/merge?project_id={pid}", json={"source_ids": [a]}
+    )
+    assert resp.status_code == 404
+
+
+# ==================== Graph analytics ====================
+
+
+def test_pagerank_and_label_propagation():
+    import numpy as np
+
+    from app.services.kg_analytics import label_propagation, pagerank
+
+    # Two 4-cliques (0-3, 4-7) joined by one edge 3-4; node 0 also has 3 leaves
+    edges = [(i, j) for i in range(4) for j in range(i + 1, 4)]
+    edges += [(i, j) for i in range(4, 8) for j in range(i + 1, 8)]
+    edges += [(3, 4), (0, 8), (0, 9), (0, 10)]
+    src = np.array([s for s, _ in edges])
+    tgt = np.array([t for _, t in edges])
+
+    ranks, iterations = pagerank(11, src, tgt)
+    assert abs(ranks.sum() - 1) < 1e-9
+    assert int(ranks.argmax()) == 0
+    assert 1 < iterations < 100
+    # A warm start from the answer converges at once
+    _, warm_iterations = pagerank(11, src, tgt, ranks)
+    assert warm_iterations <= 2
+
+    labels, _ = label_propagation(11, src, tgt)
+    assert len(set(labels[:4])) == 1 and len(set(labels[4:8])) == 1
+    assert labels[0] != labels[4]
+    assert set(labels[8:]) == {labels[0]}
+
+
+@pytest.mark.asyncio
+async def test_nodes_sorted_and_filtered_by_metrics(client, db_session):
+    from app.services.graph_service import SQLiteGraphAdapter
+
+    pid = (await client.post("/api/projects", json={"title": "G"})).json()["id"]
+    graph = SQLiteGraphAdapter(db_session)
+    hub, *spokes = await graph.upsert_nodes(pid, [
+        {"label": "Character", "name": n} for n in ["Hub", "S1", "S2", "S3"]
+    ])
+    x, y = await graph.upsert_nodes(pid, [
+        {"label": "Item", "name": "X"}, {"label": "Item", "name": "Y"},
+    ])
+    await graph.upsert_edges(pid, [
+        *({"source_id": hub, "target_id": s, "relation": "knows"} for s in spokes),
+        {"source_id": x, "target_id": y, "relation": "near"},
+    ])
+
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}&sort=pagerank&limit=2")
+    assert resp.status_code == 200
+    page = resp.json()
+    assert resp.headers["X-Total-Count"] == "6"
+    assert page[0]["id"] == hub and page[0]["degree"] == 3
+    assert page[0]["community"] == hub
+    seen = [n["id"] for n in page]
+    while cursor := resp.headers.get("X-Next-Cursor"):
+        resp = await client.get(
+            f"/api/kg/nodes?project_id={pid}&sort=pagerank&limit=2&cursor={cursor}"
+        )
+        seen += [n["id"] for n in resp.json()]
+    assert sorted(seen) == sorted([hub, *spokes, x, y])
+
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}&community={x}")
+    assert [n["id"] for n in resp.json()] == [x, y]
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}")
+    assert "pagerank" not in resp.json()[0]
+
+    # Writes make the stored metrics stale; the next ranked read refreshes them
+    (z,) = await graph.upsert_nodes(pid, [{"label": "Item", "name": "Z"}])
+    await graph.upsert_edges(pid, [
+        {"source_id": y, "target_id": n, "relation": "near"} for n in (z, hub, *spokes)
+    ])
+    resp = await client.get(f"/api/kg/nodes?project_id={pid}&sort=degree&limit=1")
+    assert resp.json()[0]["id"] == y
+    assert resp.json()[0]["degree"] == 6
+
+    resp = await client.post(f"/api/kg/analytics/recompute?project_id={pid}")
+    data = resp.json()
+    assert (data["nodes"], data["edges"]) == (7, 9)
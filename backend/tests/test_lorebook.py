@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from app.services.lorebook import match_triggers
@@ -252,6 +254,271 @@ def test_trigger_match_case_insensitive():
     assert match_triggers(entry, "THE DRAGON BREATHES FIRE") is True
 
 
+# ==================== Compiled Matcher ====================
+
+
+def test_aho_corasick_overlapping_patterns():
+    from app.services.trigger_matcher import AhoCorasick
+
+    ac = AhoCorasick(["he", "she", "his", "hers", "张三", "三丰"])
+    found = {ac.patterns[i] for i in ac.find("ushers 张三丰")}
+    assert found == {"he", "she", "hers", "张三", "三丰"}
+    assert ac.find("") == set()
+
+
+def test_trigger_matcher_agrees_with_match_triggers():
+    import json
+    import random
+
+    from app.services.trigger_matcher import TriggerMatcher
+
+    rng = random.Random(7)
+    vocab = ["张三", "老张", "魔法", "咒语", "Dragon", "fire", "城堡", "剑", "三"]
+    specs = []
+    for i in range(60):
+        specs.append(dict(
+            title=rng.choice(vocab + ["无关"]),
+            aliases=rng.sample(vocab, rng.randint(0, 2)),
+            triggers={
+                "keywords": rng.sample(vocab, rng.randint(0, 2)),
+                "and_keywords": rng.sample(vocab, rng.randint(0, 2)),
+            },
+        ))
+    matcher = TriggerMatcher(
+        (i, sp["title"], json.dumps(sp["aliases"]), json.dumps(sp["triggers"]), False)
+        for i, sp in enumerate(specs)
+    )
+    for _ in range(50):
+        text = "".join(rng.sample(vocab, rng.randint(0, 4))).upper()
+        expected = [
+            i for i, sp in enumerate(specs)
+            if match_triggers(_make_entry(**sp), text)
+        ]
+        assert matcher.match(text) == expected
+
+
+def test_streaming_match_catches_split_keywords():
+    import json
+
+    from app.services.trigger_matcher import TriggerMatcher
+
+    rows = [
+        (1, "张三丰", "[]", json.dumps({"keywords": []}), False),
+        (2, "NoMatch", "[]", json.dumps(
+            {"keywords": ["dragon"], "and_keywords": ["fire"]}), False),
+        (3, "城堡", "[]", "{}", False),
+    ]
+    matcher = TriggerMatcher(rows)
+    watch = matcher.stream(already=[3])
+
+    assert watch.feed("他是张") == []
+    assert watch.feed("三丰。The DRA") == [1]
+    assert watch.feed("GON breathes") == []  # AND keyword still missing
+    assert watch.feed(" fi") == []
+    assert watch.feed("re at the 城堡") == [2]  # 3 was already active
+    assert watch.triggered == [1, 2, 3]
+    assert watch.activated == [1, 2]
+
+    text = "他是张三丰。The DRAGON breathes fire at the 城堡"
+    assert sorted(watch.triggered) == matcher.match(text)
+
+
+@pytest.mark.asyncio
+async def test_trigger_matcher_cached_until_lore_changes(client, db_session):
+    from app.services.lorebook import get_trigger_matcher
+
+    resp = await client.post("/api/projects", json={"title": "Matcher"})
+    pid = resp.json()["id"]
+    await client.post("/api/lore", json={"project_id": pid, "title": "张三"})
+
+    m1 = await get_trigger_matcher(db_session, pid)
+    assert await get_trigger_matcher(db_session, pid) is m1
+    assert len(m1) == 1
+
+    resp = await client.post("/api/lore", json={"project_id": pid, "title": "李四"})
+    m2 = await get_trigger_matcher(db_session, pid)
+    assert m2 is not m1
+    assert len(m2) == 2
+
+    await client.delete(f"/api/lore/{resp.json()['id']}")
+    assert len(await get_trigger_matcher(db_session, pid)) == 1
+
+    # A matcher built from a write that was rolled back is not reused
+    from sqlalchemy import select
+
+    from app.models import LoreEntry
+
+    entry = (
+        await db_session.execute(select(LoreEntry).where(LoreEntry.project_id == pid))
+    ).scalar_one()
+    entry.title = "王五"
+    await db_session.flush()
+    assert list((await get_trigger_matcher(db_session, pid)).titles.values()) == ["王五"]
+    await db_session.rollback()
+    assert list((await get_trigger_matcher(db_session, pid)).titles.values()) == ["张三"]
+
+
+# ==================== Knapsack Selection ====================
+
+
+def _lore(id, priority, size, locked=False):
+    from types import SimpleNamespace
+
+    entry = SimpleNamespace(
+        id=id, title=f"E{id}", priority=priority, locked=locked
+    )
+    return entry, "x" * size
+
+
+def _knapsack(specs, budget):
+    from app.services.lorebook import _select_knapsack
+    from app.services.text_utils import CHARS
+
+    entries, blocks = zip(*(_lore(*spec) for spec in specs))
+    return _select_knapsack(list(entries), list(blocks), budget, CHARS)
+
+
+def test_knapsack_skips_misfit_and_keeps_filling():
+    # (id, priority, size): the big top entry does not fit, smaller ones do
+    parts, excluded = _knapsack(
+        [(1, 10, 900), (2, 8, 200), (3, 7, 200), (4, 6, 200)], 700
+    )
+    assert len(parts) == 3
+    assert excluded == [{"id": 1, "title": "E1", "reason": "over_budget"}]
+
+
+def test_knapsack_prefers_value_density():
+    # Three mid entries (7 each) beat one large entry (10) of the same size
+    parts, excluded = _knapsack(
+        [(1, 10, 600), (2, 7, 190), (3, 7, 190), (4, 7, 190)], 600
+    )
+    assert [len(p) for p in parts] == [190, 190, 190]
+    assert [e["id"] for e in excluded] == [1]
+
+
+def test_knapsack_repair_picks_best_single_entry():
+    # Density favors the tiny entry, but the big one alone is worth more
+    parts, excluded = _knapsack([(1, 0, 10), (2, 10, 995)], 1000)
+    assert [len(p) for p in parts] == [995]
+    assert excluded == [{"id": 1, "title": "E1", "reason": "displaced"}]
+
+
+def test_knapsack_locked_forced_first():
+    parts, excluded = _knapsack(
+        [(1, 9, 300), (2, 1, 500, True), (3, 5, 300)], 900
+    )
+    # Locked entry 2 is in; one of the 300-char entries still fits
+    assert [len(p) for p in parts] == [300, 500]
+    assert excluded == [{"id": 3, "title": "E3", "reason": "over_budget"}]
+
+
+def test_knapsack_scales_to_thousands_of_candidates():
+    import time
+
+    specs = [(i, i % 10, 50 + (i * 37) % 400) for i in range(5000)]
+    start = time.perf_counter()
+    parts, excluded = _knapsack(specs, 4000)
+    assert time.perf_counter() - start < 1.0
+    assert sum(len(p) + 2 for p in parts) <= 4000 + 2
+    assert len(parts) + len(excluded) == 5000
+
+
+@pytest.mark.asyncio
+async def test_inject_lorebook_reports_exclusions(client, db_session):
+    from app.services.lorebook import inject_lorebook
+
+    resp = await client.post("/api/projects", json={"title": "Knap"})
+    pid = resp.json()["id"]
+    for title, priority, content in [
+        ("巨龙", 10, "巨龙的传说。" * 100),
+        ("骑士", 6, "骑士守护王国。"),
+        ("公主", 5, "公主住在塔里。"),
+    ]:
+        await client.post("/api/lore", json={
+            "project_id": pid, "title": title, "priority": priority,
+            "content_md": content,
+        })
+    scan = "巨龙、骑士与公主"
+
+    stats: dict = {}
+    text = await inject_lorebook(
+        db_session, pid, 0, budget_chars=200, stats=stats, scan_text=scan
+    )
+    assert "骑士" not in text
+    assert [e["reason"] for e in stats["excluded"]] == [
+        "truncated", "after_budget_exhausted", "after_budget_exhausted",
+    ]
+
+    stats = {}
+    text = await inject_lorebook(
+        db_session, pid, 0, budget_chars=200, stats=stats, scan_text=scan,
+        selection="knapsack",
+    )
+    assert "骑士守护王国" in text and "公主住在塔里" in text
+    assert [(e["title"], e["reason"]) for e in stats["excluded"]] == [
+        ("巨龙", "over_budget"),
+    ]
+
+
+# ==================== Recursive Activation ====================
+
+
+async def _lore_chain(client):
+    """A → B → C → A trigger cycle through entry content."""
+    resp = await client.post("/api/projects", json={"title": "Chain"})
+    pid = resp.json()["id"]
+    for title, content in [
+        ("王都", "王都由骑士团守护。"),
+        ("骑士团", "骑士团效忠于圣剑。"),
+        ("圣剑", "圣剑藏在王都地下。"),
+        ("孤岛", "与世隔绝。"),
+    ]:
+        await client.post("/api/lore", json={
+            "project_id": pid, "title": title, "content_md": content,
+        })
+    return pid
+
+
+@pytest.mark.asyncio
+async def test_recursive_activation_depth(client, db_session):
+    from app.services.lorebook import inject_lorebook
+
+    pid = await _lore_chain(client)
+
+    text = await inject_lorebook(db_session, pid, 0, scan_text="抵达王都")
+    assert "骑士团效忠" not in text
+
+    stats: dict = {}
+    text = await inject_lorebook(
+        db_session, pid, 0, scan_text="抵达王都", recursion_depth=1,
+        stats=stats,
+    )
+    assert "骑士团效忠" in text and "圣剑藏在" not in text
+    assert len(stats["recursive"]) == 1
+
+    # Fixpoint: the cycle back to 王都 adds nothing new
+    stats = {}
+    text = await inject_lorebook(
+        db_session, pid, 0, scan_text="抵达王都", recursion_depth=10,
+        stats=stats,
+    )
+    assert "圣剑藏在" in text and "与世隔绝" not in text
+    assert len(stats["recursive"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_recursive_activation_stops_at_budget(client, db_session):
+    from app.services.lorebook import inject_lorebook
+
+    pid = await _lore_chain(client)
+    stats: dict = {}
+    await inject_lorebook(
+        db_session, pid, 0, budget_chars=5, scan_text="抵达王都",
+        recursion_depth=10, stats=stats,
+    )
+    assert stats["recursive"] == []
+
+
 # ==================== Budget Truncation ====================
 
 def test_truncate_within_budget():
@@ -357,6 +624,149 @@ async def test_import_project_not_found(client):
     assert resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_upload_parser_handles_byte_chunks():
+    """Entries split at arbitrary byte boundaries (mid-CJK) still parse."""
+    from app.services.lore_io import iter_lorebook_upload
+
+    doc = json.dumps({
+        "name": "书",
+        "entries": {str(i): {"comment": f"条目{i}", "order": i * 10}
+                    for i in range(3)},
+        "extensions": {"x": [1, 2]},
+    }, ensure_ascii=False).encode()
+
+    async def chunks():
+        for i in range(0, len(doc), 3):
+            yield doc[i:i + 3]
+
+    events = [e async for e in iter_lorebook_upload(chunks())]
+    assert events[0] == ("meta", "name", "书")
+    assert [e[2]["order"] for e in events if e[0] == "entry"] == [0, 10, 20]
+    assert events[-1] == ("meta", "extensions", {"x": [1, 2]})
+
+
+@pytest.mark.asyncio
+async def test_import_raw_file_in_batches_with_upsert(client, db_session):
+    """A raw SillyTavern file is streamed in; upsert updates by title."""
+    from app.services import lore_io
+
+    resp = await client.post("/api/projects", json={"title": "P"})
+    pid = resp.json()["id"]
+    st = {"entries": {str(i): {"comment": f"E{i}", "key": [f"k{i}"],
+                               "content": "v1", "order": i}
+                      for i in range(7)}}
+    body = json.dumps(st).encode()
+
+    async def chunks():
+        for i in range(0, len(body), 50):
+            yield body[i:i + 50]
+
+    old_size = lore_io.IMPORT_BATCH_SIZE
+    lore_io.IMPORT_BATCH_SIZE = 3
+    try:
+        resp = await client.post(
+            f"/api/lore/import?project_id={pid}&return_entries=false",
+            content=chunks(),
+        )
+        assert resp.json() == {"created": 7, "updated": 0}
+
+        st["entries"]["0"]["content"] = "v2"
+        st["entries"]["7"] = {"comment": "E7", "content": "new"}
+        st["entries"]["8"] = {"comment": "E7", "content": "dup"}
+        resp = await client.post(
+            f"/api/lore/import?project_id={pid}&upsert=true",
+            content=json.dumps(st).encode(),
+        )
+    finally:
+        lore_io.IMPORT_BATCH_SIZE = old_size
+    assert resp.status_code == 200
+
+    entries = (await client.get(f"/api/lore?project_id={pid}")).json()
+    by_title = {e["title"]: e for e in entries}
+    assert len(entries) == 8
+    assert by_title["E0"]["content_md"] == "v2"
+    assert by_title["E7"]["content_md"] == "dup"
+
+
+@pytest.mark.asyncio
+async def test_import_upsert_keeps_untitled_entries(client):
+    """Entries without a comment are never merged into one "Untitled" row."""
+    resp = await client.post("/api/projects", json={"title": "P"})
+    pid = resp.json()["id"]
+    st = {"entries": {str(i): {"comment": "", "content": f"c{i}"}
+                      for i in range(5)}}
+    for _ in range(2):
+        resp = await client.post(
+            f"/api/lore/import?project_id={pid}&upsert=true"
+            "&return_entries=false",
+            json=st,
+        )
+        assert resp.json() == {"created": 5, "updated": 0}
+    entries = (await client.get(f"/api/lore?project_id={pid}")).json()
+    assert len(entries) == 10
+
+
+@pytest.mark.asyncio
+async def test_import_bare_entries_and_late_project_id(client):
+    resp = await client.post("/api/projects", json={"title": "P"})
+    pid = resp.json()["id"]
+
+    # Root-level entries map, no "entries" wrapper
+    bare = {"0": {"comment": "甲", "key": ["甲"], "content": "a"},
+            "1": {"comment": "乙", "key": ["乙"], "content": "b"}}
+    resp = await client.post(
+        f"/api/lore/import?project_id={pid}&return_entries=false", json=bare
+    )
+    assert resp.json() == {"created": 2, "updated": 0}
+
+    # project_id after the entries
+    body = ('{"entries": {"0": {"comment": "丙", "content": "c"}}, '
+            f'"project_id": {pid}}}')
+    resp = await client.post("/api/lore/import", content=body.encode())
+    assert resp.status_code == 200
+    assert [e["title"] for e in resp.json()] == ["丙"]
+
+
+@pytest.mark.asyncio
+async def test_import_invalid_json(client):
+    resp = await client.post("/api/projects", json={"title": "P"})
+    pid = resp.json()["id"]
+    resp = await client.post(
+        f"/api/lore/import?project_id={pid}",
+        content=b'{"entries": {"0": {"comment": "A"},',
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_streams_round_trip(client):
+    """Export is valid JSON that re-imports to the same entries."""
+    resp = await client.post("/api/projects", json={"title": "源"})
+    src = resp.json()["id"]
+    for i in range(5):
+        await client.post("/api/lore", json={
+            "project_id": src, "title": f"设定{i}", "priority": i,
+            "triggers": {"keywords": [f"词{i}"], "and_keywords": []},
+        })
+    exported = await client.get(f"/api/lore/export?project_id={src}")
+    assert exported.headers["content-type"].startswith("application/json")
+    data = exported.json()
+    assert [e["comment"] for e in data["entries"].values()] == [
+        f"设定{i}" for i in range(4, -1, -1)
+    ]
+    assert data["originalData"]["name"] == "Lorebook - 源"
+
+    resp = await client.post("/api/projects", json={"title": "目标"})
+    dst = resp.json()["id"]
+    resp = await client.post(
+        f"/api/lore/import?project_id={dst}", content=exported.content
+    )
+    assert {e["title"]: e["triggers"]["keywords"] for e in resp.json()} == {
+        f"设定{i}": [f"词{i}"] for i in range(5)
+    }
+
+
 # ==================== Locked entries always included ====================
 
 @pytest.mark.asyncio
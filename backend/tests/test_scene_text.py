@@ -0,0 +1,64 @@
+"""Tests for batched latest-scene-text lookups."""
+
+import pytest
+
+from app.core.profiling import Probe
+
+
+async def _chapter_with_scenes(client, count: int):
+    resp = await client.post("/api/projects", json={"title": "Batch"})
+    pid = resp.json()["id"]
+    resp = await client.post("/api/books", json={"project_id": pid, "title": "B"})
+    bid = resp.json()["id"]
+    resp = await client.post("/api/chapters", json={"book_id": bid, "title": "C"})
+    cid = resp.json()["id"]
+    sids = []
+    for i in range(count):
+        resp = await client.post(
+            "/api/scenes",
+            json={"chapter_id": cid, "title": f"S{i}", "sort_order": i},
+        )
+        sid = resp.json()["id"]
+        for v in ("旧稿", "定稿"):
+            await client.post(
+                f"/api/scenes/{sid}/versions",
+                json={"content_md": f"第{i}场{v}。", "created_by": "user"},
+            )
+        sids.append(sid)
+    return cid, sids
+
+
+@pytest.mark.asyncio
+async def test_latest_scene_texts_picks_newest_version(client, db_session):
+    from app.services.scene_text import (
+        get_chapter_scene_texts,
+        get_latest_scene_texts,
+    )
+
+    cid, sids = await _chapter_with_scenes(client, 3)
+
+    texts = await get_latest_scene_texts(db_session, sids + [9999])
+    assert texts == {sid: f"第{i}场定稿。" for i, sid in enumerate(sids)}
+
+    by_chapter = await get_chapter_scene_texts(db_session, [cid])
+    assert by_chapter[cid] == [(f"S{i}", f"第{i}场定稿。") for i in range(3)]
+    assert await get_latest_scene_texts(db_session, []) == {}
+
+
+@pytest.mark.asyncio
+async def test_scan_window_query_count_independent_of_depth(client, db_session):
+    from app.services.hierarchy import resolve_scene_ancestry
+    from app.services.lorebook import get_scan_window
+
+    _, sids = await _chapter_with_scenes(client, 12)
+    await resolve_scene_ancestry(db_session, sids[-1])
+
+    with Probe() as shallow:
+        await get_scan_window(db_session, sids[-1], depth=2)
+    with Probe() as deep:
+        text = await get_scan_window(db_session, sids[-1], depth=10)
+
+    assert shallow.sql_count == deep.sql_count == 2
+    assert text.startswith("第2场定稿。")
+    assert text.endswith("第11场定稿。")
+    assert "旧稿" not in text
@@ -218,7 +218,7 @@ async def test_extract_chapter_summary(client):
 
 @pytest.mark.asyncio
 async def test_extract_upsert(client):
-    """Re-extracting summary updates existing record."""
+    """Forced re-extraction updates the existing record."""
     _pid, _bid, cid, _sid = await _setup_chapter_with_text(
         client
     )
@@ -237,13 +237,79 @@ async def test_extract_upsert(client):
     }
     with _patch_call_llm(updated):
         resp2 = await client.post(
-            f"/api/chapters/{cid}/extract-summary"
+            f"/api/chapters/{cid}/extract-summary?force=true"
         )
 
     assert resp1.json()["id"] == resp2.json()["id"]
     assert resp2.json()["summary_md"] == "更新后的摘要"
 
 
+@pytest.mark.asyncio
+async def test_extract_summary_cached_by_content(client):
+    """Unchanged text skips the LLM; edited text or force calls it again."""
+    _pid, _bid, cid, sid = await _setup_chapter_with_text(client)
+
+    async def extract(query=""):
+        resp = _mock_llm_response(MOCK_SUMMARY_DICT)
+        mock_call = AsyncMock(return_value=resp)
+        with patch("app.services.summary.call_llm", new=mock_call):
+            result = await client.post(
+                f"/api/chapters/{cid}/extract-summary{query}"
+            )
+        assert result.status_code == 200
+        return mock_call.await_count
+
+    assert await extract() == 1
+    assert await extract() == 0
+    assert await extract("?force=true") == 1
+
+    await client.post(
+        f"/api/scenes/{sid}/versions",
+        json={"content_md": "林远修好了引擎。", "created_by": "user"},
+    )
+    assert await extract() == 1
+
+    stats = (await client.get("/api/llm-cache/stats")).json()
+    assert stats["kinds"] == [
+        {
+            "kind": "chapter_summary",
+            "entries": 2,
+            "hits": 1,
+            "misses": 3,
+            "hit_rate": 0.25,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cached_summary_follows_reverted_text(client):
+    """Reverting the text restores its summary from the cache."""
+    _pid, _bid, cid, sid = await _setup_chapter_with_text(client)
+    original = "林远站在飞船驾驶舱里，望着窗外的荒漠星球。引擎发出异常的轰鸣声。"
+
+    async def extract(narrative: str) -> tuple[str, int]:
+        mock_call = AsyncMock(
+            return_value=_mock_llm_response({**MOCK_SUMMARY_DICT, "narrative": narrative})
+        )
+        with patch("app.services.summary.call_llm", new=mock_call):
+            resp = await client.post(f"/api/chapters/{cid}/extract-summary")
+        return resp.json()["summary_md"], mock_call.await_count
+
+    async def write(text: str) -> None:
+        await client.post(
+            f"/api/scenes/{sid}/versions",
+            json={"content_md": text, "created_by": "user"},
+        )
+
+    assert await extract("摘要A") == ("摘要A", 1)
+    await write("林远修好了引擎。")
+    assert await extract("摘要B") == ("摘要B", 1)
+    await write(original)
+    # A's output is cached: no call, and the row is A's summary again
+    assert await extract("不该用到") == ("摘要A", 0)
+    assert await extract("不该用到") == ("摘要A", 0)
+
+
 @pytest.mark.asyncio
 async def test_summary_in_context_pack(
     client, db_session
@@ -280,3 +346,171 @@ async def test_summary_in_context_pack(
     )
     assert "林远" in summaries_text
     assert "前文摘要" in summaries_text
+
+
+# ==================== Summary hierarchy ====================
+
+
+async def _book_with_summaries(db, count: int):
+    """Book with `count` chapters (sort 1..count), each summarized."""
+    from app.models import Book, Chapter, ChapterSummary, Project
+
+    project = Project(title="长篇")
+    db.add(project)
+    await db.flush()
+    book = Book(project_id=project.id, title="卷一")
+    db.add(book)
+    await db.flush()
+    chapters = []
+    for i in range(1, count + 1):
+        chapter = Chapter(book_id=book.id, title=f"第{i}章", sort_order=i)
+        db.add(chapter)
+        await db.flush()
+        db.add(ChapterSummary(chapter_id=chapter.id, summary_md=f"第{i}章摘要。"))
+        chapters.append(chapter)
+    await db.flush()
+    return book, chapters
+
+
+def _patch_rollup_llm():
+    calls = []
+
+    async def fake(messages, **kwargs):
+        calls.append(messages)
+        return _mock_llm_response({"narrative": f"汇总{len(calls)}"})
+
+    return patch("app.services.summary.call_llm", new=fake), calls
+
+
+@pytest.mark.asyncio
+async def test_refresh_rollups_only_recomputes_changed_nodes(
+    db_session, monkeypatch
+):
+    from sqlalchemy import select
+
+    from app.core.config import settings
+    from app.models import ChapterSummary
+    from app.services.summary import refresh_rollups
+
+    monkeypatch.setattr(settings, "SUMMARY_ARC_SIZE", 2)
+    book, chapters = await _book_with_summaries(db_session, 5)
+
+    patcher, calls = _patch_rollup_llm()
+    with patcher:
+        nodes = await refresh_rollups(db_session, book.id)
+        # 5 chapters → arcs (1,2) (3,4); (5) alone gets no node; + book
+        assert [(n.level, n.first_sort, n.last_sort) for n in nodes] == [
+            ("arc", 1, 2), ("arc", 3, 4), ("book", 1, 4),
+        ]
+        assert len(calls) == 3
+
+        # Nothing changed → no LLM calls
+        await refresh_rollups(db_session, book.id)
+        assert len(calls) == 3
+
+        # Editing chapter 3 recomputes its arc and the book only
+        summary = (
+            await db_session.execute(
+                select(ChapterSummary).where(
+                    ChapterSummary.chapter_id == chapters[2].id
+                )
+            )
+        ).scalar_one()
+        summary.summary_md = "改写后的第3章摘要。"
+        await db_session.flush()
+        await refresh_rollups(db_session, book.id)
+        assert len(calls) == 5
+        assert "改写后的第3章摘要" in calls[3][1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_summary_edit_refreshes_rollups_in_background(
+    client, db_session, monkeypatch
+):
+    """A summary PUT returns before the rollup LLM calls; they run after."""
+    import asyncio
+
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy import select
+
+    from app.core.config import settings
+    from app.main import app
+    from app.models import SummaryRollup
+    from app.services.summary import rollup_task
+
+    monkeypatch.setattr(settings, "SUMMARY_ARC_SIZE", 2)
+    book, chapters = await _book_with_summaries(db_session, 2)
+    await db_session.commit()
+
+    release = asyncio.Event()
+    calls = []
+
+    async def slow_llm(messages, **kwargs):
+        calls.append(messages)
+        await release.wait()
+        return _mock_llm_response({"narrative": "分卷汇总"})
+
+    # No response hook here: the request must not wait for the refresh
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as raw:
+        with patch("app.services.summary.call_llm", new=slow_llm):
+            resp = await raw.put(
+                f"/api/chapters/{chapters[0].id}/summary",
+                json={"summary_md": "改写的第1章摘要。"},
+            )
+            assert resp.status_code == 200
+            task = rollup_task(book.id)
+            assert task is not None and not task.done()
+            release.set()
+            await task
+
+    assert len(calls) == 1
+    assert "改写的第1章摘要" in calls[0][1]["content"]
+    result = await db_session.execute(
+        select(SummaryRollup.level, SummaryRollup.summary_md)
+        .where(SummaryRollup.book_id == book.id)
+        .execution_options(populate_existing=True)
+    )
+    assert result.all() == [("arc", "分卷汇总")]
+
+
+@pytest.mark.asyncio
+async def test_longterm_layer_fills_coarse_to_fine(db_session, monkeypatch):
+    from app.core.config import settings
+    from app.models import Chapter
+    from app.services.context_pack import get_chapter_summaries_text
+    from app.services.summary import refresh_rollups
+
+    monkeypatch.setattr(settings, "SUMMARY_ARC_SIZE", 2)
+    book, chapters = await _book_with_summaries(db_session, 5)
+    patcher, _ = _patch_rollup_llm()
+    with patcher:
+        await refresh_rollups(db_session, book.id)
+    current = Chapter(book_id=book.id, title="第6章", sort_order=6)
+    db_session.add(current)
+    await db_session.flush()
+
+    # Unbounded: everything before chapter 6, in story order
+    text = await get_chapter_summaries_text(db_session, current.id)
+    assert text.index("全书梗概") < text.index("【第1-2章】")
+    assert text.index("第1章摘要") < text.index("【第3-4章】")
+    assert text.index("第4章摘要") < text.index("第5章摘要")
+
+    # Tight budget: synopsis + uncovered chapter 5 + newest arc only
+    stats: dict = {}
+    text = await get_chapter_summaries_text(
+        db_session, current.id, budget=40, stats=stats
+    )
+    assert "全书梗概" in text
+    assert "第5章摘要" in text
+    assert "【第3-4章】" in text
+    assert "【第1-2章】" not in text
+    assert "第1章摘要" not in text
+    assert stats["dropped"] > 0
+
+    # Writing chapter 3: nothing covering chapters 3+ is eligible
+    text = await get_chapter_summaries_text(db_session, chapters[2].id)
+    assert "全书梗概" not in text
+    assert "【第3-4章】" not in text
+    assert "【第1-2章】" in text
+    assert "第3章摘要" not in text
@@ -170,7 +170,8 @@ export function KGPanel() {
   // Stats from unfiltered query to show accurate global counts
   const { data: allProposals } = useQuery({
     queryKey: ['kg-proposals-all', projectId],
-    queryFn: () => apiFetch<KGProposal[]>(`/api/kg/proposals?project_id=${projectId}`),
+    // Only statuses are counted, so skip decoding the fact payloads
+    queryFn: () => apiFetch<KGProposal[]>(`/api/kg/proposals?project_id=${projectId}&include_payload=false`),
     enabled: !!projectId,
   })
   const stats = useMemo(() => {
@@ -37,6 +37,7 @@ export function LorePanel() {
   const [editingId, setEditingId] = useState<number | 'new' | null>(null)
   const [form, setForm] = useState(emptyForm())
   const [error, setError] = useState('')
+  const [importUpsert, setImportUpsert] = useState(false)
 
   const { data: entries } = useQuery({
     queryKey: ['lore-entries', projectId],
@@ -101,19 +102,12 @@ export function LorePanel() {
     input.onchange = async (e) => {
       const file = (e.target as HTMLInputElement).files?.[0]
       if (!file) return
-      const text = await file.text()
-      let data: unknown
       try {
-        data = JSON.parse(text)
-      } catch {
-        setError('导入失败：JSON 格式错误')
-        return
-      }
-      try {
-        const payload = data as Record<string, unknown>
-        await apiFetch('/api/lore/import', {
+        // The file is sent as-is; the server parses it incrementally
+        const params = `project_id=${projectId}&upsert=${importUpsert}&return_entries=false`
+        await apiFetch(`/api/lore/import?${params}`, {
           method: 'POST',
-          body: JSON.stringify({ project_id: projectId, entries: payload.entries ?? payload }),
+          body: file,
         })
         queryClient.invalidateQueries({ queryKey: ['lore-entries', projectId] })
       } catch (err) {
@@ -173,6 +167,17 @@ export function LorePanel() {
         >
           导入
         </button>
+        <label
+          className="flex items-center gap-1 text-xs text-slate-600 cursor-pointer"
+          title="导入时用同名条目覆盖已有条目（无标题条目总是新增）"
+        >
+          <input
+            type="checkbox"
+            checked={importUpsert}
+            onChange={(e) => setImportUpsert(e.target.checked)}
+          />
+          覆盖同名
+        </label>
         <button
           className="text-xs px-2 py-1.5 border border-slate-300 rounded
             hover:bg-slate-50 cursor-pointer transition-colors"